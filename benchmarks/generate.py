@@ -0,0 +1,101 @@
+import os
+import json
+import argparse
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+# delimiter, date format and whether the files come with a header
+LAYOUTS = OrderedDict([('comma-header', (',', '%Y-%m-%d', True)),
+                       ('semicolon-header', (';', '%d-%m-%Y', True)),
+                       ('tab-noheader', ('\t', '%m-%d-%Y', False)),
+                       ('comma-noheader', (',', '%y-%m-%d', False))])
+
+MERCHANT_TYPES = ['Supermarket', 'Cafe', 'Bistro', 'Gas station', 'Pharmacy', 'Train station', 'Rent', 'Barber',
+                  'Restaurant', 'Kiosk', 'Bookstore', 'Cinema', 'Hardware store', 'Bakery', 'Insurance', 'Gym']
+
+
+def _descriptions(rng, num_descriptions):
+	"""
+		Create a vocabulary of transaction descriptions and the merchant name of each
+	"""
+	merchants = ['%s %d' % (MERCHANT_TYPES[i % len(MERCHANT_TYPES)], i) for i in range(num_descriptions)]
+	references = rng.randint(100000, 999999, num_descriptions)
+	descriptions = ['Transaction %d %s' % (ref, merchant) for ref, merchant in zip(references, merchants)]
+	return np.array(descriptions, dtype=object), merchants
+
+
+def _rules(merchants, num_rules, rules_per_alias=5):
+	"""
+		Create category rules matching the first num_rules merchants
+	"""
+	categories = OrderedDict()
+	for i, merchant in enumerate(merchants[:num_rules]):
+		categories.setdefault('Alias %d' % (i // rules_per_alias), []).append(merchant)
+	return categories
+
+
+def generate(output_dir, rows=1000, files=12, years=1, layout='comma-header', num_descriptions=200,
+             num_rules=20, balance_ratio=0.01, seed=0):
+	"""
+		Write rows random transactions spread over files csv files covering years years
+		to output_dir, together with a category_definitions.json holding the import
+		settings and num_rules category rules
+	"""
+	delimiter, date_format, header = LAYOUTS[layout]
+	rng = np.random.RandomState(seed)
+	os.makedirs(output_dir, exist_ok=True)
+
+	start = np.datetime64('%d-01-01' % (2018 - years))
+	num_days = int((np.datetime64('2018-01-01') - start).astype(int))
+	days = np.sort(rng.randint(0, num_days, rows))
+
+	descriptions, merchants = _descriptions(rng, num_descriptions)
+	codes = rng.randint(0, num_descriptions, rows)
+	# roughly one income for every 20 expenses
+	income = rng.rand(rows) < 0.05
+	amounts = np.where(income, rng.uniform(1000, 6000, rows), -rng.uniform(1, 500, rows)).round(2)
+	balances = (40000 + np.cumsum(amounts)).round(2)
+	# only a few rows come with a balance, the rest is calculated on import
+	has_balance = rng.rand(rows) < balance_ratio
+	has_balance[-1] = True
+
+	# format every day once instead of every row
+	day_strings = pd.Series(start + np.arange(num_days)).dt.strftime(date_format).values
+	frame = pd.DataFrame({'Date': day_strings[days],
+	                      'Description': descriptions[codes],
+	                      'Amount': amounts,
+	                      'Balance': np.where(has_balance, balances, np.nan)})
+
+	# consecutive date ranges per file, similar to periodic bank exports
+	for i, chunk in enumerate(np.array_split(np.arange(rows), files)):
+		path = os.path.join(output_dir, 'export_%04d.csv' % i)
+		frame.iloc[chunk].to_csv(path, sep=delimiter, header=header, index=False, float_format='%.2f')
+
+	definitions = OrderedDict([('settings', OrderedDict([('file_type', 'csv'),
+	                                                      ('date_format', date_format),
+	                                                      ('columns', OrderedDict([('date', '1'), ('description', '2'),
+	                                                                               ('amount', '3'), ('balance', '4')]))])),
+	                           ('categories', _rules(merchants, num_rules))])
+	with open(os.path.join(output_dir, 'category_definitions.json'), 'w') as fp:
+		json.dump(definitions, fp, indent=4)
+
+	return output_dir
+
+
+def main():
+	parser = argparse.ArgumentParser(description='Generate synthetic transaction exports')
+	parser.add_argument('output_dir')
+	parser.add_argument('--rows', type=int, default=1000)
+	parser.add_argument('--files', type=int, default=12)
+	parser.add_argument('--years', type=int, default=1)
+	parser.add_argument('--layout', choices=list(LAYOUTS.keys()), default='comma-header')
+	parser.add_argument('--descriptions', type=int, default=200)
+	parser.add_argument('--rules', type=int, default=20)
+	parser.add_argument('--seed', type=int, default=0)
+	args = parser.parse_args()
+
+	generate(args.output_dir, args.rows, args.files, args.years, args.layout, args.descriptions, args.rules, seed=args.seed)
+
+if __name__ == '__main__':
+	main()
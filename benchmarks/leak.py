@@ -0,0 +1,103 @@
+import os
+import sys
+import gc
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+import matplotlib
+matplotlib.use('Agg')  # the cycles run without a display
+from benchmarks.generate import generate
+from benchmarks.run import _load, _update_entries
+from libs.analysis import Analysis, FigurePool
+
+# cycles before the memory is measured the first time, caches and the pool fill up meanwhile
+WARMUP = 10
+
+
+def _current_rss():
+	"""
+		Resident memory of the process in bytes, None where /proc is not available
+	"""
+	try:
+		with open('/proc/self/statm') as fp:
+			return int(fp.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+	except (OSError, ValueError):
+		return None
+
+
+def _cycle(data_handler, settings, pool):
+	"""
+		Import the data, show all figures and edit a category rule, as done in the GUI
+	"""
+	data_handler.import_data(settings)
+	analysis = Analysis(data_handler, None, pool)
+	figures = [analysis.build_overall_overview(), analysis.build_monthly_overview(),
+	           analysis.build_day_overview()[0], analysis.build_day_balance()[0]]
+	figures.extend(analysis.build_category_details().values())
+	for fig in figures:
+		fig.canvas.draw()
+	_update_entries(data_handler)
+	analysis.update_figures()
+
+
+def _memory(trace):
+	"""
+		Memory in use in bytes: the memory traced by tracemalloc or the resident memory
+	"""
+	gc.collect()
+	return tracemalloc.get_traced_memory()[0] if trace else _current_rss()
+
+
+def run(import_dir, cycles, trace=False):
+	"""
+		Run the import/edit cycles with a shared figure pool; returns the memory
+		and the number of created figures after the warm up and after all cycles
+		and the figure statistics
+	"""
+	data_handler, settings = _load(import_dir)
+	pool = FigurePool()
+	if trace:
+		tracemalloc.start()
+	try:
+		for i in range(cycles):
+			_cycle(data_handler, settings, pool)
+			if i + 1 == min(WARMUP, cycles):
+				start = _memory(trace), pool.created
+		end = _memory(trace), pool.created
+	finally:
+		tracemalloc.stop()
+	return start, end, pool.stats()
+
+
+def main():
+	parser = argparse.ArgumentParser(description='Check that repeated imports and rule edits keep the memory flat')
+	parser.add_argument('--cycles', type=int, default=100)
+	parser.add_argument('--rows', type=int, default=2000)
+	parser.add_argument('--tolerance', type=float, default=10.0, help='allowed growth after the warm up in MB')
+	parser.add_argument('--trace', action='store_true', help='measure the Python allocations with tracemalloc (slow) '
+	                                                         'instead of the resident memory')
+	args = parser.parse_args()
+	# without /proc only the traced memory can be measured
+	trace = args.trace or _current_rss() is None
+
+	import_dir = tempfile.mkdtemp(prefix='expenses_leak_')
+	try:
+		generate(import_dir, rows=args.rows)
+		shutil.copy(os.path.join(import_dir, 'category_definitions.json'), os.path.join(import_dir, 'category_definitions.orig'))
+		start, end, stats = run(import_dir, args.cycles, trace)
+	finally:
+		shutil.rmtree(import_dir, ignore_errors=True)
+
+	growth = (end[0] - start[0]) / 1e6
+	print('%s memory after %d cycles %.1f MB, after %d cycles %.1f MB (%+.2f MB)' %
+	      ('traced' if trace else 'resident', min(WARMUP, args.cycles), start[0] / 1e6, args.cycles, end[0] / 1e6, growth))
+	print('figures ' + ', '.join('%s %d' % item for item in stats.items()))
+
+	# every cycle has to reuse the figures of the one before
+	if growth > args.tolerance or end[1] != start[1]:
+		print('memory grows with the number of cycles', file=sys.stderr)
+		sys.exit(1)
+
+if __name__ == '__main__':
+	main()
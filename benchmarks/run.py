@@ -0,0 +1,211 @@
+import os
+import sys
+import gc
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import tracemalloc
+from collections import OrderedDict
+import matplotlib
+matplotlib.use('Agg')  # benchmarks run without a display
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+from benchmarks.generate import generate, LAYOUTS
+from libs.analysis import Analysis
+from libs.settings import Settings
+from libs.datahandler import DataHandler
+
+
+def _load(import_dir):
+	"""
+		Create a data handler for import_dir with the generated settings, without importing data yet;
+		the definitions are reset first since every import extends the unknown categories
+	"""
+	shutil.copy(os.path.join(import_dir, 'category_definitions.orig'), os.path.join(import_dir, 'category_definitions.json'))
+	settings = Settings()
+	settings.import_dir = import_dir
+	data_handler = DataHandler(settings)
+	settings.apply_saved_settings(import_dir, data_handler.get_settings())
+	return data_handler, settings
+
+
+def _update_entries(data_handler):
+	"""
+		Add a rule to the first alias and remove it again, as done in the category settings
+	"""
+	alias = data_handler.get_category_aliases(incl_unknown=False)[0]
+	data_handler.update_entries(alias, '', 'update', 'benchmark rule')
+	data_handler.update_entries(alias, 'benchmark rule', 'delete')
+
+
+def _calculate_categories(data_handler):
+	"""
+		Recalculate the categories the same way a rule change does
+	"""
+	data_handler._definitions_data['categories'].pop('Unknown', None)
+	data_handler._calculate_categories()
+
+
+def _create_figures(analysis):
+	"""
+		Build all figures shown after an import
+	"""
+	analysis.build_overall_overview()
+	analysis.build_monthly_overview()
+	analysis.build_day_overview()
+	analysis.build_day_balance()
+	analysis.build_category_details()
+	# the figures aren't managed by pyplot, they are returned to the pool for the next run
+	analysis.reset_plots()
+
+
+def _stages(import_dir):
+	"""
+		The benchmarked stages; each returns a callable running the stage once
+		on a data handler that has been prepared up to that stage
+	"""
+	def import_files():
+		data_handler, settings = _load(import_dir)
+		return lambda: data_handler._import_files()
+
+	def drop_duplicates():
+		data_handler, settings = _load(import_dir)
+		store = data_handler._load_files(settings.import_files)[0]
+		return lambda: data_handler._drop_duplicates(store)
+
+	def imported():
+		data_handler, settings = _load(import_dir)
+		data_handler.import_data(settings)
+		return data_handler
+
+	def analysis():
+		plt.close('all')
+		return Analysis(imported(), None)
+
+	return OrderedDict([('_import_files', import_files),
+	                    ('_drop_duplicates', drop_duplicates),
+	                    ('_calculate_categories', lambda: (lambda dh=imported(): _calculate_categories(dh))),
+	                    ('get_search_data', lambda: (lambda dh=imported(): dh.get_search_data('station 1'))),
+	                    ('get_days_balance', lambda: imported().get_days_balance),
+	                    ('update_entries', lambda: (lambda dh=imported(): _update_entries(dh))),
+	                    ('analysis_figures', lambda: (lambda a=analysis(): _create_figures(a)))])
+
+
+def _time(func, repeat):
+	"""
+		Run func repeat times and return the durations in seconds
+	"""
+	durations = []
+	for i in range(repeat):
+		gc.collect()
+		start = time.perf_counter()
+		func()
+		durations.append(time.perf_counter() - start)
+	return durations
+
+
+def _peak_memory(func):
+	"""
+		Peak of memory allocated while running func once, in bytes
+	"""
+	gc.collect()
+	tracemalloc.start()
+	try:
+		func()
+		return tracemalloc.get_traced_memory()[1]
+	finally:
+		tracemalloc.stop()
+
+
+def run_case(case, repeat, stages=None):
+	"""
+		Generate the data of a case and benchmark all stages on it
+	"""
+	import_dir = tempfile.mkdtemp(prefix='expenses_bench_')
+	try:
+		generate(import_dir, **case)
+		shutil.copy(os.path.join(import_dir, 'category_definitions.json'), os.path.join(import_dir, 'category_definitions.orig'))
+		results = OrderedDict()
+		for name, prepare in _stages(import_dir).items():
+			if stages and name not in stages:
+				continue
+			func = prepare()
+			durations = _time(func, repeat)
+			results[name] = OrderedDict([('min', min(durations)),
+			                             ('median', float(np.median(durations))),
+			                             ('runs', durations),
+			                             ('peak_memory', _peak_memory(func))])
+			print('%-40s %-22s %10.4f s %10.1f MB' % (_case_name(case), name, results[name]['min'],
+			                                          results[name]['peak_memory'] / 1e6), file=sys.stderr)
+		return results
+	finally:
+		shutil.rmtree(import_dir, ignore_errors=True)
+
+
+def _case_name(case):
+	return '%(layout)s/%(rows)d rows/%(files)d files/%(years)d years/%(num_rules)d rules' % case
+
+
+def _environment():
+	return OrderedDict([('python', platform.python_version()),
+	                    ('numpy', np.__version__),
+	                    ('pandas', pd.__version__),
+	                    ('matplotlib', matplotlib.__version__),
+	                    ('machine', platform.machine()),
+	                    ('time', time.strftime('%Y-%m-%dT%H:%M:%S'))])
+
+
+def compare(baseline, results):
+	"""
+		Print the speedup of results compared to a baseline run
+	"""
+	old_cases = {c['name']: c for c in baseline['cases']}
+	for case in results['cases']:
+		old = old_cases.get(case['name'])
+		if not old:
+			continue
+		for stage, values in case['stages'].items():
+			if stage in old['stages']:
+				ratio = old['stages'][stage]['min'] / values['min'] if values['min'] else float('inf')
+				print('%-40s %-22s %8.2fx' % (case['name'], stage, ratio))
+
+
+def main():
+	parser = argparse.ArgumentParser(description='Benchmark import, categorization, queries and figure creation')
+	parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000])
+	parser.add_argument('--files', type=int, nargs='+', default=[12])
+	parser.add_argument('--years', type=int, nargs='+', default=[1])
+	parser.add_argument('--rules', type=int, nargs='+', default=[20])
+	parser.add_argument('--layouts', nargs='+', choices=list(LAYOUTS.keys()), default=['comma-header'])
+	parser.add_argument('--stages', nargs='+', help='only run these stages')
+	parser.add_argument('--repeat', type=int, default=3)
+	parser.add_argument('-o', '--output', help='write the results as JSON to this file')
+	parser.add_argument('--compare', help='JSON results of an earlier run to compare with')
+	args = parser.parse_args()
+
+	results = OrderedDict([('environment', _environment()), ('cases', [])])
+	for layout in args.layouts:
+		for rows in args.rows:
+			for files in args.files:
+				for years in args.years:
+					for rules in args.rules:
+						case = OrderedDict([('rows', rows), ('files', files), ('years', years),
+						                    ('layout', layout), ('num_rules', rules),
+						                    ('num_descriptions', max(200, rules * 2))])
+						results['cases'].append(OrderedDict([('name', _case_name(case)),
+						                                     ('case', case),
+						                                     ('stages', run_case(case, args.repeat, args.stages))]))
+
+	if args.output:
+		with open(args.output, 'w') as fp:
+			json.dump(results, fp, indent=4)
+	if args.compare:
+		with open(args.compare, 'r') as fp:
+			compare(json.load(fp), results)
+
+if __name__ == '__main__':
+	main()
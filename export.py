@@ -0,0 +1,50 @@
+import os
+import sys
+import argparse
+from report import load_data_handler
+from libs.datahandler import EXPORT_DATA_SETS
+from libs.export import CHUNK_ROWS, FORMATS
+from libs.instrumentation import instrumentation
+
+
+def export_data(import_dir, output_dir, fmt, data_sets, chunk_rows, sql_store=False):
+	"""
+		Export the data sets of an import directory to output_dir, one file per data set
+	"""
+	data_handler, settings = load_data_handler(import_dir, sql_store)
+	os.makedirs(output_dir, exist_ok=True)
+	for data_set in data_sets:
+		path = os.path.join(output_dir, data_set + '.' + fmt)
+		rows = data_handler.export(path, data_set, fmt, chunk_rows)
+		print('%s (%d rows)' % (path, rows))
+
+
+def main():
+	parser = argparse.ArgumentParser(description='Export the categorized transactions and aggregates of import directories')
+	parser.add_argument('import_dirs', nargs='+', help='import directories containing a saved category_definitions.json')
+	parser.add_argument('-o', '--output', default='exports', help='output directory, one sub directory per import directory')
+	parser.add_argument('-f', '--format', choices=list(FORMATS.keys()), default='csv', help='file format of the exports')
+	parser.add_argument('-d', '--data', nargs='+', choices=EXPORT_DATA_SETS, default=EXPORT_DATA_SETS, help='data sets to export')
+	parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS, help='rows processed and written at once')
+	parser.add_argument('--sql-store', action='store_true', help='keep the transactions in a database within each import directory')
+	parser.add_argument('--profile', help='write timings and counters of the processing stages as JSON to this file')
+	args = parser.parse_args()
+
+	if args.profile:
+		instrumentation.enable()
+
+	failed = False
+	for import_dir in args.import_dirs:
+		output_dir = os.path.join(args.output, os.path.basename(os.path.normpath(import_dir)))
+		try:
+			export_data(import_dir, output_dir, args.format, args.data, args.chunk_rows, args.sql_store)
+		except (ImportError, ValueError, OSError) as e:
+			print('Export failed for ' + import_dir + ': ' + str(e.args[0]), file=sys.stderr)
+			failed = True
+
+	if args.profile:
+		instrumentation.dump(args.profile)
+	sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+	main()
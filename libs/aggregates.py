@@ -0,0 +1,294 @@
+from collections import OrderedDict
+import re
+import copy
+import numpy as np
+import pandas as pd
+from libs.instrumentation import instrumentation
+
+INCOME = 0
+EXPENSE = 1
+
+
+def day_anchors(day_idx, amounts, balances, num_days):
+	"""
+		Balance at the end of every day implied by its last row with a known balance
+		(NaN where unknown), as anchors for the balance calculation. The offset between a
+		known balance and the running sum of the rows is taken at that row, so rows
+		following it on the same day are still part of the balance of the day
+	"""
+	# the rows of a day in import order
+	order = np.argsort(day_idx, kind='mergesort')
+	day_idx = np.asarray(day_idx)[order]
+	cumsum = np.cumsum(np.asarray(amounts, dtype='float64')[order])
+	offsets = np.asarray(balances, dtype='float64')[order] - cumsum
+
+	anchors = np.full(num_days, np.nan)
+	known = ~np.isnan(offsets)
+	if known.any():
+		# the offset of the last known row of each day applied to the running sum at its end
+		last_known = pd.Series(offsets[known]).groupby(day_idx[known]).last()
+		day_ends = np.flatnonzero(np.r_[day_idx[1:] != day_idx[:-1], True])
+		end_sums = np.zeros(num_days)
+		end_sums[day_idx[day_ends]] = cumsum[day_ends]
+		days = last_known.index.values
+		anchors[days] = last_known.values + end_sums[days]
+	return anchors
+
+
+class AggregateCube:
+	"""
+		Materialized day x category x sign aggregates of the imported transactions;
+		built once per import, all overview queries are answered from it without
+		touching the transaction rows again
+	"""
+
+	def __init__(self, dates, codes, descriptions, amounts, balances=None):
+		row_days = np.asarray(dates, dtype='datetime64[D]')
+		# integer amounts (minor units) are summed exactly as integers
+		amounts = np.asarray(amounts)
+		amounts = amounts.astype('int64' if np.issubdtype(amounts.dtype, np.integer) else 'float64')
+		self._dtype = amounts.dtype
+
+		# the day axis of the cube, every row is mapped to its day index
+		self.days, day_idx = np.unique(row_days, return_inverse=True)
+		# descriptions are given as codes of every row into the unique descriptions
+		self.descriptions = descriptions
+
+		# zero amounts are neither income nor expense
+		valid = amounts != 0
+		sign = np.where(amounts < 0, EXPENSE, INCOME)
+
+		num_days = len(self.days)
+		key = day_idx[valid] * 2 + sign[valid]
+		self._totals = self._sum(key, amounts[valid], num_days * 2).reshape(num_days, 2)
+		self._counts = np.bincount(key, minlength=num_days * 2).reshape(num_days, 2)
+
+		# the base of the category aggregates is the day x description x sign sum;
+		# changing category rules only has to regroup this one
+		base = pd.DataFrame({'day': day_idx[valid], 'code': codes[valid], 'sign': sign[valid], 'amount': amounts[valid]})
+		base = base.groupby(['day', 'code', 'sign'], sort=True)['amount'].agg(['sum', 'count']).reset_index()
+		self._base_day = base['day'].values
+		self._base_code = base['code'].values
+		self._base_sign = base['sign'].values
+		self._base_amount = base['sum'].values
+		self._base_count = base['count'].values
+
+		self._balances = None
+		self._balances_complete = False
+		if balances is not None:
+			# balance at the end of each day with a known balance, used as anchors for the balance calculation
+			balances = np.asarray(balances, dtype='float64')
+			self._balances = day_anchors(day_idx, amounts, balances, num_days)
+			self._balances_complete = not np.isnan(balances).any()
+
+		self._set_months()
+
+		self.aliases = []
+		self.alias_masks = OrderedDict()
+		self._unknown = 'Unknown'
+		self._uncategorized_mask = np.ones(len(self.descriptions), dtype=bool)
+		self._categories = np.zeros((num_days, 0, 2), dtype=self._dtype)
+
+	@classmethod
+	def from_day_sums(cls, days, totals, counts, balances=None, balances_complete=False):
+		"""
+			Build a cube without transactions from the per day sums (see day_sums);
+			it answers the overview queries but has no descriptions to categorize
+		"""
+		cube = cls(np.array([], dtype='datetime64[D]'), np.array([], dtype='int32'), np.array([], dtype=object),
+		           np.array([], dtype=totals.dtype))
+		cube.days = np.asarray(days, dtype='datetime64[D]')
+		cube._totals = totals
+		cube._counts = counts
+		cube._balances = balances
+		cube._balances_complete = balances_complete
+		cube._categories = np.zeros((len(cube.days), 0, 2), dtype=cube._dtype)
+		cube._set_months()
+		return cube
+
+	def _set_months(self):
+		"""
+			Set the months of the day axis and the first day of each
+		"""
+		months = self.days.astype('datetime64[M]')
+		self._month_starts = np.flatnonzero(np.r_[True, months[1:] != months[:-1]]) if len(self.days) else np.array([], dtype=int)
+		self.months = months[self._month_starts]
+
+	def window(self, first_day=None, last_day=None):
+		"""
+			Cube of the days from first_day up to and including last_day (None for an open end);
+			the day axis and the base aggregates are sorted by day, so both are sliced by
+			binary search and the arrays of this cube are shared
+		"""
+		start = 0 if first_day is None else np.searchsorted(self.days, first_day, side='left')
+		end = len(self.days) if last_day is None else np.searchsorted(self.days, last_day, side='right')
+		base_start, base_end = np.searchsorted(self._base_day, [start, end], side='left')
+
+		cube = copy.copy(self)
+		cube.days = self.days[start:end]
+		cube._totals = self._totals[start:end]
+		cube._counts = self._counts[start:end]
+		cube._categories = self._categories[start:end]
+		if self._balances is not None:
+			cube._balances = self._balances[start:end]
+		# the base refers to the days of the window
+		cube._base_day = self._base_day[base_start:base_end] - start
+		cube._base_code = self._base_code[base_start:base_end]
+		cube._base_sign = self._base_sign[base_start:base_end]
+		cube._base_amount = self._base_amount[base_start:base_end]
+		cube._base_count = self._base_count[base_start:base_end]
+		cube._set_months()
+		return cube
+
+	def day_sums(self):
+		"""
+			Per day sums and counts of income and expenses, the balance anchors
+			and whether they are complete; the cube can be rebuilt from them
+		"""
+		return self.days, self._totals, self._counts, self._balances, self._balances_complete
+
+	def day_categories(self):
+		"""
+			Per day category sums of income and expenses of the categorized cube
+		"""
+		return self.days, self._categories
+
+	def set_categories(self, aliases, categories):
+		"""
+			Set the category dimension of a cube without transactions (see from_day_sums)
+			to the per day category sums of its days
+		"""
+		self.aliases = list(aliases)
+		self._categories = categories
+
+	def categorize(self, alias_regexes, uncategorized_regex, unknown='Unknown'):
+		"""
+			Build the category dimension of the cube from a regex per alias;
+			the regexes are only applied to the unique descriptions
+			Returns the descriptions of all uncategorized expenses
+		"""
+		descriptions = pd.Series(self.descriptions, dtype=object)
+		self.alias_masks = OrderedDict()
+		for alias, regex in alias_regexes.items():
+			self.alias_masks[alias] = descriptions.str.contains(regex, flags=re.IGNORECASE, na=False).values
+		instrumentation.count('regex scans', len(alias_regexes))
+		instrumentation.count('regex scanned descriptions', len(alias_regexes) * len(descriptions))
+
+		with instrumentation.timed('uncategorized scan'):
+			if uncategorized_regex:
+				uncategorized = ~descriptions.str.contains(uncategorized_regex, flags=re.IGNORECASE, na=False).values
+				instrumentation.count('regex scans')
+				instrumentation.count('regex scanned descriptions', len(descriptions))
+			else:
+				uncategorized = np.ones(len(descriptions), dtype=bool)
+		self._unknown = unknown
+		self._uncategorized_mask = uncategorized
+
+		self.aliases = list(self.alias_masks.keys())
+		if unknown not in self.alias_masks:
+			self.aliases.append(unknown)
+
+		num_days = len(self.days)
+		self._categories = np.zeros((num_days, len(self.aliases), 2), dtype=self._dtype)
+		for i, alias in enumerate(self.aliases):
+			mask = self.alias_masks.get(alias, np.zeros(len(descriptions), dtype=bool))
+			self._categories[:, i, :] = self._sum_base(mask[self._base_code])
+
+		# all data sets not covered by any category are added to the unknown category
+		sel = uncategorized[self._base_code]
+		self._categories[:, self.aliases.index(unknown), :] += self._sum_base(sel)
+
+		sel &= self._base_sign == EXPENSE
+		return list(np.repeat(self.descriptions[self._base_code[sel]], self._base_count[sel]))
+
+	def category_mask(self, alias):
+		"""
+			Mask over the unique descriptions belonging to the category alias
+		"""
+		mask = self.alias_masks.get(alias, np.zeros(len(self.descriptions), dtype=bool))
+		if alias == self._unknown:
+			mask = mask | self._uncategorized_mask
+		return mask
+
+	def _sum(self, keys, values, size):
+		"""
+			Sum values with the same key; integers are summed without a detour over floats
+		"""
+		if np.issubdtype(self._dtype, np.integer):
+			sums = np.zeros(size, dtype=self._dtype)
+			np.add.at(sums, keys, values)
+			return sums
+		return np.bincount(keys, weights=values, minlength=size)
+
+	def _sum_base(self, sel):
+		"""
+			Sum the selected base aggregates per day and sign
+		"""
+		key = self._base_day[sel] * 2 + self._base_sign[sel]
+		num_days = len(self.days)
+		return self._sum(key, self._base_amount[sel], num_days * 2).reshape(num_days, 2)
+
+	def _roll_up(self, values, starts):
+		"""
+			Sum values of the day axis into the periods beginning at starts
+		"""
+		if not len(starts):
+			return values[:0]
+		return np.add.reduceat(values, starts, axis=0)
+
+	def total_in_out(self):
+		"""
+			Total income and expenses as absolute values
+		"""
+		totals = self._totals.sum(axis=0)
+		return abs(totals[INCOME]), abs(totals[EXPENSE])
+
+	def day_totals(self, sign=EXPENSE):
+		"""
+			Per day sums of all days with transactions of the given sign
+		"""
+		has_values = self._counts[:, sign] > 0
+		return self.days[has_values], self._totals[has_values, sign]
+
+	def day_net(self):
+		"""
+			Per day sums of all transactions
+		"""
+		return self.days, self._totals.sum(axis=1)
+
+	def day_balances(self):
+		"""
+			Per day anchor balances (NaN for days without a known balance) and
+			whether every single transaction came with a balance
+		"""
+		return self._balances, self._balances_complete
+
+	def month_totals(self):
+		"""
+			Per month absolute income and expenses
+		"""
+		totals = np.abs(self._roll_up(self._totals, self._month_starts))
+		return self.months, totals[:, INCOME], totals[:, EXPENSE]
+
+	def year_totals(self):
+		"""
+			Per year absolute income and expenses
+		"""
+		years = self.days.astype('datetime64[Y]')
+		starts = np.flatnonzero(np.r_[True, years[1:] != years[:-1]]) if len(years) else np.array([], dtype=int)
+		totals = np.abs(self._roll_up(self._totals, starts))
+		return years[starts], totals[:, INCOME], totals[:, EXPENSE]
+
+	def month_categories(self, sign=EXPENSE):
+		"""
+			Per month absolute category sums of the given sign
+		"""
+		return self.months, self.aliases, np.abs(self._roll_up(self._categories[:, :, sign], self._month_starts))
+
+	def date_range(self):
+		"""
+			First and last day of the cube
+		"""
+		if not len(self.days):
+			return None, None
+		return self.days[0], self.days[-1]
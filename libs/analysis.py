@@ -1,26 +1,62 @@
+import io
 import math
+import datetime
+import threading
 from collections import OrderedDict
+from concurrent.futures import wait
 import numpy as np
+import matplotlib
 import matplotlib.pyplot as plt
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 import matplotlib.dates as mdates
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import scipy.spatial as spatial
+from libs.instrumentation import instrumentation
+
+# released figures kept for reuse per kind of chart, further ones are closed
+POOL_SIZE = 32
+
+
+def datetime64_to_num(dates):
+	"""
+		Convert an array of datetime64 values to matplotlib date numbers
+		without creating a datetime object per value
+	"""
+	epoch = mdates.date2num(datetime.datetime(1970, 1, 1))
+	seconds = np.asarray(dates, dtype='datetime64[s]').astype('int64')
+	return epoch + seconds / 86400.
 
 
 class FollowDotCursor(object):
 
 	def _formatter(self, x, y):
-		text = "Date: " + x.strftime("%Y-%m-%d")
+		text = "Date: " + mdates.num2date(x).strftime("%Y-%m-%d")
 		text += "\nAmount: %.2f" % y
 		return text
 
 	def __init__(self, ax, x, y, tolerance=5, offsets=(-20, 20)):
-		self._x_values = x
+		x, y = self.set_data(x, y)
+		self.offsets = offsets  # arrow offset; drawing of arrow from point x|y to offset
+		# self.tolerance = tolerance
+		self.ax = ax
+		self.fig = ax.figure
+		self.ax.xaxis.set_label_position('top')
+		self.dot = ax.scatter([x.min()], [y.min()], s=130, color='green', alpha=0.7)
+		self.annotation = self.setup_annotation()
+		# plt.connect('motion_notify_event', self)
+		self.cid = self.fig.canvas.mpl_connect('motion_notify_event', self)
 
-		try:
-			x = np.asarray(x, dtype='float')
-		except (TypeError, ValueError):
-			x = np.asarray(mdates.date2num(x), dtype='float')
+	def set_data(self, x, y):
+		"""
+			Set the data points the cursor snaps to; returns the valid points
+		"""
+		if np.issubdtype(np.asarray(x).dtype, np.datetime64):
+			x = datetime64_to_num(x)
+		else:
+			try:
+				x = np.asarray(x, dtype='float')
+			except (TypeError, ValueError):
+				x = np.asarray(mdates.date2num(x), dtype='float')
 
 		y = np.asarray(y, dtype='float')
 		mask = ~(np.isnan(x) | np.isnan(y))
@@ -28,19 +64,11 @@ class FollowDotCursor(object):
 		y = y[mask]
 
 		self._points = np.column_stack((x, y))
-		self.offsets = offsets  # arrow offset; drawing of arrow from point x|y to offset
 		y = y[np.abs(y-y.mean()) <= 3*y.std()]
-		self.scale = x.ptp()
-		self.scale = y.ptp() / self.scale if self.scale else 1
+		self.scale = np.ptp(x)
+		self.scale = np.ptp(y) / self.scale if self.scale else 1
 		self.tree = spatial.cKDTree(self.scaled(self._points))
-		# self.tolerance = tolerance
-		self.ax = ax
-		self.fig = ax.figure
-		self.ax.xaxis.set_label_position('top')
-		self.dot = ax.scatter([x.min()], [y.min()], s=130, color='green', alpha=0.7)
-		self.annotation = self.setup_annotation()
-		# plt.connect('motion_notify_event', self)
-		self.cid = self.fig.canvas.mpl_connect('motion_notify_event', self)
+		return x, y
 
 	def scaled(self, points):
 		points = np.asarray(points)
@@ -81,60 +109,245 @@ class FollowDotCursor(object):
 		"""
 		dist, idx = self.tree.query(self.scaled((x, y)), k=1, p=1)
 		try:
-			x_val = self._x_values[idx]
-			y_val = self._points[idx]
-
-			return x_val, y_val[1]
-			# return self._points[idx]
+			return self._points[idx]
 		except IndexError:
 			return self._points[0]
 
 
+class FigurePool(object):
+	"""
+		Figures (together with their canvases) which are reused instead of creating new ones;
+		released figures are cleared, detached from their widgets and disconnected
+		from their event handlers until they are acquired again. The figures are
+		not managed by pyplot, so they can be built in any thread
+	"""
+
+	def __init__(self, size=POOL_SIZE):
+		self._size = size
+		self._free = {}
+		self._used = OrderedDict()
+		self._lock = threading.Lock()
+		self.created = 0
+		self.reused = 0
+		self.closed = 0
+
+	def acquire(self, kind, figsize=None, offscreen=False):
+		"""
+			Get a cleared figure of the kind of chart, a new one if none is free;
+			offscreen figures keep an Agg canvas to be drawn outside of the GUI thread
+		"""
+		with self._lock:
+			free = self._free.get((kind, offscreen))
+			fig = free.pop() if free else None
+
+		reused = fig is not None
+		if reused:
+			fig.set_size_inches(figsize or plt.rcParams['figure.figsize'], forward=False)
+			instrumentation.count('figures reused')
+		else:
+			fig = Figure(figsize=figsize)
+			FigureCanvasAgg(fig)
+			instrumentation.count('figures created')
+
+		with self._lock:
+			if reused:
+				self.reused += 1
+			else:
+				self.created += 1
+			self._used[fig] = (kind, offscreen, [])
+		return fig
+
+	def connect(self, fig, event, callback):
+		"""
+			Connect callback to an event of the figure's canvas until the figure is released
+		"""
+		cid = fig.canvas.mpl_connect(event, callback)
+		self.track(fig, cid)
+		return cid
+
+	def track(self, fig, cid):
+		"""
+			Disconnect an existing connection of the figure's canvas once the figure is released
+		"""
+		with self._lock:
+			if fig in self._used:
+				self._used[fig][2].append(cid)
+
+	def release(self, fig):
+		"""
+			Return a figure to the pool; executed in the GUI thread
+		"""
+		with self._lock:
+			if fig not in self._used:
+				return
+			kind, offscreen, cids = self._used.pop(fig)
+		canvas = fig.canvas
+		for cid in cids:
+			canvas.mpl_disconnect(cid)
+		fig.clf()
+
+		with self._lock:
+			free = self._free.setdefault((kind, offscreen), [])
+			keep = len(free) < self._size
+			if keep:
+				free.append(fig)
+			else:
+				self.closed += 1
+
+		interactive = hasattr(canvas, 'deleteLater')
+		if keep and offscreen and interactive:
+			# the interactive canvas must not be drawn in another thread
+			FigureCanvasAgg(fig)
+		elif keep and interactive:
+			# keep the canvas alive when the widget it is shown in is deleted
+			canvas.setParent(None)
+			return
+		if interactive:
+			canvas.deleteLater()
+
+	def release_all(self):
+		"""
+			Return all figures in use to the pool
+		"""
+		with self._lock:
+			figures = list(self._used)
+		for fig in figures:
+			self.release(fig)
+
+	def stats(self):
+		"""
+			Number of figures created, reused, closed, in use and free
+		"""
+		with self._lock:
+			return OrderedDict([('created', self.created),
+			                    ('reused', self.reused),
+			                    ('closed', self.closed),
+			                    ('in use', len(self._used)),
+			                    ('free', sum(len(free) for free in self._free.values()))])
+
+
 class Analysis:
 
-	def __init__(self, data_handler, category_table_cb):
-		self.reset_plots()    # close all open figures to avoid unnecessary memory usage
+	def __init__(self, data_handler, category_table_cb, pool=None, render_cache=None, executor=None):
+		# figures are reused across imports if the pool is shared
+		self._pool = pool or FigurePool()
+		# with an executor the figures are built and drawn in its worker, off the GUI thread
+		self._executor = executor
+		self._pending = []
+		self.reset_plots()    # release all figures to avoid unnecessary memory usage
 		self._data_handler = data_handler
 		self._category_table_callback = category_table_cb
-		plt.style.use('ggplot')
+		self._render_cache = render_cache
+		self._style = 'ggplot'
+		plt.style.use(self._style)
 
-		self._day_balance_cursor = None
-		self._day_overview_cursor = None
 		self._expense_color = 'mediumseagreen'
 		self._income_color = 'orangered'
 
 	def reset_plots(self):
 		"""
-			Delete all plots for redrawing
+			Release all plots for redrawing
+		"""
+		self.wait_rendering()
+		self._pool.release_all()
+		# artists of the built figures by chart name resp. category alias, to update them in place
+		self._charts = OrderedDict()
+		self._category_charts = OrderedDict()
+
+	def _forget_figures(self, figures):
+		"""
+			Drop the closed figures from the updatable charts
+		"""
+		for charts in (self._charts, self._category_charts):
+			for name in [name for name, chart in charts.items() if chart['fig'] in figures]:
+				del charts[name]
+
+	def release_figures(self, widget):
+		"""
+			Release the figures of all canvases within widget, which is about to be deleted
+		"""
+		from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+		from libs.rasterchart import RasterChart
+		self.wait_rendering()
+		figures = []
+		for widget_type in (FigureCanvas, RasterChart):
+			figures.extend(child.figure for child in widget.findChildren(widget_type))
+			if isinstance(widget, widget_type):
+				figures.append(widget.figure)
+		# a chart shows its canvas once it has been used, both refer to the same figure
+		figures = [fig for fig in OrderedDict.fromkeys(figures) if fig is not None]
+		for fig in figures:
+			self._pool.release(fig)
+		self._forget_figures(figures)
+
+	def wait_rendering(self):
+		"""
+			Wait until the worker finished building and drawing the figures; has to be
+			called before the data or the figures are changed in the GUI thread
+		"""
+		if self._pending:
+			wait(self._pending)
+			self._pending = []
+
+	def _submit(self, func, *args):
+		"""
+			Run func in the worker
+		"""
+		future = self._executor.submit(func, *args)
+		self._pending = [pending for pending in self._pending if not pending.done()] + [future]
+		return future
+
+	def _acquire(self, kind, figsize=None):
+		"""
+			Get a figure of the pool, figures drawn by the worker keep an Agg canvas
+		"""
+		return self._pool.acquire(kind, figsize, offscreen=self._executor is not None)
+
+	def _to_display(self, values):
+		"""
+			Convert amounts of the data handler into display values
 		"""
-		plt.close("all")
+		return self._data_handler.to_display(values)
 
 	def _create_categories(self, data):
 		categories = [[]] * len(data.keys())
 		counter = 0
 
 		for values in data.values():
-			categories[counter] = list(values.values())
+			categories[counter] = list(self._to_display(list(values.values())))
 			counter += 1
 
 		return categories
 
+	def _label_position(self, rect, horizontal=False):
+		"""
+			Text and position of the label of a bar
+		"""
+		if horizontal:
+			width = rect.get_width()
+			text = '%d' % int(width)
+			return text, (width + (len(text) * 800), rect.get_y() + rect.get_height() / 2. + 0.125)
+		h = rect.get_height()
+		return '%d' % int(h), (rect.get_x()+rect.get_width()/2., h*1.03)
+
 	def _autolabel(self, rects, ax, horizontal=False):
 		"""
-			Label bars with the numbers they represent
+			Label bars with the numbers they represent; returns the labels
 		"""
+		labels = []
 		for rect in rects:
-			if horizontal:
-				width = rect.get_width()
-				text = '%d' % int(width)
-				x = width + (len(text) * 800)
+			text, (x, y) = self._label_position(rect, horizontal)
+			labels.append(ax.text(x, y, text, ha='center', va='bottom'))
+		return labels
 
-				y = rect.get_y() + rect.get_height() / 2. + 0.125
-				ax.text(x, y, text, ha='center', va='bottom')
-			else:
-				h = rect.get_height()
-				text = '%d' % int(h)
-				ax.text(rect.get_x()+rect.get_width()/2., h*1.03, text, ha='center', va='bottom')
+	def _update_labels(self, rects, labels, horizontal=False):
+		"""
+			Move the labels of resized bars and update their numbers
+		"""
+		for rect, label in zip(rects, labels):
+			text, position = self._label_position(rect, horizontal)
+			label.set_text(text)
+			label.set_position(position)
 
 	def _round_up(self, x):
 		"""
@@ -147,7 +360,7 @@ class Analysis:
 			Calculate the maximum value to be displayed and the interval
 			in which the numbers should occure
 		"""
-		max_val = max(values)
+		max_val = np.max(values)
 		new_max_val = max_val + (max_val * 3 / 5.0)
 
 		if not picky:
@@ -170,79 +383,123 @@ class Analysis:
 		cm = plt.cm.get_cmap('seismic')
 		return [cm(1. * i / num) for i in range(num)]
 
-	def _create_category_bar_charts(self, data):
+	def _create_category_bar_chart(self, fig, categorized_data, bar_legend_labels_date, index, colors):
 		"""
-			Create all category bar charts
+			Create the bar chart of the category at position index of the
+			categorized data; returns the bars mapped to their date legend
 		"""
-		# the legend labels for each single bar
-		bar_legend_labels_date = list(data.keys())
-		category_aliases = self._data_handler.get_category_aliases(empty=False)
 		# the x locations for tshe category
 		x_location_categories = np.arange(1)
 		bar_width = 0.05
 
+		ax = fig.add_subplot(111)
+
+		category_blocks = []
+		x_location = 0
+		displayed_values = []
+		for i in range(len(categorized_data)):
+			if categorized_data[i]:
+				val = categorized_data[i][index]
+				rect = ax.bar(x_location_categories + x_location, [val], bar_width, color=colors[i], picker=5)
+				category_blocks.append(rect)
+				x_location += bar_width
+				displayed_values.append(val)
+
+		single_block = OrderedDict()
+		for bar, l in zip(category_blocks, bar_legend_labels_date):
+			single_block[bar] = l
+
+		# calculate the maximum display value and the interval
+		max_val, increase = self._get_increase_value(displayed_values)
+		# set the y-axis label values
+		ax.set_yticks(np.arange(0, max_val, increase))
+		# don't show any x-axis labels
+		ax.set_xticks([])
+
+		# shrink current axis so that the legend can be displayed without
+		# overlapping the bar charts
+		box = ax.get_position()
+		ax.set_position([box.x0, box.y0, box.width*0.8, box.height])
+		# put a legend to the right of the current axis
+		ax.legend(([x[0] for x in category_blocks]), bar_legend_labels_date, fontsize='small', bbox_to_anchor=(1.4, 1), ncol=2)
+
+		# put the actual numbers on top of the charts
+		for rec in category_blocks:
+			self._autolabel(rec, ax)
+
+		return single_block
+
+	def _create_category_bar_charts(self, data, aliases=None):
+		"""
+			Create the category bar charts of all (or only the given) aliases
+		"""
+		# the legend labels for each single bar
+		bar_legend_labels_date = list(data.keys())
+		category_aliases = self._data_handler.get_category_aliases(empty=False)
+
 		# categorize the data and build the category blocks to be displayed
 		categorized_data = self._create_categories(data)
 		# get the color spectrum for the single bars
 		colors = self._get_colors(len(bar_legend_labels_date))
 
 		figures = OrderedDict()
-		self._categorized_barlist = OrderedDict()
+		if aliases is None:
+			self._categorized_barlist = OrderedDict()
 
 		for j in range(len(category_aliases)):
-			fig = plt.figure()
-			ax = fig.add_subplot(111)
-
-			category_blocks = []
-			x_location = 0
-			displayed_values = []
-			for i in range(len(categorized_data)):
-				if categorized_data[i]:
-					val = categorized_data[i][j]
-					rect = ax.bar(x_location_categories + x_location, [val], bar_width, color=colors[i], picker=5)
-					category_blocks.append(rect)
-					x_location += bar_width
-					displayed_values.append(val)
-
-			single_block = OrderedDict()
-			for bar, l in zip(category_blocks, bar_legend_labels_date):
-				single_block[bar] = l
-
+			if aliases is not None and category_aliases[j] not in aliases:
+				continue
+			fig = self._acquire('category')
 			# remember the generated bar charts to be able to handle a
 			# click event later to load the correct data
-			self._categorized_barlist[category_aliases[j]] = single_block
-			# calculate the maximum display value and the interval
-			max_val, increase = self._get_increase_value(displayed_values)
-			# set the y-axis label values
-			ax.set_yticks(np.arange(0, max_val, increase))
-			# don't show any x-axis labels
-			ax.set_xticks([])
+			self._categorized_barlist[category_aliases[j]] = self._create_category_bar_chart(fig, categorized_data, bar_legend_labels_date, j, colors)
+			self._category_charts[category_aliases[j]] = {'fig': fig, 'labels': bar_legend_labels_date,
+			                                              'values': self._category_values(categorized_data, j)}
+			figures[category_aliases[j]] = fig
 
-			# shrink current axis so that the legend can be displayed without
-			# overlapping the bar charts
-			box = ax.get_position()
-			ax.set_position([box.x0, box.y0, box.width*0.8, box.height])
-			# put a legend to the right of the current axis
-			ax.legend(([x[0] for x in category_blocks]), bar_legend_labels_date, fontsize='small', bbox_to_anchor=(1.4, 1), ncol=2)
+		return figures
 
-			# put the actual numbers on top of the charts
-			for rec in category_blocks:
-				self._autolabel(rec, ax)
+	def _category_values(self, categorized_data, index):
+		"""
+			Values of the bars of the category at position index, only months with data have a bar
+		"""
+		return [values[index] for values in categorized_data if values]
 
-			figures[category_aliases[j]] = fig
+	def _update_category_bar_chart(self, alias, categorized_data, bar_legend_labels_date, index, colors):
+		"""
+			Update the bar chart of a category in place; the chart is redrawn into its
+			figure if the months changed. Returns whether anything changed
+		"""
+		chart = self._category_charts[alias]
+		values = self._category_values(categorized_data, index)
+		if bar_legend_labels_date != chart['labels'] or len(values) != len(chart['values']):
+			chart['fig'].clf()
+			self._categorized_barlist[alias] = self._create_category_bar_chart(chart['fig'], categorized_data, bar_legend_labels_date, index, colors)
+		elif values == chart['values']:
+			return False
+		else:
+			rects = [bars[0] for bars in self._categorized_barlist[alias]]
+			for rect, value in zip(rects, values):
+				rect.set_height(value)
+			ax = chart['fig'].axes[0]
+			# the bar labels are the only texts of the axes
+			self._update_labels(rects, ax.texts)
+			max_val, increase = self._get_increase_value(values)
+			ax.set_yticks(np.arange(0, max_val, increase))
+			ax.relim()
+			ax.autoscale_view()
 
-		return figures
+		chart['labels'], chart['values'] = bar_legend_labels_date, values
+		return True
 
 	def _create_overall_bar_chart(self, fig):
 		"""
 			Create the overall bar chart
 		"""
 		# get the income and expenses and calculate the differnce which is displayed as well
-		income, expenses = self._data_handler.get_total_in_out()
-		diff = income - expenses
+		bar_values, diff = self._overall_values()
 
 		labels = ('Income', 'Expense', 'Difference')
-		bar_values = [income, expenses, abs(diff)]
 		indexes = np.arange(len(labels))
 		bar_width = 0.5
 
@@ -253,10 +510,7 @@ class Analysis:
 		# the color for the difference depends on if it's a negative or positive value
 		barlist[0].set_color(self._expense_color)
 		barlist[1].set_color(self._income_color)
-		if diff > 0:
-			barlist[2].set_color(self._expense_color)
-		else:
-			barlist[2].set_color(self._income_color)
+		self._set_difference_color(barlist[2], diff)
 
 		# set y-axis label index
 		indexes = indexes + 0.25
@@ -272,21 +526,49 @@ class Analysis:
 		# max_val, increase = self._get_increase_value([expenses, income])
 		# ax.set_xticks(np.arange(0, max_val, increase))
 
-		self._autolabel(barlist, ax, horizontal=True)
+		texts = self._autolabel(barlist, ax, horizontal=True)
+		self._charts['overview'] = {'fig': fig, 'ax': ax, 'bars': barlist, 'texts': texts, 'values': bar_values}
+
+	def _overall_values(self):
+		"""
+			Income, expenses and the absolute difference to be displayed and the difference
+		"""
+		income, expenses = self._to_display(self._data_handler.get_total_in_out())
+		diff = income - expenses
+		return [income, expenses, abs(diff)], diff
+
+	def _set_difference_color(self, bar, diff):
+		"""
+			The color for the difference depends on if it's a negative or positive value
+		"""
+		if diff > 0:
+			bar.set_color(self._expense_color)
+		else:
+			bar.set_color(self._income_color)
+
+	def _update_overall_bar_chart(self, chart):
+		"""
+			Update the overall bar chart in place; returns whether anything changed
+		"""
+		bar_values, diff = self._overall_values()
+		if bar_values == chart['values']:
+			return False
+
+		for bar, value in zip(chart['bars'], bar_values):
+			bar.set_width(value)
+		self._set_difference_color(chart['bars'][2], diff)
+		self._update_labels(chart['bars'], chart['texts'], horizontal=True)
+		chart['ax'].relim()
+		chart['ax'].autoscale_view()
+		chart['values'] = bar_values
+		return True
 
 	def _create_month_bar_chart(self, fig):
 		"""
 			Create the per month overview bar chart
 		"""
 		data = self._data_handler.get_total_month()
-
-		# set the income and expense for each month to be displayed
-		expenses, income = [], []
-		for key, values in data.items():
-			income.append(values[0])
-			expenses.append(values[1])
-
-		categories = [expenses, income]
+		categories = self._month_values(data)
 		x_label_months = np.arange(len(data.keys()))
 		bar_width = 0.35
 		colors = [self._income_color, self._expense_color]
@@ -324,23 +606,63 @@ class Analysis:
 		ax.legend(([x[0] for x in bar_categories]), bar_labels, fontsize='small')
 
 		# put the actual numbers on top of the bars
-		for rec in bar_categories:
-			self._autolabel(rec, ax)
+		texts = [self._autolabel(rec, ax) for rec in bar_categories]
+		self._charts['month'] = {'fig': fig, 'ax': ax, 'bars': bar_categories, 'texts': texts,
+		                         'labels': list(data.keys()), 'values': categories}
 
 		# needed otherwise x-labels get cut off
 		fig.tight_layout()
 
-	def _day_chart_creator(self, fig, data, date_format, title):
+	def _month_values(self, data):
+		"""
+			Display values of the month bars
+		"""
+		# set the income and expense for each month to be displayed
+		expenses, income = [], []
+		for key, values in data.items():
+			income.append(values[0])
+			expenses.append(values[1])
+
+		return [self._to_display(expenses), self._to_display(income)]
+
+	def _update_month_bar_chart(self, chart):
+		"""
+			Update the month bar chart in place; the chart is redrawn into its
+			figure if the months changed. Returns whether anything changed
+		"""
+		data = self._data_handler.get_total_month()
+		if list(data.keys()) != chart['labels']:
+			chart['fig'].clf()
+			self._create_month_bar_chart(chart['fig'])
+			return True
+
+		categories = self._month_values(data)
+		if all(np.array_equal(new, old) for new, old in zip(categories, chart['values'])):
+			return False
+
+		for rects, texts, values in zip(chart['bars'], chart['texts'], categories):
+			for rect, value in zip(rects, values):
+				rect.set_height(value)
+			self._update_labels(rects, texts)
+		chart['ax'].relim()
+		chart['ax'].autoscale_view()
+		max_val, increase = self._get_increase_value([max(categories[0]), max(categories[1])])
+		chart['ax'].set_yticks(np.arange(0, max_val, increase))
+		chart['values'] = categories
+		return True
+
+	def _day_chart_creator(self, fig, dates, values, date_format, title, name):
 		"""
 			Line chart creator for the day figures
 		"""
 		# the x values represent the days and the y values the amount of expenses
-		x = list(data.keys())
-		y = list(data.values())
+		x = datetime64_to_num(dates)
+		y = values
 
 		ax = fig.add_subplot(111)
 		ax.xaxis_date()
-		ax.plot(x, y, marker='o')
+		line, = ax.plot(x, y, marker='o')
+		self._charts[name] = {'fig': fig, 'ax': ax, 'line': line, 'x': x, 'y': y, 'cursor': None}
 
 		max_val, increase = self._get_increase_value(y, picky=True)
 		ax.set_yticks(np.arange(0, max_val, increase))
@@ -350,70 +672,285 @@ class Analysis:
 		ax.set_title(title, fontweight='bold', fontsize=15)
 
 		fig.autofmt_xdate()
-		canvas = FigureCanvas(fig)
-		cursor = FollowDotCursor(ax, x, y, tolerance=20)
-		return canvas, cursor
+		return ax, x, y
+
+	def _update_day_chart(self, chart, dates, values):
+		"""
+			Update a day line chart in place; returns whether anything changed
+		"""
+		x = datetime64_to_num(dates)
+		y = values
+		if np.array_equal(x, chart['x']) and np.array_equal(y, chart['y'], equal_nan=True):
+			return False
+
+		ax = chart['ax']
+		chart['line'].set_data(x, y)
+		ax.relim()
+		ax.autoscale_view()
+		max_val, increase = self._get_increase_value(y, picky=True)
+		ax.set_yticks(np.arange(0, max_val, increase))
+		ax.xaxis.set_major_locator(mdates.DayLocator(interval=self._data_handler.get_day_interval()))
+		if chart['cursor']:
+			chart['cursor'].set_data(x, y)
+		chart['x'], chart['y'] = x, y
+		return True
+
+	def _connect_cursor(self, name):
+		"""
+			Let a dot follow the data points of a day figure
+		"""
+		chart = self._charts[name]
+		chart['cursor'] = FollowDotCursor(chart['ax'], chart['x'], chart['y'], tolerance=20)
+		self._pool.track(chart['fig'], chart['cursor'].cid)
+
+	def _connect_category_pick(self, fig):
+		"""
+			Load the transactions of a clicked bar of a category figure
+		"""
+		self._pool.connect(fig, 'pick_event', self._cb_on_category_pick)
 
 	def _cb_on_category_pick(self, event):
 		"""
 			Callback function for handling single bar chart selections
 		"""
 		rect = event.artist
-		for category, single_category in self._categorized_barlist.items():
+		# the worker might add the bars of further categories meanwhile
+		for category, single_category in list(self._categorized_barlist.items()):
 			for bars, date in single_category.items():
 				for bar in bars:
 					if rect == bar:
 						df = self._data_handler.get_categorized_data_sets(date, category)
 						self._category_table_callback(df, category)
 
+	def _create_canvas(self, fig):
+		"""
+			Wrap a figure into a Qt canvas, the canvas of a reused figure is kept;
+			the Qt backend is only loaded when figures are displayed in the GUI
+		"""
+		from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+		if isinstance(fig.canvas, FigureCanvas):
+			return fig.canvas
+		with instrumentation.timed('canvas'):
+			return FigureCanvas(fig)
+
+	def _create_chart(self, build, connect=None):
+		"""
+			Create the widget showing the figure created by build, connect(fig) sets up the
+			interaction with its canvas. With an executor the figure is built and drawn in the
+			worker and its image is shown until the mouse enters it, only then the canvas is created
+		"""
+		def create_canvas(fig):
+			canvas = self._create_canvas(fig)
+			if connect is not None:
+				connect(fig)
+			return canvas
+
+		if self._executor is None:
+			return create_canvas(build())
+
+		from libs.rasterchart import RasterChart
+		return RasterChart(build, create_canvas, self._submit, self._pool.track)
+
+	def build_overall_overview(self):
+		"""
+			Build overall overview figure
+		"""
+		with instrumentation.timed('figure overview'):
+			fig = self._acquire('overview', figsize=(1, 3))
+			self._create_overall_bar_chart(fig)
+			return fig
+
+	def build_monthly_overview(self):
+		"""
+			Build month overview figure
+		"""
+		with instrumentation.timed('figure month'):
+			fig = self._acquire('month')
+			self._create_month_bar_chart(fig)
+			return fig
+
+	def build_category_details(self, aliases=None):
+		"""
+			Build the figures of all (or only the given) categories
+		"""
+		with instrumentation.timed('figure categories'):
+			details = self._data_handler.get_calculated_categories()
+			return self._create_category_bar_charts(details, aliases)
+
+	def build_day_overview(self):
+		"""
+			Build the day overview figure
+		"""
+		with instrumentation.timed('figure day'):
+			fig = self._acquire('day')
+			dates, amounts, date_format = self._data_handler.get_total_day_arrays()
+			return fig, self._day_chart_creator(fig, dates, self._to_display(amounts), date_format, 'Day overview', 'day')
+
+	def build_day_balance(self):
+		"""
+			Build the day balance figure
+		"""
+		with instrumentation.timed('figure balance'):
+			fig = self._acquire('day')
+			dates, balances, date_format = self._data_handler.get_days_balance_arrays()
+			return fig, self._day_chart_creator(fig, dates, self._to_display(balances), date_format, 'Balance overview', 'balance')
+
 	def create_overall_overview(self):
 		"""
 			Create overall overview figure
 		"""
-		fig = plt.figure(figsize=(1, 3))
-		self._create_overall_bar_chart(fig)
-		canvas = FigureCanvas(fig)
-		return canvas
+		return self._create_chart(self.build_overall_overview)
 
 	def create_monthly_overview(self):
 		"""
 			Create month overview figure
 		"""
-		fig = plt.figure()
-
-		self._create_month_bar_chart(fig)
-		canvas = FigureCanvas(fig)
-		return canvas
+		return self._create_chart(self.build_monthly_overview)
 
-	def create_category_detail(self):
+	def create_category_detail(self, aliases=None):
 		"""
-			Create all category figures
+			Create the figures of all (or only the given) categories
 		"""
-		details = self._data_handler.get_calculated_categories()
-		figures = self._create_category_bar_charts(details)
+		if self._executor is None:
+			figures = self.build_category_details(aliases)
+			for key, value in figures.items():
+				figures[key] = self._create_chart(lambda fig=value: fig, self._connect_category_pick)
+			return figures
 
-		for key, value in figures.items():
-			canvas = FigureCanvas(value)
-			canvas.mpl_connect('pick_event', self._cb_on_category_pick)
-			figures[key] = canvas
+		# every category is built as a task of its own
+		if aliases is None:
+			self._categorized_barlist = OrderedDict()
+		figures = OrderedDict()
+		for alias in self._data_handler.get_category_aliases(empty=False):
+			if aliases is None or alias in aliases:
+				figures[alias] = self._create_chart(lambda alias=alias: self.build_category_details([alias])[alias],
+				                                    self._connect_category_pick)
 		return figures
 
 	def create_day_overview(self):
 		"""
 			Create the day overview figure
 		"""
-		fig = plt.figure()
-		data, date_format = self._data_handler.get_total_day()
-		canvas, cursor = self._day_chart_creator(fig, data, date_format, 'Day overview')
-		self._day_overview_cursor = cursor
-		return canvas
+		return self._create_chart(lambda: self.build_day_overview()[0], lambda fig: self._connect_cursor('day'))
 
 	def create_day_balance(self):
 		"""
 			Create the day balance figure
 		"""
-		fig = plt.figure()
-		data, date_format = self._data_handler.get_days_balance()
-		canvas, cursor = self._day_chart_creator(fig, data, date_format, 'Balance overview')
-		self._day_balance_cursor = cursor
-		return canvas
+		return self._create_chart(lambda: self.build_day_balance()[0], lambda fig: self._connect_cursor('balance'))
+
+	def update_figures(self):
+		"""
+			Update the built figures in place with the current data instead of recreating them;
+			only figures whose values changed are redrawn, once each. The categories to
+			display have to be unchanged. Returns the aliases of the updated category figures
+		"""
+		self.wait_rendering()
+		with instrumentation.timed('figure update'):
+			changed = []
+			if 'overview' in self._charts and self._update_overall_bar_chart(self._charts['overview']):
+				changed.append(self._charts['overview']['fig'])
+			if 'month' in self._charts and self._update_month_bar_chart(self._charts['month']):
+				changed.append(self._charts['month']['fig'])
+			if 'day' in self._charts:
+				dates, amounts, date_format = self._data_handler.get_total_day_arrays()
+				if self._update_day_chart(self._charts['day'], dates, self._to_display(amounts)):
+					changed.append(self._charts['day']['fig'])
+			if 'balance' in self._charts and self._data_handler.has_balances():
+				dates, balances, date_format = self._data_handler.get_days_balance_arrays()
+				if self._update_day_chart(self._charts['balance'], dates, self._to_display(balances)):
+					changed.append(self._charts['balance']['fig'])
+
+			updated = []
+			if self._category_charts:
+				details = self._data_handler.get_calculated_categories()
+				bar_legend_labels_date = list(details.keys())
+				categorized_data = self._create_categories(details)
+				colors = self._get_colors(len(bar_legend_labels_date))
+				for j, alias in enumerate(self._data_handler.get_category_aliases(empty=False)):
+					if alias in self._category_charts and \
+							self._update_category_bar_chart(alias, categorized_data, bar_legend_labels_date, j, colors):
+						changed.append(self._category_charts[alias]['fig'])
+						updated.append(alias)
+
+			for fig in changed:
+				fig.canvas.draw_idle()
+			return updated
+
+	def _render(self, chart, inputs, build, fmt, dpi, figsize):
+		"""
+			Render the figure created by build to image bytes; with a render cache the
+			figure is only built if no image of the same inputs is cached yet
+		"""
+		key = None
+		if self._render_cache is not None:
+			key = self._render_cache.key(chart, inputs(), fmt, dpi, figsize, self._style, self._expense_color,
+			                             self._income_color, matplotlib.__version__)
+			data = self._render_cache.get(key, fmt)
+			if data is not None:
+				instrumentation.count('render cache hits')
+				return data
+			instrumentation.count('render cache misses')
+		if build is None:
+			return None
+
+		fig = build()
+		if figsize:
+			fig.set_size_inches(*figsize)
+		buffer = io.BytesIO()
+		with instrumentation.timed('render'):
+			fig.savefig(buffer, format=fmt, dpi=dpi, bbox_inches='tight')
+		self._pool.release(fig)
+		self._forget_figures([fig])
+
+		data = buffer.getvalue()
+		if key is not None:
+			self._render_cache.put(key, fmt, data)
+		return data
+
+	def render(self, chart, fmt='png', dpi=100, figsize=None):
+		"""
+			Render the overview, month, day or balance chart to image bytes
+		"""
+		if chart == 'overview':
+			inputs, build = lambda: self._overall_values(), self.build_overall_overview
+		elif chart == 'month':
+			def inputs():
+				data = self._data_handler.get_total_month()
+				return list(data.keys()), self._month_values(data)
+			build = self.build_monthly_overview
+		elif chart == 'day':
+			def inputs():
+				dates, amounts, date_format = self._data_handler.get_total_day_arrays()
+				return dates, self._to_display(amounts), date_format, self._data_handler.get_day_interval()
+			build = lambda: self.build_day_overview()[0]
+		elif chart == 'balance':
+			def inputs():
+				dates, balances, date_format = self._data_handler.get_days_balance_arrays()
+				return dates, self._to_display(balances), date_format, self._data_handler.get_day_interval()
+			build = lambda: self.build_day_balance()[0]
+		else:
+			raise ValueError('Unknown chart: ' + chart)
+		return self._render(chart, inputs, build, fmt, dpi, figsize)
+
+	def category_values(self):
+		"""
+			Month labels and the display values of the categories of each month, as rendered by render_category
+		"""
+		details = self._data_handler.get_calculated_categories()
+		return list(details.keys()), self._create_categories(details)
+
+	def render_category(self, categorized_data, bar_legend_labels_date, index, fmt='png', dpi=100, figsize=None, cached_only=False):
+		"""
+			Render the chart of the category at position index of the categorized data
+			to image bytes; with cached_only None is returned unless the image is cached
+		"""
+		def inputs():
+			return bar_legend_labels_date, [values[index] if values else None for values in categorized_data]
+
+		def build():
+			fig = self._acquire('category')
+			self._create_category_bar_chart(fig, categorized_data, bar_legend_labels_date, index, self._get_colors(len(bar_legend_labels_date)))
+			return fig
+
+		return self._render('category', inputs, None if cached_only else build, fmt, dpi, figsize)
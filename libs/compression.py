@@ -0,0 +1,58 @@
+import os
+import io
+import bz2
+import gzip
+import lzma
+import zipfile
+from collections import OrderedDict
+
+# compressed files which are decompressed while reading, by file extension
+OPENERS = OrderedDict([('gz', gzip.open), ('bz2', bz2.open), ('xz', lzma.open)])
+# archives which may contain several import files
+ARCHIVE = 'zip'
+# errors of damaged compressed files
+ERRORS = (OSError, EOFError, zipfile.BadZipFile, lzma.LZMAError)
+# only text files can be decompressed while parsing
+STREAMABLE_TYPES = ['csv']
+
+
+def split_extension(name):
+	"""
+		Split the file type and the compression from a file name,
+		e.g. 2017.csv.gz results in ('csv', 'gz')
+	"""
+	root, ext = os.path.splitext(name)
+	ext = ext[1:].lower()
+	if ext in OPENERS or ext == ARCHIVE:
+		return os.path.splitext(root)[1][1:].lower(), ext
+	return ext, None
+
+
+def matches(name, file_type):
+	"""
+		Check if the file name is an import file of file_type, either plain or compressed;
+		the members of archives without a file type are checked while reading
+	"""
+	ext, compression = split_extension(name)
+	if compression is None:
+		return ext == file_type
+	return file_type in STREAMABLE_TYPES and (ext == file_type or (compression == ARCHIVE and not ext))
+
+
+def open_text(path, file_type):
+	"""
+		Iterate over the text streams of an import file as (name, stream): the file
+		itself, its decompressed content or every member of an archive with file_type;
+		nothing is extracted to disk
+	"""
+	compression = split_extension(path)[1]
+	if compression == ARCHIVE:
+		with zipfile.ZipFile(path) as zf:
+			for info in zf.infolist():
+				if not info.is_dir() and split_extension(info.filename)[0] == file_type:
+					with zf.open(info) as fp, io.TextIOWrapper(fp, newline='') as text:
+						yield os.path.join(path, info.filename), text
+	else:
+		opener = OPENERS.get(compression, open)
+		with opener(path, 'rt', newline='') as text:
+			yield path, text
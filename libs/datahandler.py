@@ -1,13 +1,28 @@
 from collections import OrderedDict
-from time import strptime
 import os
 import calendar
 import re
 import json
+import sqlite3
+import numpy as np
 import pandas as pd
-from io import StringIO
-from locale import *
-setlocale(LC_NUMERIC, '')
+from itertools import islice
+import locale
+from libs.aggregates import AggregateCube, INCOME, EXPENSE
+from libs.transactions import TransactionStore, contains
+from libs.sqlstore import SqlStore
+from libs.partitions import PartitionedStore, PartitionCube
+from libs.settings import files_signature
+from libs.instrumentation import instrumentation
+from libs import money
+from libs import compression
+from libs.export import CHUNK_ROWS as EXPORT_CHUNK_ROWS, write_chunks, format_of
+locale.setlocale(locale.LC_NUMERIC, '')
+
+# number of xlsx rows that are collected before they are parsed
+XLSX_CHUNK_ROWS = 50000
+# data sets of the export
+EXPORT_DATA_SETS = ['transactions', 'categories', 'days']
 
 
 class DataHandler:
@@ -15,13 +30,210 @@ class DataHandler:
 	def __init__(self, sett):
 		self._categories_container = None
 		self._data_container = None
+		self._raw_container = None
+		self._source_files = []
+		# the cube of all imported data and the one of the selected date range
+		self._full_cube = None
+		self._cube = None
+		self._month_index = None
+		# the partitions of the import directory, months which aren't loaded are read on demand
+		self._partitions = None
+		# first and last day (datetime64) of the date range, None for an open end
+		self._date_range = (None, None)
+		self._dropped_duplicates = 0
 		self._settings = sett
+		# increased whenever the imported data or the categories change
+		self.generation = 0
 		self._definitions_data = self._get_category_def()
+		# instrumentation can also be enabled by the definitions file
+		if self._definitions_data['settings'].get('profile'):
+			instrumentation.enable()
+		# as well as the database
+		if self._definitions_data['settings'].get('sql_store'):
+			self._settings.use_sql_store = True
+		# or the partitions, optionally with the number of loaded months
+		if self._definitions_data['settings'].get('partitions'):
+			self._settings.use_partitions = True
+		if 'partition_months' in self._definitions_data['settings']:
+			self._settings.partition_months = int(self._definitions_data['settings']['partition_months'])
+		# and the rendering of the figures in the background
+		if self._definitions_data['settings'].get('background_rendering'):
+			self._settings.background_rendering = True
 
 	def import_data(self, sett):
 		self._settings = sett
-		self._data_container = self._import_files()
-		self._categories_container = self._calculate_categories()
+		with instrumentation.timed('import'):
+			if self._settings.use_sql_store:
+				# all queries are answered by the database, the transactions are not kept in memory
+				self._data_container = None
+				self._full_cube = self._open_sql_store()
+			elif self._settings.use_partitions:
+				# only the most recent partitions are kept in memory
+				self._raw_container = None
+				self._data_container, self._full_cube = self._open_partitions()
+			else:
+				self._raw_container, self._source_files = self._load_files(self._settings.import_files)
+				self._data_container = self._drop_duplicates(self._raw_container)
+				with instrumentation.timed('aggregate'):
+					self._full_cube = self._build_cube(self._data_container)
+			self._categories_container = self._calculate_categories()
+		self.generation += 1
+		instrumentation.dump_configured()
+
+	def load_update(self, changed):
+		"""
+			Parse new or changed import files for an incremental update; does not modify
+			the imported data, so it can run in the background
+		"""
+		if self._settings.use_sql_store or self._settings.use_partitions or not changed:
+			# the database and the partitions are rebuilt when the import files changed,
+			# removed files need no parsing
+			return None
+		return self._load_files(changed)
+
+	def apply_update(self, changed, removed, loaded):
+		"""
+			Merge files loaded by load_update into the imported data: the rows of changed
+			and removed files are replaced and the aggregates are rebuilt from the compact store;
+			returns the year:month keys and the aliases whose values changed
+		"""
+		old_months = self.get_total_month()
+		old_categories = self._categories_container
+		self._settings.import_files = sorted((set(self._settings.import_files) - set(removed)) | set(changed))
+
+		with instrumentation.timed('update'):
+			if self._settings.use_sql_store:
+				self._full_cube = self._open_sql_store()
+			elif self._settings.use_partitions:
+				self._data_container, self._full_cube = self._open_partitions()
+			else:
+				replaced = set(changed) | set(removed)
+				stale = [i for i, file in enumerate(self._source_files) if file in replaced]
+				self._raw_container = self._raw_container.select(~np.isin(self._raw_container.sources, stale))
+				if loaded is not None:
+					store, source_files = loaded
+					# the sources of the new rows are appended to the known sources
+					store.sources = store.sources + len(self._source_files)
+					self._source_files = self._source_files + source_files
+					self._raw_container = self._raw_container.merge(store)
+				self._data_container = self._drop_duplicates(self._raw_container)
+				with instrumentation.timed('aggregate'):
+					self._full_cube = self._build_cube(self._data_container)
+			self._categories_container = self._calculate_categories()
+		self.generation += 1
+
+		new_months = self.get_total_month()
+		months = [m for m in list(new_months) + [m for m in old_months if m not in new_months] if old_months.get(m) != new_months.get(m)]
+		empty = OrderedDict()
+		aliases = [alias for alias in self.get_category_aliases()
+		           if any(old_categories.get(m, empty).get(alias) != self._categories_container.get(m, empty).get(alias)
+		                  for m in set(old_categories) | set(self._categories_container))]
+		return months, aliases
+
+	def _get_sources_signature(self):
+		"""
+			Signature of the import files and the import settings; the database
+			has to be rebuilt if it changes
+		"""
+		return {'files': files_signature(self._settings.import_files),
+		        'columns': self._settings.col_numbers,
+		        'date_format': self._settings.date_format,
+		        'money_digits': self._settings.money_digits,
+		        'drop_duplicates': self._settings.drop_duplicates}
+
+	def _open_sql_store(self):
+		"""
+			Open the database of the import directory and import the files
+			into it unless they are already up to date
+		"""
+		if isinstance(self._full_cube, SqlStore):
+			self._full_cube.close()
+		path = os.path.join(self._settings.import_dir, self._settings.sql_store_name)
+		try:
+			sql_store = SqlStore(path, money.scale(self._settings.money_digits), self._settings.fixed_point_money)
+			signature = self._get_sources_signature()
+			if sql_store.get_meta('signature') != signature:
+				sql_store.load(self._drop_duplicates(self._load_files(self._settings.import_files)[0]))
+				sql_store.set_meta('signature', signature)
+		except sqlite3.Error as e:
+			raise ImportError('Database error occured with file:\n' + path + '\n' + str(e))
+		return sql_store
+
+	def _open_partitions(self):
+		"""
+			Open the partitions of the import directory, rebuilt from the import files unless
+			they are up to date, and load the most recent months; returns the loaded transactions
+			and a cube answering the overview queries for all months
+		"""
+		partitions = PartitionedStore(os.path.join(self._settings.import_dir, self._settings.partitions_name))
+		signature = self._get_sources_signature()
+		signature['fixed_point_money'] = self._settings.fixed_point_money
+		try:
+			if partitions.signature != signature:
+				store = self._drop_duplicates(self._load_files(self._settings.import_files)[0])
+				with instrumentation.timed('aggregate'):
+					summary = self._build_cube(store)
+				partitions.write(store, summary.day_sums(), signature)
+				months = self._partition_months(partitions.months)
+				# the transactions of the loaded months are still in memory
+				start = np.searchsorted(store.days, months[0].astype('datetime64[D]').astype('int64')) if len(months) else len(store)
+				loaded = store.select(slice(start, None))
+				# with only the descriptions of the loaded months, as if they were loaded from the partitions
+				codes, uniques = pd.factorize(loaded.codes)
+				loaded.codes, loaded.descriptions = codes.astype('int32'), loaded.descriptions[uniques]
+			else:
+				summary = partitions.summary()
+				loaded = partitions.load(self._partition_months(partitions.months))
+		except (OSError, ValueError, KeyError) as e:
+			raise ImportError('Partition error occured in directory:\n' + partitions.directory + '\n' + str(e))
+
+		with instrumentation.timed('aggregate'):
+			cube = PartitionCube(summary, self._build_cube(loaded), partitions, self._build_cube)
+		self._partitions = partitions
+		return loaded, cube
+
+	def _range_months(self, months):
+		"""
+			Months within the date range
+		"""
+		first_day, last_day = self._date_range
+		sel = np.ones(len(months), dtype=bool)
+		if first_day is not None:
+			sel &= months >= first_day.astype('datetime64[M]')
+		if last_day is not None:
+			sel &= months <= last_day.astype('datetime64[M]')
+		return months[sel]
+
+	def _partition_months(self, months):
+		"""
+			Months of the partitions to load: the months of the date range
+			if one is set, otherwise the most recent ones
+		"""
+		first_day, last_day = self._date_range
+		if first_day is not None or last_day is not None:
+			return self._range_months(months)
+		if self._settings.partition_months > 0:
+			return months[-self._settings.partition_months:]
+		return months
+
+	def get_unloaded_months(self):
+		"""
+			Months of the date range whose partitions aren't loaded, in ascending order;
+			these are older than the loaded months and read on demand
+		"""
+		if self._partitions is None or not self._settings.use_partitions:
+			return np.array([], dtype='datetime64[M]')
+		months = self._range_months(self._partitions.months)
+		return months[~np.isin(months, self._full_cube.loaded_months)]
+
+	def _load_partition(self, month):
+		"""
+			Transactions of a partition which isn't loaded and their categorized cube
+		"""
+		store = self._partitions.load([month])
+		cube = self._build_cube(store)
+		cube.categorize(*self._category_regexes())
+		return store, cube
 
 	def _get_category_def(self):
 		"""
@@ -46,16 +258,14 @@ class DataHandler:
 			Handle uncategorized entries from import data
 		"""
 		unknown = self._definitions_data['categories'].setdefault('Unknown', [])
-		if not uncategorized.empty:
-			rows = [row.strip() for row in uncategorized[[self._settings.column_description]].to_string(index=False, header=False).split('\n')]
-			unknown.extend(rows)
+		unknown.extend([('%s' % row).strip() for row in uncategorized])
 		self._write_definitions()
 
 	def _write_definitions(self):
 		"""
 			Write definitions settings to file
 		"""
-		with open(self._definitions_path, 'w') as fp:
+		with instrumentation.timed('definitions write'), open(self._definitions_path, 'w') as fp:
 			json.dump(self._definitions_data, fp, indent=4)
 
 	def update_entries(self, entry1, entry2, action, new_value=''):
@@ -85,7 +295,28 @@ class DataHandler:
 		# delete unknwon categories for recalculation
 		del self._definitions_data['categories']['Unknown']
 		# recalculate the categories
-		self._categories_container = self._calculate_categories()
+		with instrumentation.timed('update entries'):
+			self._categories_container = self._calculate_categories()
+		self.generation += 1
+
+	def reload_definitions(self):
+		"""
+			Read the category definitions again after they were changed by another process;
+			returns whether the category rules changed and the categories were recalculated
+		"""
+		def rules(data):
+			return [(alias, values) for alias, values in data['categories'].items() if alias != 'Unknown']
+
+		data = self._get_category_def()
+		if rules(data) == rules(self._definitions_data):
+			return False
+		self._definitions_data = data
+		# the unknown categories are recalculated as well
+		self._definitions_data['categories'].pop('Unknown', None)
+		with instrumentation.timed('update entries'):
+			self._categories_container = self._calculate_categories()
+		self.generation += 1
+		return True
 
 	def save_settings(self):
 		"""
@@ -93,9 +324,15 @@ class DataHandler:
 			Reopening the same import directory will therefore not require to set the same settings
 			over and over again
 		"""
-		self._definitions_data['settings'] = OrderedDict({'file_type': self._settings.file_type,
-		                                                  'date_format': self._settings.date_format,
-		                                                  'columns': self._settings.col_numbers})
+		# other entries such as manually added options are kept
+		self._definitions_data['settings'] = OrderedDict(self._definitions_data['settings'])
+		self._definitions_data['settings'].update([('file_type', self._settings.file_type),
+		                                           ('date_format', self._settings.date_format),
+		                                           ('columns', self._settings.col_numbers)])
+		# the determined file format, reopening the import directory will not analyze the files again
+		sniff_results = self._settings.get_sniff_results()
+		if sniff_results:
+			self._definitions_data['settings']['format'] = sniff_results
 		self._write_definitions()
 
 	def get_settings(self):
@@ -119,110 +356,189 @@ class DataHandler:
 		except:
 			return []
 
-	def _cb_str_to_float(self, value):
-		"""
-			Callback function for csv read to get the possible float from a string
-		"""
-		if value:
-			if isinstance(value, type('')):
-				try:
-					if '.' in value and ',' in value:
-						pos1 = value.find('.')
-						pos2 = value.find(',')
-						if pos1 > pos2:
-							value = value.replace(',', '', 1)
-						else:
-							value = value.replace('.', '', 1)
-					return atof(value)
-				except:
-					raise ValueError('Could not convert value to flaot: ' + value)
-			elif type(value) in [int, float]:
-				return value
-			else:
-				raise ValueError('Unknown type: ' + type(value).__name__ + ' for value: ' + repr(value))
-		else:
-			return None
-
-	def _cb_date_parser(self, x):
+	def _parse_dates(self, values):
 		"""
-			Callback function for csv read to get correct date format
+			Parse the date column with the chosen date format
 		"""
+		if np.issubdtype(values.dtype, np.datetime64):
+			return values
 		try:
-			return pd.datetime.strptime(x, self._settings.date_format)
-		except TypeError:
-			raise TypeError("Parsing to date format failed for value: " + repr(x))
+			return pd.to_datetime(values.astype(object), format=self._settings.date_format)
+		except (TypeError, ValueError) as e:
+			raise ValueError('Parsing to date format failed: ' + e.args[0])
+
+	def _parse_columns(self, df):
+		"""
+			Parse dates and convert amounts and balances into integer minor units;
+			missing balances are kept as NaN
+		"""
+		col_amount = self._settings.column_amount
+		col_balance = self._settings.column_balance
+
+		df[self._settings.column_date] = self._parse_dates(df[self._settings.column_date])
+		df[col_amount] = money.parse_amounts(df[col_amount].values, self._settings.money_digits)[0]
+		if col_balance is not None and col_balance in df:
+			balances, missing = money.parse_amounts(df[col_balance].values, self._settings.money_digits)
+			df[col_balance] = np.where(missing, np.nan, balances)
+		return df
 
-	def _prepare_import_file(self, file):
+	def _raw_columns(self):
 		"""
-			Load import data from file and if not present add a custome header to the data
+			Columns which are read as raw values and parsed afterwards
 		"""
-		with open(file, 'r') as fp:
-			data = fp.read()
-			if not self._settings.has_header:
-				try:
-					data = self._settings.custom_header + data
-				except Exception:
-					raise ValueError('Header missing!')
-			return StringIO(data)
+		columns = [self._settings.column_date, self._settings.column_amount, self._settings.column_balance]
+		return {col: object for col in columns if col is not None}
 
 	def _import_csv(self, import_data):
 		"""
-			Import csv data
+			Import csv data from a text stream; if not present in the data
+			the custom header is used as column names
 		"""
-		return pd.read_csv(import_data,
-		                   delimiter=self._settings.delimiter,
-		                   header=0,
-		                   parse_dates=[self._settings.column_date],
-		                   date_parser=self._cb_date_parser,
-		                   converters={self._settings.column_amount: self._cb_str_to_float,
-		                               self._settings.column_balance: self._cb_str_to_float})
+		if not self._settings.has_header and not self._settings.header:
+			raise ValueError('Header missing!')
+		df = pd.read_csv(import_data,
+		                 delimiter=self._settings.delimiter,
+		                 quotechar=self._settings.quotechar,
+		                 header=0 if self._settings.has_header else None,
+		                 names=None if self._settings.has_header else self._settings.header,
+		                 dtype=self._raw_columns())
+		return self._parse_columns(df)
 
 	def _import_excel(self, file):
 		"""
 			Import excel data
 		"""
-		return pd.read_excel(file,
-		                     header=0,
-		                     parse_dates=[self._settings.column_date],
-		                     date_parser=self._cb_date_parser,
-		                     converters={self._settings.column_amount: self._cb_str_to_float,
-		                                 self._settings.column_balance: self._cb_str_to_float})
+		df = pd.read_excel(file, header=0, dtype=self._raw_columns())
+		return self._parse_columns(df)
 
-	def _import_files(self):
+	def _import_xlsx(self, file):
 		"""
-			Import the data files
+			Import xlsx data by streaming the rows of the first sheet; only the needed
+			columns are collected and parsed chunk wise to keep the memory bounded
 		"""
-		container = pd.DataFrame()
-		for file in self._settings.import_files:
+		try:
+			from openpyxl import load_workbook
+		except ImportError:
+			raise ImportError('The openpyxl package is required to import xlsx files!')
+
+		columns = [col for col in [self._settings.column_date, self._settings.column_description,
+		                           self._settings.column_amount, self._settings.column_balance] if col is not None]
+		wb = load_workbook(file, read_only=True, data_only=True)
+		try:
+			rows = wb.worksheets[0].iter_rows(values_only=True)
+			header = ['' if cell is None else str(cell).strip() for cell in next(rows, [])]
+			missing = [col for col in columns if col not in header]
+			if missing:
+				raise ValueError('Columns not found: ' + ', '.join(missing))
+			indices = [header.index(col) for col in columns]
+
+			frames = []
+			while True:
+				chunk = list(islice(rows, XLSX_CHUNK_ROWS))
+				if not chunk:
+					break
+				# skip empty rows, which often follow the data in exported sheets
+				values = [[row[i] if i < len(row) else None for i in indices] for row in chunk if any(cell is not None for cell in row)]
+				frames.append(self._parse_columns(pd.DataFrame(values, columns=columns, dtype=object)))
+		finally:
+			wb.close()
+		return pd.concat(frames, ignore_index=True) if frames else self._parse_columns(pd.DataFrame(columns=columns, dtype=object))
+
+	def _import_files(self, files=None):
+		"""
+			Import the data files (by default all import files); returns the data, the
+			index of the source (file or archive member) of each row and the file of each source
+		"""
+		frames = []
+		source_files = []
+		for file in self._settings.import_files if files is None else files:
 			try:
-				if self._settings.file_type == 'csv':
-					import_data = self._prepare_import_file(file)
-					df = self._import_csv(import_data)
-				elif self._settings.file_type == 'xls':
-					df = self._import_excel(file)
-				else:
-					raise ValueError('Unknown file type: ' + self._settings.file_type)
-				container = pd.concat([container, df]).reset_index(drop=True)
+				with instrumentation.timed('parse'):
+					if self._settings.file_type == 'csv':
+						# compressed files and archives are decompressed while parsing
+						for name, import_data in compression.open_text(file, 'csv'):
+							frames.append(self._import_csv(instrumentation.timed_stream(import_data, 'file read')))
+							source_files.append(file)
+					elif self._settings.file_type == 'xls':
+						frames.append(self._import_excel(file))
+						source_files.append(file)
+					elif self._settings.file_type == 'xlsx':
+						frames.append(self._import_xlsx(file))
+						source_files.append(file)
+					else:
+						raise ValueError('Unknown file type: ' + self._settings.file_type)
 			except (ValueError, TypeError) as ve:
 				raise ImportError('Import error occured with file:\n' + file + '\n' + ve.args[0])
+			except compression.ERRORS as e:
+				raise ImportError('Import error occured with file:\n' + file + '\n' + str(e))
 
-		return container
+		# concatenate once instead of copying the growing container for every file
+		with instrumentation.timed('concat'):
+			container = pd.concat(frames).reset_index(drop=True) if frames else pd.DataFrame()
+			sources = np.repeat(np.arange(len(frames), dtype='int32'), [len(df) for df in frames])
+		instrumentation.count('files', len(frames))
+		instrumentation.count('rows', len(container))
+		return container, sources, source_files
 
-	def _get_month_name(self, month):
+	def _load_files(self, files):
 		"""
-			Retrieve the month name for an integer 1-12
+			Import files into a compact store; returns the store and the file of each source
 		"""
-		return calendar.month_name[month]
+		container, sources, source_files = self._import_files(files)
+		return self._compact(container, sources), source_files
 
-	def _search_uncategorized(self, categories, df):
+	def _drop_duplicates(self, store):
 		"""
-			Retrieve all data sets from dataframe that are not covered by any category
+			Drop transactions of overlapping import files; a row is dropped if another file
+			already contains it as often, repeated rows within a single file are kept
 		"""
-		regex = self._create_regex(categories, dimension=2)
-		if regex:
-			return df[~df[self._settings.column_description].str.contains(regex, flags=re.IGNORECASE)]
-		else:
-			return df
+		self._dropped_duplicates = 0
+		if not self._settings.drop_duplicates or not len(store):
+			return store
+
+		with instrumentation.timed('deduplicate'):
+			# descriptions are hashed once per unique value
+			descriptions = pd.util.hash_array(store.descriptions.astype(object))
+			balances = np.where(store.has_balance, store.balances, np.iinfo('int64').min) if store.balances is not None else 0
+			hashes = pd.util.hash_pandas_object(pd.DataFrame({'day': store.days, 'description': descriptions[store.codes],
+			                                                  'amount': store.amounts, 'balance': balances}), index=False).values
+			# number the repeats of a row within its file, the n-th repeat is only
+			# a duplicate of the n-th repeat in another file
+			occurrence = pd.DataFrame({'hash': hashes, 'source': store.sources}).groupby(['hash', 'source'], sort=False).cumcount().values
+			duplicated = pd.DataFrame({'hash': hashes, 'occurrence': occurrence}).duplicated().values
+
+			self._dropped_duplicates = int(duplicated.sum())
+			instrumentation.count('duplicates dropped', self._dropped_duplicates)
+			return store.select(~duplicated) if self._dropped_duplicates else store
+
+	def get_dropped_duplicates(self):
+		"""
+			Retrieve the number of rows dropped by the last import since they were contained in several files
+		"""
+		return self._dropped_duplicates
+
+	def _compact(self, df, sources=None):
+		"""
+			Keep only the columns needed for processing in a compact, date sorted store
+		"""
+		with instrumentation.timed('compact'):
+			return TransactionStore.from_frame(df, self._settings.column_date, self._settings.column_description,
+			                                   self._settings.column_amount, self._settings.column_balance,
+			                                   money.scale(self._settings.money_digits), sources)
+
+	def get_memory_report(self):
+		"""
+			Retrieve the memory used by the imported transactions in bytes
+		"""
+		if self._data_container is None:
+			return self._full_cube.memory_report()
+		return self._data_container.memory_report()
+
+	def _get_month_name(self, month):
+		"""
+			Retrieve the month name for an integer 1-12
+		"""
+		return calendar.month_name[month]
 
 	def _get_date_legend(self, date):
 		"""
@@ -230,6 +546,13 @@ class DataHandler:
 		"""
 		return str(date[0]) + ":" + self._get_month_name(date[1])
 
+	def _get_month_legend(self, month):
+		"""
+			Retrieve unique date string year:month for a datetime64 month
+		"""
+		month = int(month.astype('int64'))
+		return self._get_date_legend((1970 + month // 12, month % 12 + 1))
+
 	def _create_regex(self, values, dimension=1):
 		"""
 			Create a regex OR expression from a list of values
@@ -245,166 +568,249 @@ class DataHandler:
 				all.extend(tmp)
 			return '|'.join(all)
 
+	def _build_cube(self, store):
+		"""
+			Build the aggregate cube from the import data
+		"""
+		if self._settings.fixed_point_money:
+			# aggregate exact integer minor units
+			balances = None if store.balances is None else np.where(store.has_balance, store.balances, np.nan)
+			return AggregateCube(store.dates(), store.codes, store.descriptions, store.amounts, balances)
+		return AggregateCube(store.dates(), store.codes, store.descriptions, store.amount_values(), store.balance_values())
+
+	def to_display(self, values):
+		"""
+			Convert amounts returned by the data handler into display values;
+			in fixed point mode amounts are integer minor units
+		"""
+		if self._settings.fixed_point_money:
+			return money.to_major(values, self._settings.money_digits)
+		return np.asarray(values)
+
 	def _calculate_categories(self):
 		"""
-			Calculate the category blocks from import data
+			Calculate the category blocks from the aggregate cube
 		"""
-		category_defs = self._definitions_data['categories']
-		grouped_months = self._get_grouped_months()  # import data grouped by month
-		results = OrderedDict()
-		uncategorized = pd.DataFrame()
-
-		for date, df in grouped_months:
-			# only interested in expenses
-			df_exp = df[df[self._settings.column_amount] < 0].reset_index()
-			category_container = OrderedDict()
-
-			for alias, categories in category_defs.items():
-				if categories:
-					# create an OR regex for all categories of the current alias
-					regex = self._create_regex(categories)
-					# apply regex to the dataframe, filtering all matching datasets for the current alias
-					df_filtered = df_exp[df_exp[self._settings.column_description].str.contains(regex, flags=re.IGNORECASE)]
-					# calculate the sum and abs for all filtered data sets to be displayed
-					category_container[alias] = abs((df_filtered[self._settings.column_amount].values.sum()))
-
-			# check if any data sets have not been categorized
-			category_container.setdefault('Unknown', 0)
-			no_categories = self._search_uncategorized(category_defs.values(), df_exp)
-			if not no_categories.empty:
-				val = abs((no_categories[self._settings.column_amount].values.sum()))
-				category_container['Unknown'] += val
-				uncategorized = uncategorized.append(no_categories)
-
-			results[self._get_date_legend(date)] = category_container
+		alias_regexes, uncategorized_regex = self._category_regexes()
+		with instrumentation.timed('categorize'):
+			uncategorized = self._full_cube.categorize(alias_regexes, uncategorized_regex)
+		instrumentation.count('aliases', len(alias_regexes))
 
 		self._check_uncategorized(uncategorized)
 
+		return self._apply_date_range()
+
+	def _category_regexes(self):
+		"""
+			OR regex of all categories of each alias and the regex of all categories
+		"""
+		category_defs = self._definitions_data['categories']
+		alias_regexes = OrderedDict((alias, self._create_regex(categories)) for alias, categories in category_defs.items() if categories)
+		return alias_regexes, self._create_regex(category_defs.values(), dimension=2)
+
+	def _apply_date_range(self):
+		"""
+			Restrict the cube and the month index to the date range;
+			returns the category blocks of the range
+		"""
+		first_day, last_day = self._date_range
+		if first_day is None and last_day is None:
+			self._cube = self._full_cube
+		else:
+			self._cube = self._full_cube.window(first_day, last_day)
+		self._month_index = self._build_month_index()
+
+		months, aliases, values = self._cube.month_categories()
+		results = OrderedDict()
+		for month, row in zip(months, values):
+			results[self._get_month_legend(month)] = OrderedDict(zip(aliases, row))
 		return results
 
-	def get_total_in_out(self, df=None):
+	def set_date_range(self, first_day=None, last_day=None):
 		"""
-			Calculate total income and output from a data set
+			Restrict all results to the transactions from first_day up to and including
+			last_day (dates), None for an open end; a range without transactions is refused
 		"""
-		col_amount = self._settings.column_amount
-		if df is None:
-			df = self._data_container
+		date_range = (None if first_day is None else np.datetime64(first_day, 'D'),
+		              None if last_day is None else np.datetime64(last_day, 'D'))
+		if self._full_cube.window(*date_range).date_range()[0] is None:
+			raise ValueError('No transactions within the date range!')
+		self._date_range = date_range
+		with instrumentation.timed('date range'):
+			if self._settings.use_partitions and \
+			   not np.isin(self._partition_months(self._full_cube.months), self._full_cube.loaded_months).all():
+				# the partitions of the range are loaded for its tables and the search; the categories
+				# cover all months in any case, so the unknown categories stay the same
+				self._data_container, self._full_cube = self._open_partitions()
+				self._full_cube.categorize(*self._category_regexes())
+			self._categories_container = self._apply_date_range()
+		self.generation += 1
 
-		df_output = df[df[col_amount] < 0]
-		output = abs(df_output[col_amount].values.sum())
+	def get_date_range(self):
+		"""
+			Selected first and last day, None for an open end
+		"""
+		return self._date_range
 
-		df_input = df[df[col_amount] > 0]
-		income = abs(df_input[col_amount].values.sum())
+	def get_full_date_range(self):
+		"""
+			First and last day of all imported data
+		"""
+		return self._full_cube.date_range()
 
-		return income, output
+	def _row_range(self, store):
+		"""
+			Row range of the date sorted store within the date range
+		"""
+		first_day, last_day = self._date_range
+		start = 0 if first_day is None else np.searchsorted(store.days, first_day.astype('int64'), side='left')
+		end = len(store) if last_day is None else np.searchsorted(store.days, last_day.astype('int64'), side='right')
+		return start, end
 
-	def get_total_day(self, overall=False, reverse=False):
+	def get_total_in_out(self):
 		"""
-			Retrieve per day results of expenses
+			Calculate total income and output of the data
 		"""
-		amount_col = self._settings.column_amount
-		# filter only expenses
-		df = self._data_container[self._data_container[amount_col] < 0].reset_index()
+		return self._cube.total_in_out()
 
+	def get_total_day_arrays(self, overall=False, reverse=False):
+		"""
+			Retrieve per day results of expenses as sorted arrays of
+			dates (datetime64) and amounts (see to_display)
+		"""
+		dates, amounts = self._cube.day_totals()
+		dates = dates.astype('datetime64[ns]')
 		if not overall:
-			df[amount_col] = df[amount_col].apply(lambda x: abs(x))
+			amounts = np.abs(amounts)
+		if reverse:
+			dates, amounts = dates[::-1], amounts[::-1]
+		return dates, amounts, self._settings.date_format
 
-		res = df.groupby([self._settings.column_date])[[amount_col]].sum().reset_index()
-		res = OrderedDict({row[self._settings.column_date]: row[self._settings.column_amount] for i, row in res.iterrows()})
-		return OrderedDict(sorted(res.items(), key=lambda x: pd.to_datetime(x[0]), reverse=reverse)), self._settings.date_format
-
-	def _get_grouped_months(self):
+	def get_total_day(self, overall=False, reverse=False):
 		"""
-			Retrieve data sets grouped by month and year
+			Retrieve per day results of expenses
 		"""
-		return pd.groupby(self._data_container, by=[self._data_container[self._settings.column_date].dt.year, self._data_container[self._settings.column_date].dt.month])
+		dates, amounts, date_format = self.get_total_day_arrays(overall, reverse)
+		return OrderedDict(zip(pd.to_datetime(dates), amounts)), date_format
 
 	def get_total_month(self):
 		"""
 			Retrieve per month results
 		"""
-		grouped_months = self._get_grouped_months()
+		months, income, output = self._cube.month_totals()
 		results = OrderedDict()
 
-		for date, df in grouped_months:
-			results[self._get_date_legend(date)] = self.get_total_in_out(df)
+		for month, month_income, month_output in zip(months, income, output):
+			results[self._get_month_legend(month)] = (month_income, month_output)
 
 		return results
 
-	def _get_month_from_key(self, value):
-		"""
-			Retrieve month/year value from given string year:month
-		"""
-		year, month = value.split(':')
-		return int(year), strptime(month, '%B').tm_mon
+	def _build_month_index(self):
+		"""
+			Map each year:month key to the row range of the date sorted import data;
+			with the database the first and last day of the month are used instead
+		"""
+		months = self._cube.months
+		first_days = months.astype('datetime64[D]').astype('int64')
+		last_days = (months + 1).astype('datetime64[D]').astype('int64') - 1
+		# the first and last month are only partly within the date range
+		first_day, last_day = self._date_range
+		if first_day is not None:
+			first_days = np.maximum(first_days, first_day.astype('int64'))
+		if last_day is not None:
+			last_days = np.minimum(last_days, last_day.astype('int64'))
+		if self._data_container is None:
+			starts, ends = first_days, last_days
+		else:
+			starts, ends = self._data_container.range_of(first_days, last_days)
+		return {self._get_month_legend(month): (start, end) for month, start, end in zip(months, starts, ends)}
 
 	def get_categorized_data_sets(self, selected_date, category):
 		"""
 			Retrieve categorized results
 		"""
-		year, month = self._get_month_from_key(selected_date)
 		col_date = self._settings.column_date
 		col_desc = self._settings.column_description
 		col_amount = self._settings.column_amount
 
-		categories = self._definitions_data['categories'][category]
-		regex = self._create_regex(categories)
-
-		# filter all data sets for year and month
-		df_filtered = self._data_container[(self._data_container[col_date].dt.year == year) & (self._data_container[col_date].dt.month == month)]
-		# filter data by regex of categories
-		df_filtered = df_filtered[df_filtered[col_desc].str.contains(regex, flags=re.IGNORECASE)]
-		# filter only expenses
-		df_filtered = df_filtered[df_filtered[col_amount] < 0]
+		if self._data_container is None:
+			first_day, last_day = self._month_index.get(selected_date, (0, -1))
+			days, descriptions, amounts = self._cube.category_rows(first_day, last_day, category)
+			return self._create_table_frame(days, descriptions, amounts)
+
+		store, cube = self._data_container, self._cube
+		# slice all data sets of year and month
+		start, end = self._month_index.get(selected_date, (0, 0))
+		unloaded = [month for month in self.get_unloaded_months() if self._get_month_legend(month) == selected_date]
+		if unloaded:
+			# the partition of a month which isn't loaded is read for its table
+			store, cube = self._load_partition(unloaded[0])
+			start, end = self._row_range(store)
+
+		# filter by the categories of the descriptions and only expenses
+		mask = cube.category_mask(category)[store.codes[start:end]] & (store.amounts[start:end] < 0)
+		df_filtered = store.to_frame(col_date, col_desc, col_amount, start, end, mask)
 		# format date column
-		df_filtered[col_date] = df_filtered[col_date].apply(lambda x: x.strftime(self._settings.date_format))
+		df_filtered[col_date] = df_filtered[col_date].dt.strftime(self._settings.date_format)
 
 		# return only columns needed for display
-		return df_filtered[[col_date, col_desc, col_amount]].reset_index()
+		return df_filtered.reset_index()
 
-	def _calc_balances(self, df, date, balance):
+	def _calc_balances(self, amounts, anchors):
 		"""
 			Some files might miss the balances in some rows;
-			this function calculates all balances by taking the latest
-			found balance value and recursively calculating all others
-			taking the expenses/earnings
+			this function reconstructs the balance of every day from the cumulative
+			sum of the daily amounts, anchored at each day with a known balance value.
+			The anchors are the balances at the end of their days (see day_anchors),
+			days before the first anchor are calculated backwards from it, all other
+			days forwards from the most recent anchor
 		"""
-		col_date = self._settings.column_date
-		indexes = reversed(list(df.index)[:-1])
-
-		for idx in indexes:
-			if df.ix[idx][col_date] <= date:
-				val = balance - df.get_value(idx+1, 'cumsum')
-			else:
-				val = balance + df.get_value(idx+1, 'cumsum')
-			df.set_value(idx, 'new_balance', val)
+		cumsum = np.cumsum(amounts)
+		# the offset between the known balance and the running sum of an anchor day
+		# stays constant until the next anchor is reached
+		offsets = pd.Series(anchors - cumsum).ffill().bfill().values
+		return cumsum + offsets
 
-		return df
-
-	def get_days_balance(self):
+	def has_balances(self):
 		"""
-			Retrieve per day balances
+			Whether the balance is known for any of the imported transactions
 		"""
-		if self._data_container[self._settings.column_balance].isnull().values.any():
-			# determine balance value for most recent date
-			df_sorted = self._data_container.sort_values(by=self._settings.column_date, ascending=True).reset_index()
-			last_valid_val = df_sorted[self._settings.column_balance].last_valid_index()
-			date = df_sorted.ix[last_valid_val][self._settings.column_date]
-			balance = df_sorted.ix[last_valid_val][self._settings.column_balance]
-
-			# group all values by day and sum the in/out transacitons;
-			# go through all days and sum up all amounts recursively
-			# apply the found balance value to all amounts the receive the daily balance recursively
-			df_grouped = df_sorted.groupby([self._settings.column_date])[[self._settings.column_amount]].sum().reset_index()
-			df_grouped['cumsum'] = df_grouped[::-1][self._settings.column_amount].cumsum()
-			df_grouped = self._calc_balances(df_grouped, date, balance)
+		anchors = self._full_cube.day_balances()[0]
+		return anchors is not None and not np.isnan(anchors).all()
 
-			df = df_grouped.rename(columns={'new_balance': self._settings.column_balance})
+	def get_days_balance_arrays(self):
+		"""
+			Retrieve per day balances as sorted arrays of
+			dates (datetime64) and balances (see to_display);
+			None if no balance is known at all
+		"""
+		if not self.has_balances():
+			return None
+		# balances before the date range are needed as anchors, so all days are calculated
+		dates, amounts = self._full_cube.day_net()
+		anchors, complete = self._full_cube.day_balances()
+		if complete:
+			balances = anchors
 		else:
-			df = self._data_container[[self._settings.column_date, self._settings.column_balance]]
+			balances = self._calc_balances(amounts, anchors)
+		first_day, last_day = self._date_range
+		start = 0 if first_day is None else np.searchsorted(dates, first_day, side='left')
+		end = len(dates) if last_day is None else np.searchsorted(dates, last_day, side='right')
+		dates, balances = dates[start:end], balances[start:end]
 
-		res = OrderedDict({row[self._settings.column_date]: row[self._settings.column_balance] for idx, row in df.iterrows()})
-		return OrderedDict(sorted(res.items(), key=lambda x: pd.to_datetime(x[0]))), self._settings.date_format
+		if self._settings.fixed_point_money:
+			balances = np.round(balances).astype('int64')
+		return dates.astype('datetime64[ns]'), balances, self._settings.date_format
+
+	def get_days_balance(self):
+		"""
+			Retrieve per day balances, None if no balance is known at all
+		"""
+		arrays = self.get_days_balance_arrays()
+		if arrays is None:
+			return None
+		dates, balances, date_format = arrays
+		return OrderedDict(zip(pd.to_datetime(dates), balances)), date_format
 
 	def get_calculated_categories(self):
 		"""
@@ -416,17 +822,53 @@ class DataHandler:
 		"""
 			Retrieve data to be displayed in the search table
 		"""
+		if self._data_container is None:
+			days, descriptions, amounts = self._cube.search(search_string, self._settings.date_format)
+			return self._create_table_frame(days, descriptions, amounts)
+
+		# the partitions which aren't loaded are searched one at a time, most recent first
+		rows = [self._search_rows(self._data_container, search_string)]
+		rows.extend(self._search_rows(self._partitions.load([month]), search_string) for month in self.get_unloaded_months()[::-1])
+		return self._create_table_frame(*[np.concatenate(columns) for columns in zip(*rows)])
+
+	def _search_rows(self, store, search_string):
+		"""
+			Days, descriptions and amounts of the transactions of the store within the date range
+			whose description, date or amount contains search_string, most recent first
+		"""
+		# only the rows of the date range are searched
+		start, end = self._row_range(store)
 
-		df = self._data_container.sort_values(by=self._settings.column_date, ascending=False).reset_index()
-		df = df[[self._settings.column_date, self._settings.column_description, self._settings.column_amount]].reset_index()
-		df[self._settings.column_date] = df[self._settings.column_date].apply(lambda x: x.strftime(self._settings.date_format))
+		# the search conditions are evaluated on the unique values only
+		# and mapped back to the rows by their codes
+		days, day_idx = store.unique_days()
+		day_strings = pd.Series(days.astype('datetime64[D]')).dt.strftime(self._settings.date_format)
+		amount_idx, amounts = pd.factorize(store.amounts[start:end])
+		amount_strings = pd.Series(amounts / float(store.scale)).astype(str)
 
-		# search conditions
-		cond = df[self._settings.column_description].str.contains(search_string, flags=re.IGNORECASE) | \
-		       df[self._settings.column_date].str.contains(search_string) | \
-		       df[self._settings.column_amount].apply(lambda x: str(x)).str.contains(search_string)
+		cond = contains(store.descriptions, search_string)[store.codes[start:end]] | \
+		       contains(day_strings, search_string)[day_idx[start:end]] | \
+		       contains(amount_strings, search_string)[amount_idx]
 
-		return df[cond]
+		# most recent data sets first
+		rows = start + np.flatnonzero(cond)[::-1]
+		return store.days[rows], store.descriptions[store.codes[rows]], store.amounts[rows]
+
+	def _day_strings(self, days):
+		"""
+			Days (days since epoch) formatted in the date format, only the unique days are formatted
+		"""
+		unique_days, day_idx = np.unique(days, return_inverse=True)
+		return pd.Series(unique_days.astype('datetime64[D]')).dt.strftime(self._settings.date_format).values[day_idx]
+
+	def _create_table_frame(self, days, descriptions, amounts):
+		"""
+			Create the data frame of a table from rows of the database or the transaction store
+		"""
+		df = pd.DataFrame(OrderedDict([(self._settings.column_date, self._day_strings(days)),
+		                               (self._settings.column_description, descriptions),
+		                               (self._settings.column_amount, amounts / float(money.scale(self._settings.money_digits)))]))
+		return df.reset_index()
 
 	def get_column_headers(self):
 		"""
@@ -439,15 +881,140 @@ class DataHandler:
 		"""
 			Calculate the days interval on the x-axis to be displayed
 		"""
-		df = self._data_container.sort_values(by=self._settings.column_date, ascending=False).reset_index()
-		df = df[[self._settings.column_date]]
-		ranges = df.iloc[[0, -1]]
-		if len(ranges) == 2:
-			end = ranges.iloc[0][self._settings.column_date]
-			start = ranges.iloc[1][self._settings.column_date]
-			diff = (end-start).days
+		start, end = self._cube.date_range()
+		if start is not None:
+			diff = int((end - start).astype('int64'))
 			if diff > 20:
 				return int(diff/20)
 			else:
-				return diff
+				# a range of a single day still needs a tick
+				return max(diff, 1)
 		return 1
+
+	def _category_labels(self, separator, cube=None):
+		"""
+			Categories of every unique description of the cube, joined by separator
+		"""
+		cube = self._cube if cube is None else cube
+		labels = None
+		for alias in cube.aliases:
+			mask = cube.category_mask(alias)
+			if labels is None:
+				labels = np.full(len(mask), '', dtype=object)
+			labels[mask] = np.where(labels[mask] == '', alias, labels[mask] + separator + alias)
+		return labels
+
+	def _chunked_frames(self, columns, chunk_rows):
+		"""
+			Split equally long columns into data frames of at most chunk_rows rows
+		"""
+		num_rows = len(next(iter(columns.values())))
+		for start in range(0, max(num_rows, 1), chunk_rows):
+			yield pd.DataFrame(OrderedDict((name, values[start:start + chunk_rows]) for name, values in columns.items()))
+
+	def _store_frames(self, store, labels, has_balance, chunk_rows):
+		"""
+			Transactions of a store within the date range in data frames of at most chunk_rows rows
+		"""
+		first, last = self._row_range(store)
+		for start in range(first, max(last, first + 1), chunk_rows):
+			end = min(start + chunk_rows, last)
+			codes = store.codes[start:end]
+			columns = OrderedDict([('date', store.dates(start, end)),
+			                       ('description', store.descriptions[codes]),
+			                       ('amount', store.amount_values(start, end))])
+			if has_balance:
+				balances = store.balance_values(start, end)
+				columns['balance'] = np.full(len(codes), np.nan) if balances is None else balances
+			columns['categories'] = labels[codes]
+			yield pd.DataFrame(columns)
+
+	def _export_transactions(self, chunk_rows, separator):
+		"""
+			Transactions with their categories in date order
+		"""
+		labels = self._category_labels(separator)
+		has_balance = self.has_balances()
+		store = self._data_container
+		if store is not None:
+			# the partitions which aren't loaded are older than the loaded months, one is read at a time
+			for month in self.get_unloaded_months():
+				partition, cube = self._load_partition(month)
+				for df in self._store_frames(partition, self._category_labels(separator, cube), has_balance, chunk_rows):
+					yield df
+			for df in self._store_frames(store, labels, has_balance, chunk_rows):
+				yield df
+			return
+
+		# the database is read in pages of chunk_rows, continuing after the last id
+		last_id = -1
+		scale = float(self._cube.scale)
+		while True:
+			ids, days, description_ids, descriptions, amounts, balances = self._cube.transaction_rows(last_id, chunk_rows)
+			if not len(ids) and last_id >= 0:
+				break
+			columns = OrderedDict([('date', days.astype('datetime64[D]')),
+			                       ('description', descriptions),
+			                       ('amount', amounts / scale)])
+			if has_balance:
+				columns['balance'] = balances / scale
+			columns['categories'] = labels[description_ids]
+			yield pd.DataFrame(columns)
+			if len(ids) < chunk_rows:
+				break
+			last_id = ids[-1]
+
+	def _export_categories(self, chunk_rows):
+		"""
+			Month x category sums of income and expenses
+		"""
+		months, aliases, expenses = self._cube.month_categories(EXPENSE)
+		income = self._cube.month_categories(INCOME)[2]
+		columns = OrderedDict([('month', np.repeat(np.datetime_as_string(months, unit='M'), len(aliases))),
+		                       ('category', np.tile(np.array(aliases, dtype=object), len(months))),
+		                       ('income', self.to_display(income).ravel()),
+		                       ('expenses', self.to_display(expenses).ravel())])
+		return self._chunked_frames(columns, chunk_rows)
+
+	def _export_days(self, chunk_rows):
+		"""
+			Daily sums of income and expenses, the net sum and the balance
+		"""
+		days, net = self._cube.day_net()
+		columns = OrderedDict([('date', days)])
+		for name, sign in [('income', INCOME), ('expenses', EXPENSE)]:
+			# only days with transactions of the sign are returned
+			sign_days, amounts = self._cube.day_totals(sign)
+			values = np.zeros(len(days), dtype=amounts.dtype)
+			values[np.searchsorted(days, sign_days)] = np.abs(amounts)
+			columns[name] = self.to_display(values)
+		columns['net'] = self.to_display(net)
+		# headerless imports name a balance column even without one
+		if self.has_balances():
+			columns['balance'] = self.to_display(self.get_days_balance_arrays()[1])
+		return self._chunked_frames(columns, chunk_rows)
+
+	def iter_export(self, data_set, chunk_rows=EXPORT_CHUNK_ROWS, separator='|'):
+		"""
+			Iterate over an export data set in data frames of at most chunk_rows rows:
+			'transactions' with their categories joined by separator, 'categories'
+			with the month x category sums or 'days' with the daily sums and balances
+		"""
+		if data_set == 'transactions':
+			return self._export_transactions(chunk_rows, separator)
+		if data_set == 'categories':
+			return self._export_categories(chunk_rows)
+		if data_set == 'days':
+			return self._export_days(chunk_rows)
+		raise ValueError('Unknown export data set: ' + data_set)
+
+	def export(self, path, data_set, fmt=None, chunk_rows=EXPORT_CHUNK_ROWS):
+		"""
+			Stream an export data set (see iter_export) chunk wise to a CSV, JSON Lines
+			or Parquet file; fmt defaults to the extension of path.
+			Returns the number of exported rows
+		"""
+		with instrumentation.timed('export'):
+			rows = write_chunks(path, self.iter_export(data_set, chunk_rows), fmt or format_of(path), self._settings.money_digits)
+		instrumentation.count('exported rows', rows)
+		return rows
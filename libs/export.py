@@ -0,0 +1,123 @@
+import os
+import tempfile
+from collections import OrderedDict
+import numpy as np
+
+# rows per written chunk, the memory of an export is bounded by the size of one chunk
+CHUNK_ROWS = 100000
+
+
+def _format_dates(df):
+	"""
+		Replace the date columns of a chunk by ISO date strings
+	"""
+	for col in df.columns:
+		if np.issubdtype(df[col].dtype, np.datetime64):
+			df[col] = np.datetime_as_string(df[col].values, unit='D')
+	return df
+
+
+class _CsvWriter:
+	"""
+		Comma separated values with a header line, amounts with the digits of the minor unit
+	"""
+
+	def __init__(self, path, digits):
+		self._fp = open(path, 'w', newline='', encoding='utf-8')
+		self._float_format = '%.' + str(digits) + 'f'
+		self._header = True
+
+	def write(self, df):
+		_format_dates(df).to_csv(self._fp, index=False, header=self._header, float_format=self._float_format)
+		self._header = False
+
+	def close(self):
+		self._fp.close()
+
+
+class _JsonLinesWriter:
+	"""
+		One JSON object per line
+	"""
+
+	def __init__(self, path, digits):
+		self._fp = open(path, 'w', encoding='utf-8')
+
+	def write(self, df):
+		if not len(df):
+			return
+		lines = _format_dates(df).to_json(orient='records', lines=True, force_ascii=False)
+		self._fp.write(lines if lines.endswith('\n') else lines + '\n')
+
+	def close(self):
+		self._fp.close()
+
+
+class _ParquetWriter:
+	"""
+		Parquet file with one row group per chunk, dates are stored without a time
+	"""
+
+	def __init__(self, path, digits):
+		try:
+			import pyarrow
+			import pyarrow.parquet
+		except ImportError:
+			raise ImportError('The pyarrow package is required to export parquet files!')
+		self._pa = pyarrow
+		self._pq = pyarrow.parquet
+		self._path = path
+		self._schema = None
+		self._writer = None
+
+	def write(self, df):
+		pa = self._pa
+		table = pa.Table.from_pandas(df, preserve_index=False)
+		if self._writer is None:
+			# the schema of the first chunk is used for all others
+			self._schema = pa.schema([pa.field(field.name, pa.date32()) if pa.types.is_timestamp(field.type) else field
+			                          for field in table.schema])
+			self._writer = self._pq.ParquetWriter(self._path, self._schema)
+		self._writer.write_table(table.cast(self._schema))
+
+	def close(self):
+		if self._writer is not None:
+			self._writer.close()
+
+
+FORMATS = OrderedDict([('csv', _CsvWriter), ('jsonl', _JsonLinesWriter), ('parquet', _ParquetWriter)])
+
+
+def format_of(path):
+	"""
+		Export format given by the extension of path
+	"""
+	fmt = os.path.splitext(path)[1].lstrip('.').lower()
+	if fmt not in FORMATS:
+		raise ValueError('Unknown export format: ' + path)
+	return fmt
+
+
+def write_chunks(path, chunks, fmt, digits=2):
+	"""
+		Write the data frames of chunks one after the other to a single file;
+		the file is written under a temporary name first, so readers only see
+		complete exports. Returns the number of written rows
+	"""
+	fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+	os.close(fd)
+	rows = 0
+	try:
+		writer = FORMATS[fmt](tmp_path, digits)
+		try:
+			for df in chunks:
+				writer.write(df)
+				rows += len(df)
+		finally:
+			writer.close()
+		os.replace(tmp_path, path)
+	except BaseException:
+		if os.path.exists(tmp_path):
+			os.remove(tmp_path)
+		raise
+	return rows
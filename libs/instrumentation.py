@@ -0,0 +1,135 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# setting this environment variable to a non empty value enables the instrumentation,
+# a value ending with .json additionally dumps the report to that file after each import
+ENV_VARIABLE = 'EXPENSES_PROFILE'
+
+
+class _TimedStream:
+	"""
+		Stream whose reads are recorded as a stage, all other attributes are the ones of the stream
+	"""
+
+	def __init__(self, stream, instrumentation, stage):
+		self._stream = stream
+		self._instrumentation = instrumentation
+		self._stage = stage
+
+	def read(self, *args):
+		with self._instrumentation.timed(self._stage):
+			return self._stream.read(*args)
+
+	def readline(self, *args):
+		with self._instrumentation.timed(self._stage):
+			return self._stream.readline(*args)
+
+	def __iter__(self):
+		return self
+
+	def __next__(self):
+		with self._instrumentation.timed(self._stage):
+			return next(self._stream)
+
+	def __getattr__(self, name):
+		return getattr(self._stream, name)
+
+
+class Instrumentation:
+	"""
+		Opt-in timing of processing stages and counters of processed items
+	"""
+
+	def __init__(self, enabled=None):
+		if enabled is None:
+			enabled = bool(os.environ.get(ENV_VARIABLE))
+		self.enabled = enabled
+		self._lock = threading.Lock()
+		self.reset()
+
+	def enable(self, enabled=True):
+		self.enabled = enabled
+
+	def reset(self):
+		"""
+			Delete all recorded timings and counters
+		"""
+		with self._lock:
+			self._stages = OrderedDict()
+			self._counters = OrderedDict()
+
+	@contextmanager
+	def timed(self, stage):
+		"""
+			Record the duration of the enclosed block as stage
+		"""
+		if not self.enabled:
+			yield
+			return
+
+		start = time.perf_counter()
+		try:
+			yield
+		finally:
+			duration = time.perf_counter() - start
+			with self._lock:
+				values = self._stages.setdefault(stage, OrderedDict([('calls', 0), ('total', 0.), ('max', 0.)]))
+				values['calls'] += 1
+				values['total'] += duration
+				values['max'] = max(values['max'], duration)
+
+	def timed_stream(self, stream, stage):
+		"""
+			Record the reads of a stream as stage, for streams which are read while being processed
+		"""
+		if not self.enabled:
+			return stream
+		return _TimedStream(stream, self, stage)
+
+	def count(self, name, value=1):
+		"""
+			Increase the counter name by value
+		"""
+		if self.enabled:
+			with self._lock:
+				self._counters[name] = self._counters.get(name, 0) + value
+
+	def report(self):
+		"""
+			Retrieve all timings (in seconds) and counters
+		"""
+		with self._lock:
+			return OrderedDict([('stages', OrderedDict((k, OrderedDict(v)) for k, v in self._stages.items())),
+			                    ('counters', OrderedDict(self._counters))])
+
+	def dump(self, path):
+		"""
+			Write the report as JSON to path
+		"""
+		with open(path, 'w') as fp:
+			json.dump(self.report(), fp, indent=4)
+
+	def dump_configured(self):
+		"""
+			Dump the report if a JSON file has been configured by the environment variable
+		"""
+		path = os.environ.get(ENV_VARIABLE, '')
+		if self.enabled and path.endswith('.json'):
+			self.dump(path)
+
+	def summary(self, limit=6):
+		"""
+			Retrieve a single line summary of the slowest stages and the counters
+		"""
+		report = self.report()
+		stages = sorted(report['stages'].items(), key=lambda x: x[1]['total'], reverse=True)[:limit]
+		parts = ['%s %.3f s' % (name, values['total']) for name, values in stages]
+		parts.extend(['%s: %d' % (name, value) for name, value in report['counters'].items()])
+		return ' | '.join(parts)
+
+
+instrumentation = Instrumentation()
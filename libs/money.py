@@ -0,0 +1,87 @@
+import locale
+import numpy as np
+import pandas as pd
+
+# number of decimal digits of the minor unit (e.g. cents)
+DIGITS = 2
+
+
+def scale(digits=DIGITS):
+	"""
+		Number of minor units per major unit
+	"""
+	return 10 ** digits
+
+
+def _normalize(values):
+	"""
+		Bring amount strings into the form [-]digits[.digits]; thousands separators are
+		removed and the decimal separator is replaced by a dot
+	"""
+	values = values.str.strip().str.replace(r"[\s'\"]", '', regex=True)
+	dot, comma = values.str.rfind('.'), values.str.rfind(',')
+	decimal_comma = locale.localeconv()['decimal_point'] == ','
+
+	# with both separators present the right most one is the decimal separator
+	comma_decimal = (comma > dot) & (dot >= 0)
+	# a single separator followed by one or two digits is a decimal separator as well,
+	# otherwise the locale decides
+	single_comma = (dot < 0) & (comma >= 0)
+	single_comma_decimal = single_comma & (values.str.count(',') == 1) & \
+	                       (decimal_comma | values.str.contains(r',\d{1,2}$', regex=True))
+	dot_thousands = (comma < 0) & ((values.str.count(r'\.') > 1) |
+	                               (decimal_comma & values.str.contains(r'\.\d{3}$', regex=True)))
+
+	values = values.where(~(comma_decimal | single_comma_decimal), values.str.replace('.', '', regex=False).str.replace(',', '.', regex=False))
+	values = values.where(~dot_thousands, values.str.replace('.', '', regex=False))
+	return values.str.replace(',', '', regex=False)
+
+
+def parse_amounts(values, digits=DIGITS):
+	"""
+		Parse amounts (strings or numbers) exactly into integer minor units;
+		returns the amounts and a mask of the missing values (which are 0 in the amounts)
+	"""
+	values = pd.Series(values).reset_index(drop=True)
+	minor = np.zeros(len(values), dtype='int64')
+	missing = values.isnull().values
+
+	if values.dtype != object:
+		is_text = np.zeros(len(values), dtype=bool)
+	elif pd.api.types.infer_dtype(values, skipna=True) == 'string':
+		is_text = ~missing
+	else:
+		# excel sheets mix numbers and text within a column
+		is_text = values.map(lambda v: isinstance(v, str)).values.astype(bool)
+	text = values[is_text].astype(object)
+	empty = (text.str.strip() == '').values
+	missing[np.flatnonzero(is_text)[empty]] = True
+	text = text[~empty]
+
+	# numbers (e.g. from excel sheets) are rounded to the minor unit
+	numbers = ~is_text & ~missing
+	if numbers.any():
+		minor[numbers] = np.round(values[numbers].astype('float64').values * scale(digits)).astype('int64')
+
+	if len(text):
+		parts = _normalize(text).str.extract(r'^([+-]?)(\d*)(?:\.(\d*))?$', expand=True)
+		invalid = parts[1].isnull() | ((parts[1] == '') & parts[2].fillna('').eq(''))
+		if invalid.any():
+			raise ValueError('Could not convert value to amount: ' + repr(text[invalid].iloc[0]))
+
+		integer = pd.to_numeric(parts[1].replace('', '0')).values.astype('int64')
+		fraction = parts[2].fillna('')
+		# round half up on the first digit beyond the minor unit
+		round_up = (fraction.str[digits:digits + 1] >= '5').values
+		fraction = pd.to_numeric(fraction.str[:digits].str.pad(digits, side='right', fillchar='0')).values.astype('int64') if digits else 0
+		amounts = integer * scale(digits) + fraction + round_up
+		minor[text.index.values] = np.where(parts[0].values == '-', -amounts, amounts)
+
+	return minor, missing
+
+
+def to_major(values, digits=DIGITS):
+	"""
+		Convert minor units to major units for display
+	"""
+	return np.asarray(values) / float(scale(digits))
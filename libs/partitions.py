@@ -0,0 +1,296 @@
+import os
+import json
+import tempfile
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from libs.aggregates import AggregateCube, EXPENSE
+from libs.transactions import TransactionStore
+from libs.instrumentation import instrumentation
+
+# version of the partition files, partitions of other versions are rebuilt
+VERSION = 2
+INDEX_NAME = 'index.json'
+SUMMARY_NAME = 'summary.npz'
+# suffix of the category sums of a partition, written when it is categorized
+CATEGORIES_SUFFIX = '.categories.npz'
+
+
+def _month_name(month):
+	return str(np.datetime64(month, 'M'))
+
+
+def _save(path, **arrays):
+	"""
+		Write arrays to path under a temporary name first, so it is complete or missing
+	"""
+	fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+	try:
+		with os.fdopen(fd, 'wb') as fp:
+			np.savez(fp, **arrays)
+		os.replace(tmp_path, path)
+	except OSError:
+		if os.path.exists(tmp_path):
+			os.remove(tmp_path)
+		raise
+
+
+class PartitionedStore:
+	"""
+		Parsed transactions of an import directory on disk, one partition file per
+		month, and the per day sums of all partitions. The index records the
+		signature of the import files the partitions were built from; partitions
+		are only read when their months are loaded
+	"""
+
+	def __init__(self, directory):
+		self.directory = directory
+		self._index = {}
+		path = os.path.join(directory, INDEX_NAME)
+		if os.path.isfile(path):
+			try:
+				with open(path, 'r') as fp:
+					index = json.load(fp, object_pairs_hook=OrderedDict)
+				if index.get('version') == VERSION:
+					self._index = index
+			except ValueError:
+				# a damaged index is rebuilt like an outdated one
+				pass
+
+	@property
+	def signature(self):
+		return self._index.get('signature')
+
+	@property
+	def months(self):
+		"""
+			Months of all partitions in ascending order
+		"""
+		return np.array(list(self._index.get('partitions', {}).keys()), dtype='datetime64[M]')
+
+	def _path(self, name):
+		return os.path.join(self.directory, name)
+
+	def write(self, store, day_sums, signature):
+		"""
+			Replace the partitions by the transactions of a date sorted store and
+			its per day sums (see AggregateCube.day_sums)
+		"""
+		os.makedirs(self.directory, exist_ok=True)
+		with instrumentation.timed('partition write'):
+			months = store.days.astype('datetime64[D]').astype('datetime64[M]')
+			starts = np.flatnonzero(np.r_[True, months[1:] != months[:-1]]) if len(store) else np.array([], dtype=int)
+			ends = np.r_[starts[1:], len(store)].astype(int)
+
+			partitions = OrderedDict()
+			for start, end in zip(starts, ends):
+				name = _month_name(months[start])
+				# every partition only keeps the descriptions of its own rows
+				codes, uniques = pd.factorize(store.codes[start:end])
+				descriptions = json.dumps(store.descriptions[uniques].tolist()).encode('utf-8')
+				arrays = dict(days=store.days[start:end], codes=codes.astype('int32'), amounts=store.amounts[start:end],
+				              descriptions=np.frombuffer(descriptions, dtype=np.uint8))
+				if store.balances is not None:
+					arrays.update(balances=store.balances[start:end], has_balance=store.has_balance[start:end])
+				_save(self._path(name + '.npz'), **arrays)
+				partitions[name] = OrderedDict([('rows', int(end - start)),
+				                                ('descriptions', len(uniques))])
+
+			days, totals, counts, balances, complete = day_sums
+			arrays = dict(days=days.astype('datetime64[D]').astype('int32'), totals=totals, counts=counts, complete=complete)
+			if balances is not None:
+				arrays['balances'] = balances
+			_save(self._path(SUMMARY_NAME), **arrays)
+
+			index = OrderedDict([('version', VERSION),
+			                     ('signature', signature),
+			                     ('scale', store.scale),
+			                     ('has_balance', store.balances is not None),
+			                     ('partitions', partitions)])
+			fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+			with os.fdopen(fd, 'w') as fp:
+				json.dump(index, fp, indent=4)
+			os.replace(tmp_path, self._path(INDEX_NAME))
+			self._index = index
+
+			# partitions of months without transactions anymore and the category sums of all
+			for name in os.listdir(self.directory):
+				if name.endswith('.npz') and name != SUMMARY_NAME and name[:-4] not in partitions:
+					os.remove(self._path(name))
+		instrumentation.count('partitions written', len(partitions))
+
+	def summary(self):
+		"""
+			Cube of the per day sums of all partitions
+		"""
+		with np.load(self._path(SUMMARY_NAME)) as data:
+			balances = data['balances'] if 'balances' in data else None
+			return AggregateCube.from_day_sums(data['days'].astype('datetime64[D]'), data['totals'], data['counts'],
+			                                   balances, bool(data['complete']))
+
+	def _read(self, name):
+		"""
+			Columns and descriptions of a single partition
+		"""
+		with np.load(self._path(name + '.npz')) as data:
+			columns = {key: data[key] for key in data.files}
+		descriptions = np.empty(self._index['partitions'][name]['descriptions'], dtype=object)
+		descriptions[:] = json.loads(columns.pop('descriptions').tobytes().decode('utf-8'))
+		return columns, descriptions
+
+	def read_categories(self, month, rules):
+		"""
+			Per day category sums and uncategorized descriptions of a partition categorized
+			by the given rules (see write_categories), None if they weren't written yet
+		"""
+		try:
+			with np.load(self._path(_month_name(month) + CATEGORIES_SUFFIX)) as data:
+				if data['rules'].tobytes().decode('utf-8') != rules:
+					return None
+				uncategorized = json.loads(data['uncategorized'].tobytes().decode('utf-8'))
+				return data['days'].astype('datetime64[D]'), data['categories'], uncategorized
+		except (OSError, ValueError, KeyError):
+			# missing or damaged category sums are calculated again
+			return None
+
+	def write_categories(self, month, rules, days, categories, uncategorized):
+		"""
+			Store the per day category sums of a partition and the descriptions of its
+			uncategorized expenses; they are valid until the rules or the partitions change
+		"""
+		def encode(value):
+			return np.frombuffer(value.encode('utf-8'), dtype=np.uint8)
+
+		_save(self._path(_month_name(month) + CATEGORIES_SUFFIX), days=days.astype('int32'), categories=categories,
+		      uncategorized=encode(json.dumps(uncategorized)), rules=encode(rules))
+
+	def load(self, months):
+		"""
+			Date sorted store of the transactions of the given months
+		"""
+		names = [_month_name(month) for month in months if _month_name(month) in self._index.get('partitions', {})]
+		with instrumentation.timed('partition load'):
+			parts = [self._read(name) for name in names]
+			columns = [part[0] for part in parts]
+
+			def concat(key, dtype):
+				return np.concatenate([part[key] for part in columns]) if columns else np.array([], dtype=dtype)
+
+			# the descriptions of all partitions are merged into one set of unique descriptions
+			offsets = np.cumsum([0] + [len(part[1]) for part in parts[:-1]])
+			codes = np.concatenate([part['codes'] + offset for part, offset in zip(columns, offsets)]) if columns else \
+			        np.array([], dtype='int32')
+			unique_codes, descriptions = pd.factorize(np.concatenate([part[1] for part in parts]) if parts else
+			                                          np.array([], dtype=object))
+
+			balances = has_balance = None
+			if self._index.get('has_balance', False):
+				balances, has_balance = concat('balances', 'int64'), concat('has_balance', bool)
+			store = TransactionStore(concat('days', 'int32'), unique_codes[codes].astype('int32'), np.asarray(descriptions, dtype=object),
+			                         concat('amounts', 'int64'), balances, has_balance, self._index.get('scale', 100))
+		instrumentation.count('partitions loaded', len(names))
+		instrumentation.count('partition rows', len(store))
+		return store
+
+
+class PartitionCube:
+	"""
+		Aggregate cube of partitioned transactions: the overview and category queries are
+		answered for the whole history by the per day sums of all partitions, the masks
+		of the categories only for the descriptions of the loaded partitions. The partitions
+		which aren't loaded are categorized one at a time by a cube of build_cube(store);
+		their category sums are kept with the partitions until the rules change
+	"""
+
+	def __init__(self, summary, loaded, partitions, build_cube):
+		self._summary = summary
+		self._loaded = loaded
+		self._partitions = partitions
+		self._build_cube = build_cube
+
+	@property
+	def days(self):
+		return self._summary.days
+
+	@property
+	def months(self):
+		return self._summary.months
+
+	@property
+	def loaded_months(self):
+		return self._loaded.months
+
+	@property
+	def descriptions(self):
+		return self._loaded.descriptions
+
+	@property
+	def aliases(self):
+		return self._summary.aliases
+
+	def window(self, first_day=None, last_day=None):
+		return PartitionCube(self._summary.window(first_day, last_day), self._loaded.window(first_day, last_day),
+		                     self._partitions, self._build_cube)
+
+	def _partition_categories(self, month, rules, alias_regexes, uncategorized_regex, unknown):
+		"""
+			Per day category sums and uncategorized descriptions of a partition which isn't loaded
+		"""
+		categories = self._partitions.read_categories(month, rules)
+		if categories is None:
+			cube = self._build_cube(self._partitions.load([month]))
+			uncategorized = cube.categorize(alias_regexes, uncategorized_regex, unknown)
+			days, sums = cube.day_categories()
+			categories = days, sums, [str(description) for description in uncategorized]
+			self._partitions.write_categories(month, rules, *categories)
+			instrumentation.count('partitions categorized')
+		return categories
+
+	def categorize(self, alias_regexes, uncategorized_regex, unknown='Unknown'):
+		"""
+			Categorize the transactions of all partitions; returns the descriptions
+			of all uncategorized expenses, those of the oldest months first
+		"""
+		rules = json.dumps([list(alias_regexes.items()), uncategorized_regex, unknown])
+		loaded_uncategorized = self._loaded.categorize(alias_regexes, uncategorized_regex, unknown)
+		parts = [self._loaded.day_categories()]
+		uncategorized = []
+		months = self._partitions.months
+		for month in months[~np.isin(months, self._loaded.months)]:
+			days, sums, month_uncategorized = self._partition_categories(month, rules, alias_regexes, uncategorized_regex, unknown)
+			parts.append((days, sums))
+			uncategorized.extend(month_uncategorized)
+
+		# the days of the partitions are the days of the summary
+		categories = np.zeros((len(self._summary.days), len(self._loaded.aliases), 2), dtype=parts[0][1].dtype)
+		for days, sums in parts:
+			categories[np.searchsorted(self._summary.days, days)] = sums
+		self._summary.set_categories(self._loaded.aliases, categories)
+		return uncategorized + loaded_uncategorized
+
+	def category_mask(self, alias):
+		return self._loaded.category_mask(alias)
+
+	def month_categories(self, sign=EXPENSE):
+		return self._summary.month_categories(sign)
+
+	def total_in_out(self):
+		return self._summary.total_in_out()
+
+	def day_totals(self, sign=EXPENSE):
+		return self._summary.day_totals(sign)
+
+	def day_net(self):
+		return self._summary.day_net()
+
+	def day_balances(self):
+		return self._summary.day_balances()
+
+	def month_totals(self):
+		return self._summary.month_totals()
+
+	def year_totals(self):
+		return self._summary.year_totals()
+
+	def date_range(self):
+		return self._summary.date_range()
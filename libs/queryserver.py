@@ -0,0 +1,328 @@
+import os
+import sys
+import json
+import time
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qsl, unquote
+import numpy as np
+from libs import compression
+from libs.instrumentation import instrumentation
+
+# number of cached responses, the least recently used ones are dropped beyond
+CACHE_SIZE = 1024
+# maximum size of the request line and of each header line
+MAX_LINE = 8192
+
+REASONS = {200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           500: 'Internal Server Error'}
+
+
+def _values(values):
+	"""
+		Plain list of an array, NaN becomes null
+	"""
+	values = np.asarray(values)
+	if np.issubdtype(values.dtype, np.floating):
+		return [None if value != value else value for value in values.tolist()]
+	return values.tolist()
+
+
+def _day_values(data_handler, dates, values, date_format):
+	"""
+		Per day values by ISO date
+	"""
+	return OrderedDict([('date_format', date_format),
+	                    ('days', OrderedDict(zip(np.datetime_as_string(dates, unit='D').tolist(),
+	                                             _values(data_handler.to_display(values)))))])
+
+
+def _records(df):
+	"""
+		Rows of a table frame as a list of objects
+	"""
+	columns = [col for col in df.columns if col != 'index']
+	values = [_values(df[col].values) if df[col].dtype != object else df[col].tolist() for col in columns]
+	return [OrderedDict(zip(columns, row)) for row in zip(*values)]
+
+
+def _flag(params, name):
+	return params.get(name, '').lower() in ('1', 'true', 'yes')
+
+
+def _param(params, name):
+	if name not in params:
+		raise ValueError('Missing parameter: ' + name)
+	return params[name]
+
+
+def _total_in_out(data_handler, params):
+	income, expenses = _values(data_handler.to_display(data_handler.get_total_in_out()))
+	return OrderedDict([('income', income), ('expenses', expenses)])
+
+
+def _total_month(data_handler, params):
+	return OrderedDict((month, OrderedDict(zip(['income', 'expenses'], _values(data_handler.to_display(values)))))
+	                   for month, values in data_handler.get_total_month().items())
+
+
+def _total_day(data_handler, params):
+	dates, amounts, date_format = data_handler.get_total_day_arrays(_flag(params, 'overall'), _flag(params, 'reverse'))
+	return _day_values(data_handler, dates, amounts, date_format)
+
+
+def _days_balance(data_handler, params):
+	arrays = data_handler.get_days_balance_arrays()
+	if arrays is None:
+		raise ValueError('No balances imported')
+	return _day_values(data_handler, *arrays)
+
+
+def _categories(data_handler, params):
+	return OrderedDict((month, OrderedDict(zip(values.keys(), _values(data_handler.to_display(list(values.values()))))))
+	                   for month, values in data_handler.get_calculated_categories().items())
+
+
+def _categorized(data_handler, params):
+	return _records(data_handler.get_categorized_data_sets(_param(params, 'month'), _param(params, 'category')))
+
+
+def _search(data_handler, params):
+	return _records(data_handler.get_search_data(params.get('q', '')))
+
+
+# the queries of the data handler by path, called with the query parameters of the request
+ENDPOINTS = OrderedDict([('/total_in_out', _total_in_out),
+                         ('/total_month', _total_month),
+                         ('/total_day', _total_day),
+                         ('/days_balance', _days_balance),
+                         ('/categories', _categories),
+                         ('/categorized', _categorized),
+                         ('/search', _search)])
+
+
+class QueryServer:
+	"""
+		Serve the queries of a data handler as JSON over HTTP with asyncio; load() returns
+		the imported data handler and its settings. The data handler is only used by a
+		single worker thread, which imports the data and runs the queries as well as the
+		updates, so the event loop keeps accepting requests meanwhile. Responses are cached
+		until the data or the categories change, concurrent requests of an uncached
+		response share one query
+	"""
+
+	def __init__(self, load, cache_size=CACHE_SIZE):
+		self._load = load
+		self._data_handler = None
+		self._settings = None
+		self._cache_size = cache_size
+		self._cache = OrderedDict()
+		self._pending = {}
+		self._loads = 0
+		self._worker = ThreadPoolExecutor(max_workers=1)
+		self._watcher = None
+		self._loop = None
+		self._server = None
+		# distinguishes the entity tags of different server runs
+		self._start = '%x' % int(time.time())
+
+	def _stamp(self):
+		"""
+			State of the data the responses are calculated from
+		"""
+		return self._loads, self._data_handler.generation
+
+	async def start(self, host, port):
+		"""
+			Import the data and start listening; returns the address of the server
+		"""
+		self._loop = asyncio.get_running_loop()
+		# the database connection can only be used by the thread which opened it
+		await self._loop.run_in_executor(self._worker, self._reload)
+		self._server = await asyncio.start_server(self._handle, host, port, limit=MAX_LINE)
+		return self._server.sockets[0].getsockname()
+
+	async def serve_forever(self):
+		async with self._server:
+			await self._server.serve_forever()
+
+	def close(self):
+		self.stop_watching()
+		if self._server is not None:
+			self._server.close()
+		self._worker.shutdown(wait=True)
+
+	def watch(self):
+		"""
+			Merge new, changed and removed import files and apply changed category
+			rules as soon as they are written to the import directory
+		"""
+		from libs.watcher import DirectoryWatcher
+
+		definitions = self._settings.category_def_dir
+		file_type = self._settings.file_type
+		self._watcher = DirectoryWatcher(self._settings.import_dir,
+		                                 lambda name: name == definitions or compression.matches(name, file_type),
+		                                 self._cb_watched_files_changed)
+		self._watcher.start()
+		return self._watcher.backend
+
+	def stop_watching(self):
+		if self._watcher is not None:
+			self._watcher.stop()
+			self._watcher = None
+
+	def _cb_watched_files_changed(self, changed, removed):
+		# executed in the watcher thread, the update is queued behind the running queries
+		definitions = os.path.join(self._settings.import_dir, self._settings.category_def_dir)
+		rules_changed = definitions in changed
+		changed = [path for path in changed if path != definitions]
+		removed = [path for path in removed if path != definitions]
+		self._loop.call_soon_threadsafe(self._worker.submit, self._update, changed, removed, rules_changed)
+
+	def _update(self, changed, removed, rules_changed):
+		"""
+			Update the data handler, executed in the worker thread
+		"""
+		try:
+			if changed or removed:
+				self._data_handler.apply_update(changed, removed, self._data_handler.load_update(changed))
+			if rules_changed:
+				# the import itself writes the definitions, only changed rules are applied
+				self._data_handler.reload_definitions()
+		except (ImportError, ValueError, OSError) as e:
+			print('Update failed: ' + str(e.args[0]), file=sys.stderr)
+		self._loop.call_soon_threadsafe(self._drop_stale)
+
+	def _reload(self):
+		"""
+			Import everything again, executed in the worker thread
+		"""
+		data_handler, settings = self._load()
+		# counted first, cached responses of the old data never match meanwhile
+		self._loads += 1
+		self._data_handler, self._settings = data_handler, settings
+		self._loop.call_soon_threadsafe(self._drop_stale)
+
+	def _drop_stale(self):
+		stamp = self._stamp()
+		for key in [key for key, (entry_stamp, body) in self._cache.items() if entry_stamp != stamp]:
+			del self._cache[key]
+
+	def _query(self, func, params):
+		"""
+			Run a query and encode its result, executed in the worker thread
+		"""
+		stamp = self._stamp()
+		with instrumentation.timed('server query'):
+			body = json.dumps(func(self._data_handler, params)).encode('utf-8')
+		return stamp, body
+
+	async def _response(self, path, params):
+		"""
+			Cached response of a query as stamp and body
+		"""
+		key = (path, tuple(sorted(params.items())))
+		entry = self._cache.get(key)
+		if entry is not None and entry[0] == self._stamp():
+			self._cache.move_to_end(key)
+			instrumentation.count('server cache hits')
+			return entry
+
+		# requests of a query which is running already wait for its result
+		future = self._pending.get(key)
+		if future is None:
+			future = self._loop.run_in_executor(self._worker, self._query, ENDPOINTS[path], params)
+			self._pending[key] = future
+			future.add_done_callback(lambda done: self._cb_query_done(key, done))
+		# the query isn't cancelled when a client goes away
+		return await asyncio.shield(future)
+
+	def _cb_query_done(self, key, future):
+		del self._pending[key]
+		if future.cancelled() or future.exception() is not None:
+			return
+		self._cache[key] = future.result()
+		while len(self._cache) > self._cache_size:
+			self._cache.popitem(last=False)
+
+	async def _dispatch(self, method, target, headers):
+		"""
+			Status, headers and body of the response to a request
+		"""
+		url = urlsplit(target)
+		path = unquote(url.path).rstrip('/') or '/'
+		params = dict(parse_qsl(url.query))
+
+		if path == '/reload':
+			if method != 'POST':
+				return 405, {}, {'error': 'Use POST to reload'}
+			await self._loop.run_in_executor(self._worker, self._reload)
+			return 200, {}, {'reloaded': True}
+
+		if path not in ENDPOINTS:
+			return 404, {}, {'error': 'Unknown path: ' + path, 'endpoints': list(ENDPOINTS.keys())}
+		if method not in ('GET', 'HEAD'):
+			return 405, {}, {'error': 'Use GET to query'}
+
+		stamp, body = await self._response(path, params)
+		etag = '"%s-%d-%d"' % ((self._start,) + stamp)
+		if headers.get('if-none-match') == etag:
+			return 304, {'ETag': etag}, b''
+		return 200, {'ETag': etag, 'Cache-Control': 'no-cache'}, body
+
+	async def _handle(self, reader, writer):
+		"""
+			Answer the requests of a connection, which is kept alive unless the client closes it
+		"""
+		try:
+			while True:
+				request_line = await reader.readline()
+				if not request_line:
+					break
+				parts = request_line.decode('latin-1').split()
+				headers = {}
+				while True:
+					line = await reader.readline()
+					if line in (b'\r\n', b'\n', b''):
+						break
+					name, _, value = line.decode('latin-1').partition(':')
+					headers[name.strip().lower()] = value.strip()
+				# request bodies aren't used, but must not be read as the next request
+				length = int(headers.get('content-length', 0))
+				if length < 0:
+					raise ValueError(length)
+				while length:
+					length -= len(await reader.readexactly(min(length, 65536)))
+				if len(parts) != 3:
+					status, extra, body = 400, {}, {'error': 'Malformed request'}
+				else:
+					try:
+						status, extra, body = await self._dispatch(parts[0], parts[1], headers)
+					except ValueError as e:
+						status, extra, body = 400, {}, {'error': str(e.args[0])}
+					except Exception as e:
+						status, extra, body = 500, {}, {'error': repr(e)}
+
+				if not isinstance(body, bytes):
+					body = json.dumps(body).encode('utf-8')
+				# the end of a chunked body isn't known, the connection is closed after it
+				keep_alive = (len(parts) == 3 and parts[2] == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+				              and 'transfer-encoding' not in headers)
+				head = ['HTTP/1.1 %d %s' % (status, REASONS[status]),
+				        'Content-Type: application/json',
+				        'Content-Length: %d' % len(body),
+				        'Connection: ' + ('keep-alive' if keep_alive else 'close')]
+				head.extend('%s: %s' % item for item in extra.items())
+				writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1'))
+				if parts[:1] != ['HEAD']:
+					writer.write(body)
+				await writer.drain()
+				if not keep_alive:
+					break
+		except (ConnectionError, asyncio.LimitOverrunError, asyncio.IncompleteReadError, ValueError):
+			# the client went away or sent oversized lines
+			pass
+		finally:
+			writer.close()
@@ -0,0 +1,124 @@
+from PyQt5.QtWidgets import QWidget, QVBoxLayout
+from PyQt5.QtGui import QImage, QPixmap, QPainter
+from PyQt5.QtCore import Qt, pyqtSignal
+from libs.instrumentation import instrumentation
+
+
+class RasterChart(QWidget):
+	"""
+		Chart whose figure is built and drawn with Agg in a worker thread; the image is
+		shown until the mouse enters the chart, then the interactive canvas created by
+		create_canvas(fig) takes its place. build and draw are run by submit(func, *args),
+		track(fig, cid) disconnects the chart from the figure once it is released
+	"""
+	# emitted from the worker thread, handled in the GUI thread
+	built = pyqtSignal()
+	drawn = pyqtSignal(int, int, bytes)
+
+	def __init__(self, build, create_canvas, submit, track):
+		super(RasterChart, self).__init__()
+		self.figure = None
+		self.canvas = None
+		self._create_canvas = create_canvas
+		self._submit = submit
+		self._track = track
+		self._cid = None
+		self._pixmap = None
+		self._size = None
+		self._laid_out = False
+		# the worker is using the figure
+		self._busy = True
+		self._activate = False
+
+		self.layout = QVBoxLayout()
+		self.layout.setContentsMargins(0, 0, 0, 0)
+		self.setLayout(self.layout)
+
+		self.built.connect(self._cb_built)
+		self.drawn.connect(self._cb_drawn)
+		self._submit(self._build, build)
+
+	def _build(self, build):
+		"""
+			Build the figure, executed in the worker thread
+		"""
+		fig = build()
+		self._cid = fig.canvas.mpl_connect('draw_event', self._cb_draw_event)
+		self._track(fig, self._cid)
+		self.figure = fig
+		self.built.emit()
+
+	def _render(self, size):
+		"""
+			Draw the figure in size pixels, executed in the worker thread
+		"""
+		dpi = self.figure.dpi
+		self.figure.set_size_inches(size[0] / float(dpi), size[1] / float(dpi), forward=False)
+		with instrumentation.timed('rasterize'):
+			self.figure.canvas.draw()
+
+	def _cb_draw_event(self, event):
+		# executed in the thread drawing the figure, the image is passed on to the GUI thread
+		width, height = event.canvas.get_width_height()
+		self.drawn.emit(width, height, bytes(event.canvas.buffer_rgba()))
+
+	def _cb_built(self):
+		self._busy = False
+		self._draw()
+
+	def _cb_drawn(self, width, height, data):
+		self._busy = False
+		self._pixmap = QPixmap.fromImage(QImage(data, width, height, QImage.Format_RGBA8888))
+		self.update()
+		if self._activate:
+			self.activate()
+		else:
+			# the chart might have been resized meanwhile
+			self._draw()
+
+	def _draw(self):
+		"""
+			Let the worker draw the figure in the size of the chart once it is laid out
+		"""
+		if self.figure is None or self.canvas is not None or self._busy or not self._laid_out:
+			return
+		size = (self.width(), self.height())
+		if size != self._size:
+			self._size = size
+			self._busy = True
+			self._submit(self._render, size)
+
+	def activate(self):
+		"""
+			Replace the image by the interactive canvas, as soon as the worker is done with the figure
+		"""
+		if self.canvas is not None or self.figure is None:
+			return
+		if self._busy:
+			self._activate = True
+			return
+		self.figure.canvas.mpl_disconnect(self._cid)
+		self.canvas = self._create_canvas(self.figure)
+		self._pixmap = None
+		self.layout.addWidget(self.canvas)
+
+	def resizeEvent(self, event):
+		super(RasterChart, self).resizeEvent(event)
+		self._laid_out = True
+		self._draw()
+
+	def enterEvent(self, event):
+		super(RasterChart, self).enterEvent(event)
+		self.activate()
+
+	def paintEvent(self, event):
+		if self.canvas is not None:
+			return
+		painter = QPainter(self)
+		if self._pixmap is None:
+			painter.drawText(self.rect(), Qt.AlignCenter, 'Rendering...')
+		else:
+			# the image is drawn in the size of the chart, it is only scaled while the chart is resized
+			pixmap = self._pixmap.scaled(self.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation)
+			painter.drawPixmap((self.width() - pixmap.width()) // 2, (self.height() - pixmap.height()) // 2, pixmap)
+		painter.end()
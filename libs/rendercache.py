@@ -0,0 +1,125 @@
+import os
+import hashlib
+import tempfile
+import numpy as np
+
+# size of all cached images in bytes, the least recently used ones are removed beyond
+MAX_SIZE = 256 * 1024 * 1024
+# part of every key, has to be increased whenever the charts are drawn differently
+VERSION = 1
+
+
+def _feed(digest, value):
+	"""
+		Add a value (numbers, strings, arrays and containers of them) to the digest
+	"""
+	if isinstance(value, np.ndarray) and value.dtype != object:
+		digest.update(('array %s %r;' % (value.dtype.str, value.shape)).encode())
+		digest.update(np.ascontiguousarray(value).tobytes())
+	elif isinstance(value, dict):
+		digest.update(b'{')
+		for key, item in value.items():
+			_feed(digest, key)
+			_feed(digest, item)
+		digest.update(b'}')
+	elif isinstance(value, (list, tuple, np.ndarray)):
+		digest.update(b'[')
+		for item in value:
+			_feed(digest, item)
+		digest.update(b']')
+	else:
+		digest.update(('%s %r;' % (type(value).__name__, value)).encode())
+
+
+class RenderCache(object):
+	"""
+		Rendered chart images on disk, addressed by a hash of everything the image
+		depends on; the size is bounded and the least recently used images are removed.
+		Several processes may share the directory
+	"""
+
+	def __init__(self, directory, max_size=MAX_SIZE):
+		self.directory = directory
+		self.max_size = max_size
+		self._size = None
+		os.makedirs(directory, exist_ok=True)
+
+	def key(self, *parts):
+		"""
+			Key of an image depending on parts
+		"""
+		digest = hashlib.sha256()
+		_feed(digest, (VERSION,) + parts)
+		return digest.hexdigest()
+
+	def _path(self, key, fmt):
+		return os.path.join(self.directory, key + '.' + fmt)
+
+	def get(self, key, fmt):
+		"""
+			Cached image of key, None if it isn't cached
+		"""
+		path = self._path(key, fmt)
+		try:
+			with open(path, 'rb') as fp:
+				data = fp.read()
+			# the modification time marks the last use
+			os.utime(path)
+		except OSError:
+			return None
+		return data
+
+	def put(self, key, fmt, data):
+		"""
+			Cache the image of key
+		"""
+		# written under a temporary name first, other processes only see complete images
+		path = self._path(key, fmt)
+		fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+		try:
+			with os.fdopen(fd, 'wb') as fp:
+				fp.write(data)
+			# an image replaced by the new one doesn't count anymore
+			try:
+				replaced = os.stat(path).st_size
+			except FileNotFoundError:
+				replaced = 0
+			os.replace(tmp_path, path)
+		except OSError:
+			if os.path.exists(tmp_path):
+				os.remove(tmp_path)
+			raise
+
+		if self._size is None:
+			self._size = self._evict()
+		else:
+			self._size += len(data) - replaced
+			if self._size > self.max_size:
+				self._size = self._evict()
+
+	def _evict(self):
+		"""
+			Remove the least recently used images beyond the maximum size;
+			returns the size of the remaining images
+		"""
+		entries = []
+		with os.scandir(self.directory) as it:
+			for entry in it:
+				if entry.is_file() and not entry.name.endswith('.tmp'):
+					try:
+						stat = entry.stat()
+					except OSError:
+						continue
+					entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+
+		size = sum(entry[1] for entry in entries)
+		for mtime, file_size, path in sorted(entries):
+			if size <= self.max_size:
+				break
+			try:
+				os.remove(path)
+			except OSError:
+				# removed by another process meanwhile
+				pass
+			size -= file_size
+		return size
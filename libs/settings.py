@@ -1,6 +1,25 @@
 import csv
 import os
-from xlrd import open_workbook  # pandas uses xlrd internally as well so just stick to this module for the preview data
+from io import StringIO
+from itertools import chain, islice
+from contextlib import closing
+from libs import compression
+
+# bytes of the test file used to determine the csv format
+SNIFF_SAMPLE_SIZE = 64 * 1024
+# number of rows shown in the data preview
+PREVIEW_ROWS = 10
+
+
+def files_signature(files):
+	"""
+		Name, size and modification time of each file, which change whenever a file is added, replaced or removed
+	"""
+	signature = []
+	for file in files:
+		stat = os.stat(file)
+		signature.append([os.path.basename(file), stat.st_size, stat.st_mtime_ns])
+	return signature
 
 
 class Settings:
@@ -8,12 +27,15 @@ class Settings:
 	def __init__(self):
 		self.selection_text = 'Select'
 		self.category_def_dir = 'category_definitions.json'
-		self.available_extensions = ['csv', 'xls']
+		self.available_extensions = ['csv', 'xls', 'xlsx']
 		self.available_date_formats = ['%Y-%m-%d', '%y-%m-%d', '%d-%m-%Y', '%m-%d-%Y', '%Y-%d-%m']
 		self.header = []
 		self.col_numbers = None
 		self.has_header = False
 		self.delimiter = None
+		# signature of the import files the csv format was determined from
+		self._sniff_signature = None
+		self.quotechar = '"'
 		self.file_type = None
 		self.import_files = None
 		self.column_date = None
@@ -22,6 +44,22 @@ class Settings:
 		self.column_balance = None
 		self.date_format = None
 		self.import_dir = None
+		# amounts are processed as integer minor units and only converted for display
+		self.fixed_point_money = True
+		self.money_digits = 2
+		# transactions contained in several (overlapping) import files are only imported once
+		self.drop_duplicates = True
+		# keep the imported transactions in a database within the import directory
+		# instead of reading all import files into memory
+		self.use_sql_store = False
+		self.sql_store_name = 'transactions.sqlite'
+		# keep the parsed transactions in one file per month within the import directory,
+		# only the most recent partition_months (all if 0) are loaded
+		self.use_partitions = False
+		self.partitions_name = 'partitions'
+		self.partition_months = 12
+		# build and draw the figures in a worker thread, shown as images until used
+		self.background_rendering = False
 
 		self._preview_data = None
 
@@ -43,15 +81,14 @@ class Settings:
 		            settings['amount_col']: self.column_amount,
 		            settings['balance_col']: self.column_balance}
 
-		header = ''
+		header = []
 		# Loop through all columns of the import file
 		for i in range(0, len(self._preview_data[0])):
 			# the columns that can be mapped to the above dict are filled with the corresponding names
 			# other columns that are not needed for data processing still have to be named something
-			# otherwise the has_header check will fail due to empty column names
-			attach = def_cols[i] if i in def_cols.keys() else 'Dummy'
-			header = header + (',' if header else '') + attach
-		return header + '\n'
+			# unique, otherwise the data can not be parsed
+			header.append(def_cols[i] if i in def_cols.keys() else 'Dummy' + str(i))
+		return header
 
 	def set_import_settings(self, settings):
 		"""
@@ -80,6 +117,30 @@ class Settings:
 		else:
 			self.col_numbers['balance'] = self.selection_text
 
+	def apply_saved_settings(self, import_dir, saved):
+		"""
+			Set import settings from the settings saved in the definitions file;
+			used to import data without the settings tab
+		"""
+		if not saved or 'columns' not in saved:
+			raise ValueError('No saved settings found in: ' + import_dir)
+
+		self.import_dir = import_dir
+		self.sniff_import_dir(import_dir, saved['file_type'], saved.get('format'))
+
+		columns = saved['columns']
+		settings = {'import_dir': import_dir,
+		            'file_type': saved['file_type'],
+		            'date_format': saved['date_format'],
+		            'date_col': int(columns['date'])-1,
+		            'description_col': int(columns['description'])-1,
+		            'amount_col': int(columns['amount'])-1}
+
+		# balance is not a required field
+		balance = columns.get('balance', self.selection_text)
+		settings['balance_col'] = int(balance)-1 if balance != self.selection_text else balance
+		self.set_import_settings(settings)
+
 	def _set_default_col_names(self):
 		"""
 			Specify default column names in case no header has been provided in the import file
@@ -89,17 +150,73 @@ class Settings:
 		self.column_amount = 'Amount'
 		self.column_balance = 'Balance'
 
-	def sniff_import_dir(self, import_dir, file_type):
+	def get_sniff_results(self):
+		"""
+			Retrieve the determined format of csv files, stored in the definitions file
+			so that the format does not have to be determined again
+		"""
+		if self.file_type != 'csv' or self.delimiter is None:
+			return None
+		return {'file_type': self.file_type,
+		        'delimiter': self.delimiter,
+		        'has_header': self.has_header,
+		        'quotechar': self.quotechar,
+		        'files': self._sniff_signature}
+
+	def _sniff_csv(self, sample):
+		"""
+			Determine delimiter, quote character and header from a sample of the file
+		"""
+		# only analyze complete lines unless the whole file fits into the sample
+		if len(sample) == SNIFF_SAMPLE_SIZE and '\n' in sample:
+			sample = sample[:sample.rindex('\n')+1]
+
+		sniffer = csv.Sniffer()
+		dialect = sniffer.sniff(sample)
+		self.delimiter = dialect.delimiter
+		self.quotechar = dialect.quotechar
+		self.has_header = sniffer.has_header(sample)
+
+	def _preview_xls(self, file):
+		"""
+			Read only the preview rows of the first sheet; the workbook is loaded
+			on demand and released right away
+		"""
+		from xlrd import open_workbook  # pandas uses xlrd internally as well so just stick to this module for the preview data
+		wb = open_workbook(file, on_demand=True)
+		try:
+			sheet = wb.sheet_by_index(0)
+			return [sheet.row_values(i) for i in range(min(sheet.nrows, PREVIEW_ROWS))]
+		finally:
+			wb.release_resources()
+
+	def _preview_xlsx(self, file):
+		"""
+			Stream only the preview rows of the first sheet with a read-only workbook
+		"""
+		try:
+			from openpyxl import load_workbook
+		except ImportError:
+			raise ImportError('The openpyxl package is required to import xlsx files!')
+		wb = load_workbook(file, read_only=True, data_only=True)
+		try:
+			return [list(row) for row in wb.worksheets[0].iter_rows(max_row=PREVIEW_ROWS, values_only=True)]
+		finally:
+			wb.close()
+
+	def sniff_import_dir(self, import_dir, file_type, cached=None):
 		"""
 			Analyze the import files and determine some characteristics such as
-			delimiter and header
+			delimiter and header; cached results of an earlier analysis are used if the
+			import files haven't changed since
 		"""
 		# check all files in the import directory with the allowed file types
-		self.import_files = []
-		for file in os.listdir(import_dir):
-			if os.path.splitext(file)[1][1:] in file_type:
-				self.import_files.append(os.path.join(import_dir, file))
+		with os.scandir(import_dir) as entries:
+			self.import_files = sorted(entry.path for entry in entries
+			                           if entry.is_file() and compression.matches(entry.name, file_type))
 
+		self.has_header = False
+		self.header = []
 		if self.import_files:
 			# pick a test file to analyze
 			# this assumes that all files that have to be imported are
@@ -107,22 +224,34 @@ class Settings:
 			test_file = self.import_files[0]
 
 			if file_type == 'csv':
-				with open(test_file, 'r') as fp:
-					data = fp.readlines()
-					sniffer = csv.Sniffer()
-					dialect = sniffer.sniff(''.join(data))
-					self.delimiter = dialect.delimiter
-
-					if sniffer.has_header(''.join(data)):
-						self.has_header = True
-						self.header = data[0].strip().split(self.delimiter)
-
-					self._preview_data = list(csv.reader(data, delimiter=self.delimiter, quotechar=dialect.quotechar))
-					return self._preview_data[:10]
+				# an added or changed file might have a different format
+				self._sniff_signature = files_signature(self.import_files)
+				# compressed files are decompressed while reading, only the sample is read
+				with closing(compression.open_text(test_file, file_type)) as streams:
+					for name, fp in streams:
+						sample = ''
+						if cached and cached.get('file_type') == file_type and cached.get('delimiter') and \
+						   cached.get('files') == self._sniff_signature:
+							self.delimiter = cached['delimiter']
+							self.quotechar = cached.get('quotechar', '"')
+							self.has_header = cached.get('has_header', False)
+						else:
+							sample = fp.read(SNIFF_SAMPLE_SIZE)
+							self._sniff_csv(sample)
+
+						# only the preview rows are parsed, continuing after the sample
+						lines = chain(StringIO(sample), fp)
+						self._preview_data = list(islice(csv.reader(lines, delimiter=self.delimiter, quotechar=self.quotechar), PREVIEW_ROWS))
+						if self.has_header and self._preview_data:
+							self.header = [col.strip() for col in self._preview_data[0]]
+						return self._preview_data
 			elif file_type == 'xls':
-				wb = open_workbook(test_file)
-				sheet = wb.sheets()[0]
-				self._preview_data = [sheet.row_values(i) for i in range(sheet.nrows)]
+				self._preview_data = self._preview_xls(test_file)
 				self.has_header = True  # assume that excel files come with a header
-				self.header = self._preview_data[0]
-				return self._preview_data[:10]
+				self.header = self._preview_data[0] if self._preview_data else []
+				return self._preview_data
+			elif file_type == 'xlsx':
+				self._preview_data = self._preview_xlsx(test_file)
+				self.has_header = True  # same as for xls files
+				self.header = ['' if col is None else str(col).strip() for col in self._preview_data[0]] if self._preview_data else []
+				return self._preview_data
@@ -0,0 +1,382 @@
+import re
+import copy
+import json
+import sqlite3
+import functools
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from libs.aggregates import EXPENSE
+from libs.transactions import contains
+from libs.instrumentation import instrumentation
+
+# rows inserted per statement batch
+INSERT_CHUNK_ROWS = 100000
+# the trigram tokenizer only matches search strings of at least 3 characters
+MIN_FTS_LENGTH = 3
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS descriptions (id INTEGER PRIMARY KEY, text TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS transactions (id INTEGER PRIMARY KEY,
+                                         day INTEGER NOT NULL,
+                                         month INTEGER NOT NULL,
+                                         description_id INTEGER NOT NULL,
+                                         amount INTEGER NOT NULL,
+                                         balance INTEGER);
+CREATE TABLE IF NOT EXISTS description_categories (alias TEXT NOT NULL,
+                                                   description_id INTEGER NOT NULL,
+                                                   PRIMARY KEY (alias, description_id)) WITHOUT ROWID;
+'''
+
+INDEXES = '''
+CREATE INDEX IF NOT EXISTS transactions_day ON transactions (day, amount);
+CREATE INDEX IF NOT EXISTS transactions_month ON transactions (month, amount, description_id);
+CREATE INDEX IF NOT EXISTS transactions_amount ON transactions (amount);
+CREATE INDEX IF NOT EXISTS transactions_description ON transactions (description_id, amount);
+'''
+
+
+def _locked(func):
+	"""
+		Run a method of the store holding the lock of its connection
+	"""
+	@functools.wraps(func)
+	def wrapper(self, *args, **kwargs):
+		with self._lock:
+			return func(self, *args, **kwargs)
+	return wrapper
+
+
+class SqlStore:
+	"""
+		Imported transactions in a local SQLite database; answers the same
+		queries as the aggregate cube with indexed SQL, so the transactions
+		do not have to be kept in memory. Amounts are stored as integer minor units
+	"""
+
+	def __init__(self, path, scale=100, exact=True):
+		self.path = path
+		self.scale = scale
+		# without exact amounts all sums are returned in major units
+		self._divisor = 1 if exact else float(scale)
+		# the connection is shared by the GUI thread and the worker rendering the figures,
+		# every method using it holds the lock, so its statements aren't interleaved
+		self._connection = sqlite3.connect(path, check_same_thread=False)
+		self._lock = threading.RLock()
+		self._connection.executescript(SCHEMA)
+		self._fts = self._create_fts()
+
+		self.aliases = []
+		self._unknown = 'Unknown'
+		# the transactions queried, all or those of a date range (see window)
+		self._table = 'transactions'
+
+	def _create_fts(self):
+		"""
+			Create the full text index of the descriptions if FTS5 with the trigram
+			tokenizer is available, otherwise descriptions are searched with LIKE
+		"""
+		try:
+			self._connection.execute("CREATE VIRTUAL TABLE IF NOT EXISTS descriptions_fts USING "
+			                         "fts5(text, content='descriptions', content_rowid='id', tokenize='trigram')")
+			return True
+		except sqlite3.OperationalError:
+			return False
+
+	@_locked
+	def close(self):
+		self._connection.close()
+
+	@_locked
+	def get_meta(self, key):
+		row = self._connection.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+		return json.loads(row[0]) if row else None
+
+	@_locked
+	def set_meta(self, key, value):
+		with self._connection:
+			self._connection.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, json.dumps(value)))
+
+	@_locked
+	def load(self, store):
+		"""
+			Replace all transactions by the rows of a transaction store
+		"""
+		con = self._connection
+		with instrumentation.timed('sql load'), con:
+			con.execute('DELETE FROM description_categories')
+			con.execute('DELETE FROM transactions')
+			con.execute('DELETE FROM descriptions')
+			# indexes are created after inserting, which is faster than updating them per row
+			for name in ['transactions_day', 'transactions_month', 'transactions_amount', 'transactions_description']:
+				con.execute('DROP INDEX IF EXISTS ' + name)
+
+			con.executemany('INSERT INTO descriptions (id, text) VALUES (?, ?)', enumerate(store.descriptions.tolist()))
+			months = store.days.astype('datetime64[D]').astype('datetime64[M]').astype('int64')
+			for start in range(0, len(store), INSERT_CHUNK_ROWS):
+				end = start + INSERT_CHUNK_ROWS
+				if store.balances is not None:
+					balances = np.where(store.has_balance[start:end], store.balances[start:end], None).tolist()
+				else:
+					balances = [None] * len(store.days[start:end])
+				con.executemany('INSERT INTO transactions (day, month, description_id, amount, balance) VALUES (?, ?, ?, ?, ?)',
+				                zip(store.days[start:end].tolist(), months[start:end].tolist(), store.codes[start:end].tolist(),
+				                    store.amounts[start:end].tolist(), balances))
+
+			con.executescript(INDEXES)
+			if self._fts:
+				con.execute("INSERT INTO descriptions_fts (descriptions_fts) VALUES ('rebuild')")
+			con.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', ('has_balance', json.dumps(store.balances is not None)))
+			con.execute('ANALYZE')
+		instrumentation.count('sql rows', len(store))
+
+	@_locked
+	def __len__(self):
+		return self._connection.execute('SELECT COUNT(*) FROM transactions').fetchone()[0]
+
+	@_locked
+	def _query(self, sql, params=(), dtypes=None):
+		"""
+			Run a query and return its columns as arrays
+		"""
+		with instrumentation.timed('sql query'):
+			rows = self._connection.execute(sql, params).fetchall()
+		columns = list(zip(*rows)) if rows else [[] for i in range(len(dtypes))]
+		return [np.array(col, dtype=dtype) for col, dtype in zip(columns, dtypes)]
+
+	def _values(self, values):
+		return values if self._divisor == 1 else values / self._divisor
+
+	def _descriptions(self):
+		"""
+			All unique descriptions, indexed by their id
+		"""
+		ids, texts = self._query('SELECT id, text FROM descriptions ORDER BY id', dtypes=['int64', object])
+		descriptions = np.empty(ids[-1] + 1 if len(ids) else 0, dtype=object)
+		descriptions[ids] = texts
+		return descriptions
+
+	@_locked
+	def categorize(self, alias_regexes, uncategorized_regex, unknown='Unknown'):
+		"""
+			Apply a regex per alias to the unique descriptions and store the
+			categories of each description; returns the descriptions of all
+			uncategorized expenses
+		"""
+		descriptions = pd.Series(self._descriptions(), dtype=object)
+		masks = OrderedDict()
+		for alias, regex in alias_regexes.items():
+			masks[alias] = descriptions.str.contains(regex, flags=re.IGNORECASE, na=False).values
+		instrumentation.count('regex scans', len(alias_regexes))
+
+		if uncategorized_regex:
+			uncategorized = ~descriptions.str.contains(uncategorized_regex, flags=re.IGNORECASE, na=False).values
+		else:
+			uncategorized = np.ones(len(descriptions), dtype=bool)
+		# all descriptions not covered by any category belong to the unknown category
+		masks[unknown] = masks.get(unknown, np.zeros(len(descriptions), dtype=bool)) | uncategorized
+		self._unknown = unknown
+		self.aliases = list(masks.keys())
+
+		with instrumentation.timed('sql categorize'), self._connection as con:
+			con.execute('DELETE FROM description_categories')
+			for alias, mask in masks.items():
+				con.executemany('INSERT INTO description_categories (alias, description_id) VALUES (?, ?)',
+				                ((alias, int(i)) for i in np.flatnonzero(mask)))
+
+		ids, counts = self._query('SELECT description_id, COUNT(*) FROM transactions WHERE amount < 0 GROUP BY description_id',
+		                          dtypes=['int64', 'int64'])
+		sel = uncategorized[ids] if len(ids) else np.array([], dtype=bool)
+		return list(np.repeat(descriptions.values[ids[sel]], counts[sel]))
+
+	def window(self, first_day=None, last_day=None):
+		"""
+			Store answering the queries for the days from first_day up to and including
+			last_day (None for an open end); the rows are selected with the day index
+		"""
+		conditions = []
+		if first_day is not None:
+			conditions.append('day >= %d' % np.datetime64(first_day, 'D').astype('int64'))
+		if last_day is not None:
+			conditions.append('day <= %d' % np.datetime64(last_day, 'D').astype('int64'))
+		store = copy.copy(self)
+		if conditions:
+			store._table = '(SELECT * FROM transactions WHERE ' + ' AND '.join(conditions) + ')'
+		return store
+
+	@_locked
+	def total_in_out(self):
+		"""
+			Total income and expenses as absolute values
+		"""
+		income, expenses = self._connection.execute('SELECT COALESCE(SUM(CASE WHEN amount > 0 THEN amount END), 0), '
+		                                            'COALESCE(SUM(CASE WHEN amount < 0 THEN amount END), 0) FROM ' + self._table).fetchone()
+		return self._values(abs(income)), self._values(abs(expenses))
+
+	def day_totals(self, sign=EXPENSE):
+		"""
+			Per day sums of all days with transactions of the given sign
+		"""
+		condition = 'amount < 0' if sign == EXPENSE else 'amount > 0'
+		days, amounts = self._query('SELECT day, SUM(amount) FROM ' + self._table + ' WHERE ' + condition + ' GROUP BY day ORDER BY day',
+		                            dtypes=['int64', 'int64'])
+		return days.astype('datetime64[D]'), self._values(amounts)
+
+	def day_net(self):
+		"""
+			Per day sums of all transactions
+		"""
+		days, amounts = self._query('SELECT day, SUM(amount) FROM ' + self._table + ' GROUP BY day ORDER BY day', dtypes=['int64', 'int64'])
+		return days.astype('datetime64[D]'), self._values(amounts)
+
+	@_locked
+	def day_balances(self):
+		"""
+			Per day anchor balances (NaN for days without a known balance) and
+			whether every single transaction came with a balance
+		"""
+		if not self.get_meta('has_balance'):
+			return None, False
+		# the offset between a known balance and the running sum is taken at its row and applied
+		# to the running sum at the end of the day, so later rows of the day are included;
+		# with MAX() the bare columns are taken from the last (known) row of each day
+		days, anchors = self._query('WITH rows AS (SELECT day, id, balance, SUM(amount) OVER (ORDER BY day, id) AS running '
+		                            'FROM ' + self._table + ') '
+		                            'SELECT e.day, e.running + k.offset FROM '
+		                            '(SELECT day, MAX(id), running FROM rows GROUP BY day) e LEFT JOIN '
+		                            '(SELECT day, MAX(id), balance - running AS offset FROM rows WHERE balance IS NOT NULL GROUP BY day) k '
+		                            'ON k.day = e.day ORDER BY e.day',
+		                            dtypes=['int64', 'float64'])
+		anchors = self._values(anchors)
+		missing = self._connection.execute('SELECT EXISTS (SELECT 1 FROM ' + self._table + ' WHERE balance IS NULL)').fetchone()[0]
+		return anchors, not missing
+
+	@property
+	def months(self):
+		months = self._query('SELECT DISTINCT month FROM ' + self._table + ' ORDER BY month', dtypes=['int64'])[0]
+		return months.astype('datetime64[M]')
+
+	def month_totals(self):
+		"""
+			Per month absolute income and expenses
+		"""
+		months, income, expenses = self._query('SELECT month, COALESCE(SUM(CASE WHEN amount > 0 THEN amount END), 0), '
+		                                       'COALESCE(SUM(CASE WHEN amount < 0 THEN amount END), 0) '
+		                                       'FROM ' + self._table + ' GROUP BY month ORDER BY month',
+		                                       dtypes=['int64', 'int64', 'int64'])
+		return months.astype('datetime64[M]'), self._values(np.abs(income)), self._values(np.abs(expenses))
+
+	def month_categories(self, sign=EXPENSE):
+		"""
+			Per month absolute category sums of the given sign
+		"""
+		condition = 't.amount < 0' if sign == EXPENSE else 't.amount > 0'
+		months, aliases, amounts = self._query('SELECT t.month, c.alias, SUM(t.amount) FROM ' + self._table + ' t '
+		                                       'JOIN description_categories c ON c.description_id = t.description_id '
+		                                       'WHERE ' + condition + ' GROUP BY t.month, c.alias',
+		                                       dtypes=['int64', object, 'int64'])
+		all_months = self.months
+		values = np.zeros((len(all_months), len(self.aliases)), dtype='int64')
+		if len(months):
+			alias_idx = pd.Index(self.aliases).get_indexer(aliases)
+			values[np.searchsorted(all_months.astype('int64'), months), alias_idx] = np.abs(amounts)
+		return all_months, self.aliases, self._values(values)
+
+	@_locked
+	def date_range(self):
+		"""
+			First and last day of the transactions
+		"""
+		first, last = self._connection.execute('SELECT MIN(day), MAX(day) FROM ' + self._table).fetchone()
+		if first is None:
+			return None, None
+		return np.datetime64(first, 'D'), np.datetime64(last, 'D')
+
+	def category_rows(self, first_day, last_day, alias):
+		"""
+			Expenses of the category alias from first_day up to and including last_day
+			(days since epoch) as arrays of days, descriptions and amounts
+		"""
+		return self._query('SELECT t.day, d.text, t.amount FROM ' + self._table + ' t '
+		                   'JOIN descriptions d ON d.id = t.description_id '
+		                   'WHERE t.day BETWEEN ? AND ? AND t.amount < 0 AND t.description_id IN '
+		                   '(SELECT description_id FROM description_categories WHERE alias = ?) ORDER BY t.id',
+		                   (int(first_day), int(last_day), alias), dtypes=['int64', object, 'int64'])
+
+	@_locked
+	def category_mask(self, alias):
+		"""
+			Mask over the description ids belonging to the category alias
+		"""
+		size = self._connection.execute('SELECT COALESCE(MAX(id) + 1, 0) FROM descriptions').fetchone()[0]
+		ids = self._query('SELECT description_id FROM description_categories WHERE alias = ?', (alias,), dtypes=['int64'])[0]
+		mask = np.zeros(size, dtype=bool)
+		mask[ids] = True
+		return mask
+
+	def transaction_rows(self, after_id, limit):
+		"""
+			Up to limit transactions following the id after_id in import order as arrays of
+			ids, days, description ids, descriptions, amounts and balances (NaN where unknown)
+		"""
+		return self._query('SELECT t.id, t.day, t.description_id, d.text, t.amount, t.balance FROM ' + self._table + ' t '
+		                   'JOIN descriptions d ON d.id = t.description_id WHERE t.id > ? ORDER BY t.id LIMIT ?',
+		                   (int(after_id), int(limit)), dtypes=['int64', 'int64', 'int64', object, 'int64', 'float64'])
+
+	def _description_condition(self, search_string):
+		"""
+			SQL condition and parameters selecting the descriptions containing search_string;
+			the search table of the matching descriptions has to exist
+		"""
+		if self._fts and len(search_string) >= MIN_FTS_LENGTH:
+			return 't.description_id IN (SELECT rowid FROM descriptions_fts WHERE descriptions_fts MATCH ?)', \
+			       ['"' + search_string.replace('"', '""') + '"']
+		# LIKE only ignores the case of ASCII letters, the descriptions are matched like in memory instead
+		ids, texts = self._query('SELECT id, text FROM descriptions', dtypes=['int64', object])
+		self._connection.executemany('INSERT INTO search_descriptions VALUES (?)', ((i,) for i in ids[contains(texts, search_string)].tolist()))
+		return 't.description_id IN (SELECT id FROM search_descriptions)', []
+
+	@_locked
+	def search(self, search_string, date_format):
+		"""
+			Transactions whose description, date (in date_format) or amount contains
+			search_string, most recent first, as arrays of days, descriptions and amounts
+		"""
+		select = 'SELECT t.day, d.text, t.amount FROM ' + self._table + ' t JOIN descriptions d ON d.id = t.description_id '
+		if not search_string:
+			return self._query(select + 'ORDER BY t.id DESC', dtypes=['int64', object, 'int64'])
+
+		# dates and amounts are matched on their distinct values only
+		days = self._query('SELECT DISTINCT day FROM ' + self._table, dtypes=['int64'])[0]
+		day_strings = pd.Series(days.astype('datetime64[D]')).dt.strftime(date_format)
+		amounts = self._query('SELECT DISTINCT amount FROM ' + self._table, dtypes=['int64'])[0]
+		amount_strings = pd.Series(amounts / float(self.scale)).astype(str)
+
+		con = self._connection
+		con.execute('CREATE TEMP TABLE IF NOT EXISTS search_days (day INTEGER PRIMARY KEY)')
+		con.execute('CREATE TEMP TABLE IF NOT EXISTS search_amounts (amount INTEGER PRIMARY KEY)')
+		con.execute('CREATE TEMP TABLE IF NOT EXISTS search_descriptions (id INTEGER PRIMARY KEY)')
+		with con:
+			con.execute('DELETE FROM search_days')
+			con.execute('DELETE FROM search_amounts')
+			con.execute('DELETE FROM search_descriptions')
+			con.executemany('INSERT INTO search_days VALUES (?)', ((d,) for d in days[contains(day_strings, search_string)].tolist()))
+			con.executemany('INSERT INTO search_amounts VALUES (?)', ((a,) for a in amounts[contains(amount_strings, search_string)].tolist()))
+			condition, params = self._description_condition(search_string)
+
+		# a union of the rows found by each index is faster than a single OR condition
+		return self._query(select + 'WHERE t.id IN (SELECT t.id FROM ' + self._table + ' t WHERE ' + condition + ' '
+		                   'UNION SELECT id FROM ' + self._table + ' WHERE day IN (SELECT day FROM search_days) '
+		                   'UNION SELECT id FROM ' + self._table + ' WHERE amount IN (SELECT amount FROM search_amounts)) ORDER BY t.id DESC',
+		                   params, dtypes=['int64', object, 'int64'])
+
+	@_locked
+	def memory_report(self):
+		"""
+			Retrieve the number of rows and the size of the database in bytes
+		"""
+		page_count = self._connection.execute('PRAGMA page_count').fetchone()[0]
+		page_size = self._connection.execute('PRAGMA page_size').fetchone()[0]
+		return OrderedDict([('rows', len(self)), ('database', page_count * page_size)])
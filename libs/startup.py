@@ -0,0 +1,59 @@
+import sys
+import time
+import importlib
+import threading
+
+# the first import of the application, used as the start of the startup time line
+START_TIME = time.perf_counter()
+
+
+class StartupProfiler:
+	"""
+		Records the time line of the application startup and of deferred imports
+	"""
+
+	def __init__(self, enabled=False):
+		self.enabled = enabled
+		self._events = []
+		self._lock = threading.Lock()
+
+	def _elapsed(self):
+		return (time.perf_counter() - START_TIME) * 1000
+
+	def mark(self, label):
+		"""
+			Record a point of the startup time line
+		"""
+		if self.enabled:
+			with self._lock:
+				self._events.append((self._elapsed(), label, None, None))
+
+	def timed_import(self, name):
+		"""
+			Import a module and record how long it took and how many modules it pulled in
+		"""
+		num_modules = len(sys.modules)
+		start = time.perf_counter()
+		module = importlib.import_module(name)
+		if self.enabled:
+			duration = (time.perf_counter() - start) * 1000
+			with self._lock:
+				self._events.append((self._elapsed(), 'import ' + name, duration, len(sys.modules) - num_modules))
+		return module
+
+	def report(self):
+		"""
+			Retrieve the recorded time line as printable text
+		"""
+		lines = ['Startup profile (ms since start):']
+		with self._lock:
+			for elapsed, label, duration, num_modules in self._events:
+				line = '%8.1f  %s' % (elapsed, label)
+				if duration is not None:
+					line += ' (%.1f ms, %d modules)' % (duration, num_modules)
+				lines.append(line)
+		return '\n'.join(lines)
+
+	def print_report(self):
+		if self.enabled:
+			print(self.report(), file=sys.stderr)
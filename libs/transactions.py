@@ -0,0 +1,163 @@
+import sys
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+
+def contains(strings, search_string):
+	"""
+		Mask of the strings containing search_string as plain text, ignoring the case;
+		the search of all stores, the database matches descriptions the same way
+	"""
+	return pd.Series(strings, dtype=object).str.contains(search_string, case=False, regex=False, na=False).values
+
+
+class TransactionStore:
+	"""
+		Compact, date sorted column store of the imported transactions; holds only
+		the date (days since epoch), the description (codes into the unique
+		descriptions), the amount and the balance (both in minor units) and
+		optionally the import file (source) of each row
+	"""
+
+	def __init__(self, days, codes, descriptions, amounts, balances=None, has_balance=None, scale=100, sources=None):
+		self.days = days
+		self.codes = codes
+		self.descriptions = descriptions
+		self.amounts = amounts
+		self.balances = balances
+		self.has_balance = has_balance
+		self.scale = scale
+		self.sources = sources
+		self._unique_days = None
+
+	@classmethod
+	def from_frame(cls, df, col_date, col_desc, col_amount, col_balance=None, scale=100, sources=None):
+		"""
+			Project the needed columns of an imported data frame into a store; amounts
+			and balances of the frame are already in minor units, missing balances are NaN
+		"""
+		days = df[col_date].values.astype('datetime64[D]').astype('int32')
+		# keep the data sorted by date so that periods can be sliced directly
+		order = np.argsort(days, kind='mergesort')
+		days = days[order]
+
+		codes, descriptions = pd.factorize(df[col_desc].fillna('').values[order])
+		codes = codes.astype('int32')
+		descriptions = np.asarray(descriptions, dtype=object)
+
+		amounts = df[col_amount].values.astype('int64')[order]
+
+		balances = has_balance = None
+		if col_balance is not None and col_balance in df:
+			values = df[col_balance].values.astype('float64')[order]
+			has_balance = ~np.isnan(values)
+			balances = np.where(has_balance, values, 0).astype('int64')
+
+		if sources is not None:
+			sources = np.asarray(sources, dtype='int32')[order]
+
+		return cls(days, codes, descriptions, amounts, balances, has_balance, scale, sources)
+
+	def select(self, rows):
+		"""
+			Create a store of the selected rows (mask or indices); the descriptions are shared
+		"""
+		def take(values):
+			return None if values is None else values[rows]
+		return TransactionStore(self.days[rows], self.codes[rows], self.descriptions, self.amounts[rows],
+		                        take(self.balances), take(self.has_balance), self.scale, take(self.sources))
+
+	def merge(self, other):
+		"""
+			Create a date sorted store of the rows of both stores; on the same day
+			the rows of this store come first
+		"""
+		# map the descriptions of the other store into the descriptions of this one
+		indexer = pd.Index(self.descriptions).get_indexer(other.descriptions)
+		added = indexer < 0
+		indexer[added] = len(self.descriptions) + np.arange(added.sum())
+		descriptions = np.concatenate([self.descriptions, other.descriptions[added]])
+		codes = np.concatenate([self.codes, indexer[other.codes].astype('int32')])
+
+		days = np.concatenate([self.days, other.days])
+		order = np.argsort(days, kind='mergesort')
+
+		balances = has_balance = None
+		if self.balances is not None or other.balances is not None:
+			balances = np.concatenate([store.balances if store.balances is not None else np.zeros(len(store), dtype='int64')
+			                           for store in (self, other)])[order]
+			has_balance = np.concatenate([store.has_balance if store.balances is not None else np.zeros(len(store), dtype=bool)
+			                              for store in (self, other)])[order]
+		sources = None
+		if self.sources is not None and other.sources is not None:
+			sources = np.concatenate([self.sources, other.sources])[order]
+
+		return TransactionStore(days[order], codes[order], descriptions, np.concatenate([self.amounts, other.amounts])[order],
+		                        balances, has_balance, self.scale, sources)
+
+	def __len__(self):
+		return len(self.days)
+
+	def dates(self, start=0, end=None):
+		"""
+			Dates of the rows start:end as datetime64
+		"""
+		return self.days[start:end].astype('datetime64[D]')
+
+	def amount_values(self, start=0, end=None):
+		"""
+			Amounts of the rows start:end in major units
+		"""
+		return self.amounts[start:end] / float(self.scale)
+
+	def balance_values(self, start=0, end=None):
+		"""
+			Balances of the rows start:end in major units, NaN where no balance is known
+		"""
+		if self.balances is None:
+			return None
+		return np.where(self.has_balance[start:end], self.balances[start:end] / float(self.scale), np.nan)
+
+	def unique_days(self):
+		"""
+			Unique days and the index of every row into them
+		"""
+		if self._unique_days is None:
+			# the days are sorted, so a new day starts wherever the value changes
+			starts = np.r_[True, self.days[1:] != self.days[:-1]] if len(self.days) else np.array([], dtype=bool)
+			self._unique_days = self.days[starts], np.cumsum(starts) - 1
+		return self._unique_days
+
+	def range_of(self, first_day, last_day):
+		"""
+			Row range of all transactions from first_day up to and including last_day (days since epoch)
+		"""
+		return np.searchsorted(self.days, first_day, side='left'), np.searchsorted(self.days, last_day, side='right')
+
+	def to_frame(self, col_date, col_desc, col_amount, start=0, end=None, rows=None):
+		"""
+			Create a data frame of the rows start:end, optionally only of the selected rows within
+		"""
+		days, codes, amounts = self.days[start:end], self.codes[start:end], self.amounts[start:end]
+		if rows is not None:
+			days, codes, amounts = days[rows], codes[rows], amounts[rows]
+		return pd.DataFrame(OrderedDict([(col_date, days.astype('datetime64[D]').astype('datetime64[ns]')),
+		                                 (col_desc, self.descriptions[codes]),
+		                                 (col_amount, amounts / float(self.scale))]))
+
+	def memory_report(self):
+		"""
+			Retrieve the memory used by each column in bytes
+		"""
+		report = OrderedDict([('rows', len(self)),
+		                      ('days', self.days.nbytes),
+		                      ('description codes', self.codes.nbytes),
+		                      ('descriptions', self.descriptions.nbytes + sum(sys.getsizeof(d) for d in self.descriptions)),
+		                      ('amounts', self.amounts.nbytes)])
+		if self.balances is not None:
+			report['balances'] = self.balances.nbytes + self.has_balance.nbytes
+		if self.sources is not None:
+			report['sources'] = self.sources.nbytes
+		report['total'] = sum(v for k, v in report.items() if k != 'rows')
+		return report
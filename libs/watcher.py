@@ -0,0 +1,136 @@
+import os
+import select
+import ctypes
+import ctypes.util
+import threading
+
+# inotify events of files which are written, moved or deleted (see inotify(7))
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+EVENT_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+# seconds between two checks of the directory without inotify
+POLL_INTERVAL = 2.0
+# seconds the files have to stay unchanged before they are reported,
+# exports are often written in several steps
+SETTLE_TIME = 1.0
+
+
+class _Inotify:
+	"""
+		Wait for changes of a directory with inotify
+	"""
+
+	def __init__(self, directory):
+		libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+		self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+		if self._fd < 0:
+			raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+		if libc.inotify_add_watch(self._fd, os.fsencode(directory), EVENT_MASK) < 0:
+			errno = ctypes.get_errno()
+			os.close(self._fd)
+			raise OSError(errno, 'inotify_add_watch failed: ' + directory)
+
+	def wait(self, timeout):
+		"""
+			Wait up to timeout seconds for changes; returns whether there have been any
+		"""
+		if not select.select([self._fd], [], [], timeout)[0]:
+			return False
+		# the events themselves are not needed, the directory is compared instead
+		try:
+			while os.read(self._fd, 65536):
+				pass
+		except BlockingIOError:
+			pass
+		return True
+
+	def close(self):
+		os.close(self._fd)
+
+
+class _Polling:
+	"""
+		Check a directory for changes in fixed intervals
+	"""
+
+	def __init__(self, stop_event):
+		self._stop_event = stop_event
+
+	def wait(self, timeout):
+		return not self._stop_event.wait(timeout)
+
+	def close(self):
+		pass
+
+
+class DirectoryWatcher(threading.Thread):
+	"""
+		Watch a directory for new, changed and removed files in the background;
+		inotify is used where available, otherwise the directory is polled.
+		callback(changed, removed) is called from the watcher thread with the paths
+		of the files accepted by matches(name)
+	"""
+
+	def __init__(self, directory, matches, callback, poll_interval=POLL_INTERVAL, settle_time=SETTLE_TIME):
+		super(DirectoryWatcher, self).__init__(daemon=True)
+		self.directory = directory
+		self._matches = matches
+		self._callback = callback
+		self._poll_interval = poll_interval
+		self._settle_time = settle_time
+		self._stop_event = threading.Event()
+		self._snapshot = self._scan()
+
+		try:
+			self._backend = _Inotify(directory)
+			self.backend = 'inotify'
+		except (OSError, AttributeError):
+			# no inotify on this platform (or file system), AttributeError if libc does not provide it
+			self._backend = _Polling(self._stop_event)
+			self.backend = 'polling'
+
+	def _scan(self):
+		"""
+			Size and modification time of all matching files
+		"""
+		with os.scandir(self.directory) as entries:
+			return {entry.path: (entry.stat().st_size, entry.stat().st_mtime_ns)
+			        for entry in entries if entry.is_file() and self._matches(entry.name)}
+
+	def _report(self, snapshot):
+		"""
+			Report the differences between the last reported and the current files
+		"""
+		changed = sorted(path for path, stat in snapshot.items() if self._snapshot.get(path) != stat)
+		removed = sorted(path for path in self._snapshot if path not in snapshot)
+		self._snapshot = snapshot
+		self._callback(changed, removed)
+
+	def run(self):
+		try:
+			while not self._stop_event.is_set():
+				if not self._backend.wait(self._poll_interval):
+					continue
+				snapshot = self._scan()
+				# only report once the files stopped changing
+				while snapshot != self._snapshot and not self._stop_event.wait(self._settle_time):
+					settled = self._scan()
+					if settled == snapshot:
+						self._report(snapshot)
+						break
+					snapshot = settled
+		finally:
+			self._backend.close()
+
+	def stop(self):
+		"""
+			Stop watching; the thread ends within the poll interval
+		"""
+		self._stop_event.set()
@@ -0,0 +1,133 @@
+import os
+import re
+import sys
+import argparse
+from concurrent.futures import Future, ProcessPoolExecutor
+import matplotlib
+matplotlib.use('Agg')  # render without any display, has to be set before pyplot is loaded
+from libs.analysis import Analysis
+from libs.settings import Settings
+from libs.datahandler import DataHandler
+from libs.rendercache import RenderCache, MAX_SIZE
+from libs.instrumentation import instrumentation
+
+
+FORMATS = ['png', 'svg', 'pdf']
+
+
+def _file_name(name):
+	"""
+		Create a file system safe name from a category alias
+	"""
+	return re.sub(r'[^\w\-]+', '_', name).strip('_') or 'category'
+
+
+def _write(path, data):
+	"""
+		Write a rendered image to path
+	"""
+	with open(path, 'wb') as fp:
+		fp.write(data)
+
+
+def _render_category(path, categorized_data, labels, index, fmt, dpi, cache):
+	"""
+		Render a single category figure; executed in a worker process
+	"""
+	analysis = Analysis(None, None, render_cache=cache)
+	_write(path, analysis.render_category(categorized_data, labels, index, fmt, dpi))
+	return path
+
+
+def load_data_handler(import_dir, sql_store=False):
+	"""
+		Import the data of import_dir with the settings saved in its definitions file
+	"""
+	settings = Settings()
+	settings.import_dir = import_dir
+	settings.use_sql_store = sql_store
+	data_handler = DataHandler(settings)
+	settings.apply_saved_settings(import_dir, data_handler.get_settings())
+	data_handler.import_data(settings)
+	return data_handler, settings
+
+
+def render_report(import_dir, output_dir, fmt, dpi, executor, sql_store=False, cache=None):
+	"""
+		Render all charts of an import directory to output_dir; the category
+		figures which aren't cached are submitted to the executor, their futures are returned
+	"""
+	data_handler, settings = load_data_handler(import_dir, sql_store)
+	analysis = Analysis(data_handler, None, render_cache=cache)
+	os.makedirs(output_dir, exist_ok=True)
+
+	def path(name):
+		return os.path.join(output_dir, name + '.' + fmt)
+
+	_write(path('overview'), analysis.render('overview', fmt, dpi, figsize=(8, 3)))
+	_write(path('month'), analysis.render('month', fmt, dpi))
+	_write(path('day'), analysis.render('day', fmt, dpi))
+	# without a balance column the default column names still name one
+	if data_handler.has_balances():
+		_write(path('balance'), analysis.render('balance', fmt, dpi))
+
+	labels, categorized_data = analysis.category_values()
+	category_dir = os.path.join(output_dir, 'categories')
+	os.makedirs(category_dir, exist_ok=True)
+
+	futures = []
+	for index, alias in enumerate(data_handler.get_category_aliases(empty=False)):
+		category_path = os.path.join(category_dir, _file_name(alias) + '.' + fmt)
+		data = analysis.render_category(categorized_data, labels, index, fmt, dpi, cached_only=True)
+		if data is None:
+			futures.append(executor.submit(_render_category, category_path, categorized_data, labels, index, fmt, dpi, cache))
+		else:
+			_write(category_path, data)
+			future = Future()
+			future.set_result(category_path)
+			futures.append(future)
+	return futures
+
+
+def main():
+	parser = argparse.ArgumentParser(description='Render the expense charts of import directories without a GUI')
+	parser.add_argument('import_dirs', nargs='+', help='import directories containing a saved category_definitions.json')
+	parser.add_argument('-o', '--output', default='reports', help='output directory, one sub directory per import directory')
+	parser.add_argument('-f', '--format', choices=FORMATS, default='png', help='image format of the charts')
+	parser.add_argument('--dpi', type=int, default=100, help='resolution of raster images')
+	parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='number of worker processes for the category charts')
+	parser.add_argument('--sql-store', action='store_true', help='keep the transactions in a database within each import directory')
+	parser.add_argument('--cache', help='directory of rendered charts, charts of unchanged data are not rendered again')
+	parser.add_argument('--cache-size', type=int, default=MAX_SIZE // (1024 * 1024), help='maximum size of the cache in MB')
+	parser.add_argument('--profile', help='write timings and counters of the processing stages as JSON to this file')
+	args = parser.parse_args()
+
+	if args.profile:
+		instrumentation.enable()
+
+	cache = RenderCache(args.cache, args.cache_size * 1024 * 1024) if args.cache else None
+
+	failed = False
+	with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+		futures = []
+		for import_dir in args.import_dirs:
+			output_dir = os.path.join(args.output, os.path.basename(os.path.normpath(import_dir)))
+			try:
+				futures.extend(render_report(import_dir, output_dir, args.format, args.dpi, executor, args.sql_store, cache))
+			except (ImportError, ValueError, OSError) as e:
+				print('Report failed for ' + import_dir + ': ' + str(e.args[0]), file=sys.stderr)
+				failed = True
+
+		for future in futures:
+			try:
+				print(future.result())
+			except Exception as e:
+				print('Rendering failed: ' + repr(e), file=sys.stderr)
+				failed = True
+
+	if args.profile:
+		instrumentation.dump(args.profile)
+	sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,51 @@
+import sys
+import asyncio
+import argparse
+from report import load_data_handler
+from libs.queryserver import QueryServer, ENDPOINTS, CACHE_SIZE
+from libs.instrumentation import instrumentation
+
+
+async def serve(import_dir, host, port, sql_store=False, watch=False, cache_size=CACHE_SIZE):
+	"""
+		Import the data of import_dir once and answer queries until the server is stopped
+	"""
+	server = QueryServer(lambda: load_data_handler(import_dir, sql_store), cache_size)
+	try:
+		address = await server.start(host, port)
+		print('Serving %s on http://%s:%d' % (import_dir, address[0], address[1]))
+		print('Endpoints: ' + ', '.join(list(ENDPOINTS.keys()) + ['/reload (POST)']))
+		if watch:
+			print('Watching ' + import_dir + ' (' + server.watch() + ')')
+		await server.serve_forever()
+	finally:
+		server.close()
+
+
+def main():
+	parser = argparse.ArgumentParser(description='Serve the aggregates of an import directory as JSON over HTTP')
+	parser.add_argument('import_dir', help='import directory containing a saved category_definitions.json')
+	parser.add_argument('--host', default='127.0.0.1', help='address to listen on')
+	parser.add_argument('-p', '--port', type=int, default=8080)
+	parser.add_argument('--sql-store', action='store_true', help='keep the transactions in a database within the import directory')
+	parser.add_argument('--watch', action='store_true', help='apply changed import files and category rules while serving')
+	parser.add_argument('--cache-size', type=int, default=CACHE_SIZE, help='number of cached responses')
+	parser.add_argument('--profile', help='write timings and counters of the queries as JSON to this file on exit')
+	args = parser.parse_args()
+
+	if args.profile:
+		instrumentation.enable()
+
+	try:
+		asyncio.run(serve(args.import_dir, args.host, args.port, args.sql_store, args.watch, args.cache_size))
+	except KeyboardInterrupt:
+		pass
+	except (ImportError, ValueError, OSError) as e:
+		print('Serving ' + args.import_dir + ' failed: ' + str(e), file=sys.stderr)
+		sys.exit(1)
+	finally:
+		if args.profile:
+			instrumentation.dump(args.profile)
+
+if __name__ == '__main__':
+	main()
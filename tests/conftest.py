@@ -0,0 +1,2 @@
+def pytest_configure(config):
+	config.addinivalue_line('markers', 'slow: long running checks, deselected with -m "not slow"')
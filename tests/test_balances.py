@@ -0,0 +1,59 @@
+import json
+import numpy as np
+import pytest
+from libs.aggregates import day_anchors
+from libs.datahandler import DataHandler
+from report import load_data_handler
+
+ROWS = ['Date,Description,Amount,Balance',
+        '2017-01-01,Rent,-10.00,90',
+        '2017-01-01,Cafe,-5.00,',
+        '2017-01-02,Gas,-1.00,']
+COLUMNS = {'date': '1', 'description': '2', 'amount': '3', 'balance': '4'}
+
+
+def _reconstruct(day_idx, amounts, balances):
+	num_days = int(max(day_idx)) + 1
+	day_sums = np.bincount(day_idx, weights=amounts, minlength=num_days)
+	anchors = day_anchors(np.array(day_idx), np.array(amounts, dtype='float64'), np.array(balances, dtype='float64'), num_days)
+	return DataHandler._calc_balances(None, day_sums, anchors)
+
+
+def test_row_after_balance_row_on_the_same_day():
+	# the balance of the first row doesn't include the second row of its day
+	balances = _reconstruct([0, 0, 1], [-10, -5, -1], [90, np.nan, np.nan])
+	np.testing.assert_allclose(balances, [85, 84])
+
+
+def test_days_before_the_first_known_balance():
+	balances = _reconstruct([0, 1, 1, 2], [-3, -10, -5, -1], [np.nan, np.nan, 80, np.nan])
+	np.testing.assert_allclose(balances, [95, 80, 79])
+
+
+def test_every_row_with_a_balance():
+	balances = _reconstruct([0, 0, 1], [-10, -5, 20], [90, 85, 105])
+	np.testing.assert_allclose(balances, [85, 105])
+
+
+def _import_dir(tmp_path, rows=ROWS, columns=COLUMNS):
+	(tmp_path / 'statement.csv').write_text('\n'.join(rows) + '\n')
+	definitions = {'settings': {'file_type': 'csv', 'date_format': '%Y-%m-%d', 'columns': columns},
+	               'categories': {'Snack': ['Cafe'], 'Unknown': []}}
+	(tmp_path / 'category_definitions.json').write_text(json.dumps(definitions))
+	return str(tmp_path)
+
+
+@pytest.mark.parametrize('sql_store', [False, True])
+def test_imported_balances(tmp_path, sql_store):
+	data_handler, settings = load_data_handler(_import_dir(tmp_path), sql_store)
+	dates, balances, date_format = data_handler.get_days_balance_arrays()
+	np.testing.assert_allclose(data_handler.to_display(balances), [85, 84])
+
+
+@pytest.mark.parametrize('sql_store', [False, True])
+def test_headerless_import_without_balances(tmp_path, sql_store):
+	rows = [row.rsplit(',', 1)[0] for row in ROWS[1:]]
+	columns = {'date': '1', 'description': '2', 'amount': '3'}
+	data_handler, settings = load_data_handler(_import_dir(tmp_path, rows, columns), sql_store)
+	assert not data_handler.has_balances()
+	assert data_handler.get_days_balance_arrays() is None
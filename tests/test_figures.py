@@ -0,0 +1,54 @@
+import gc
+import os
+import shutil
+import pytest
+import matplotlib
+matplotlib.use('Agg')  # the cycles run without a display
+from matplotlib.figure import Figure
+from matplotlib.backend_bases import FigureCanvasBase
+from benchmarks.generate import generate
+from benchmarks import leak
+from benchmarks.run import _load
+from libs.analysis import FigurePool
+
+WARMUP = 2
+CYCLES = 5
+# import/edit cycles of the memory check and the memory they may add after the warm up
+LEAK_CYCLES = 100
+LEAK_TOLERANCE = 10e6
+
+
+def _live(cls):
+	gc.collect()
+	return sum(1 for obj in gc.get_objects() if isinstance(obj, cls))
+
+
+def _import_dir(tmp_path):
+	import_dir = str(tmp_path)
+	generate(import_dir, rows=300)
+	shutil.copy(os.path.join(import_dir, 'category_definitions.json'), os.path.join(import_dir, 'category_definitions.orig'))
+	return import_dir
+
+
+def test_cycles_reuse_figures_and_canvases(tmp_path):
+	data_handler, settings = _load(_import_dir(tmp_path))
+	pool = FigurePool()
+
+	for i in range(WARMUP):
+		leak._cycle(data_handler, settings, pool)
+	created, figures, canvases = pool.created, _live(Figure), _live(FigureCanvasBase)
+
+	for i in range(CYCLES):
+		leak._cycle(data_handler, settings, pool)
+	# every cycle reuses the figures and canvases of the one before
+	assert pool.created == created
+	assert _live(Figure) <= figures
+	assert _live(FigureCanvasBase) <= canvases
+
+
+@pytest.mark.slow
+def test_memory_stays_flat(tmp_path):
+	# the resident memory is measured where /proc is available, the traced memory elsewhere
+	start, end, stats = leak.run(_import_dir(tmp_path), LEAK_CYCLES, leak._current_rss() is None)
+	assert end[1] == start[1]
+	assert end[0] - start[0] <= LEAK_TOLERANCE
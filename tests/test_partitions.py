@@ -0,0 +1,39 @@
+import json
+import pytest
+from report import load_data_handler
+
+ROWS = ['Date,Description,Amount',
+        '2017-01-05,Cafe Central,-4.50',
+        '2017-01-20,Bookshop,-12.00',
+        '2017-02-03,Cafe Central,-3.00',
+        '2017-02-10,Salary,1000.00',
+        '2017-03-01,Hardware store,-25.00',
+        '2017-03-15,Cafe Corner,-2.50']
+
+
+def _load(tmp_path, partitions):
+	import_dir = tmp_path / ('partitions' if partitions else 'memory')
+	import_dir.mkdir()
+	(import_dir / 'statement.csv').write_text('\n'.join(ROWS) + '\n')
+	settings = {'file_type': 'csv', 'date_format': '%Y-%m-%d', 'columns': {'date': '1', 'description': '2', 'amount': '3'}}
+	if partitions:
+		# only the most recent month is loaded
+		settings.update(partitions=True, partition_months=1)
+	definitions = {'settings': settings, 'categories': {'Snack': ['Cafe']}}
+	(import_dir / 'category_definitions.json').write_text(json.dumps(definitions))
+	return load_data_handler(str(import_dir), False)[0]
+
+
+@pytest.mark.parametrize('date_range', [(None, None), ('2017-01-10', '2017-02-28')])
+def test_categories_of_unloaded_partitions(tmp_path, date_range):
+	memory, partitions = _load(tmp_path, False), _load(tmp_path, True)
+	assert len(partitions.get_unloaded_months()) == 2
+	for data_handler in (memory, partitions):
+		data_handler.set_date_range(*date_range)
+
+	# the categories, their tables and the unknown categories cover all months
+	assert partitions.get_calculated_categories() == memory.get_calculated_categories()
+	for month in memory.get_calculated_categories():
+		for alias in memory.get_category_aliases():
+			assert partitions.get_categorized_data_sets(month, alias).equals(memory.get_categorized_data_sets(month, alias))
+	assert sorted(partitions.get_unknown_categories()) == sorted(memory.get_unknown_categories()) == ['Bookshop', 'Hardware store']
@@ -0,0 +1,36 @@
+import json
+import asyncio
+from libs.queryserver import QueryServer
+from report import load_data_handler
+from tests.test_balances import _import_dir
+
+
+async def _requests(import_dir, request):
+	server = QueryServer(lambda: load_data_handler(import_dir, False))
+	host, port = (await server.start('127.0.0.1', 0))[:2]
+	try:
+		reader, writer = await asyncio.open_connection(host, port)
+		writer.write(request)
+		responses = []
+		for i in range(2):
+			head = await reader.readuntil(b'\r\n\r\n')
+			length = int(head.split(b'Content-Length: ')[1].split(b'\r\n')[0])
+			responses.append((head.split()[1], await reader.readexactly(length)))
+		writer.close()
+		await writer.wait_closed()
+		# the server sees the end of the connection before the loop stops
+		await asyncio.sleep(0.1)
+		return responses
+	finally:
+		server.close()
+
+
+def test_request_body_on_kept_alive_connection(tmp_path):
+	# the body of the first request isn't taken for the start of the second one
+	body = b'GET /search HTTP/1.1'
+	request = (b'POST /reload HTTP/1.1\r\nContent-Length: %d\r\n\r\n' % len(body) + body +
+	           b'GET /total_in_out HTTP/1.1\r\n\r\n')
+	(status, body), (status2, body2) = asyncio.run(_requests(_import_dir(tmp_path), request))
+	assert status == b'200'
+	assert status2 == b'200'
+	assert json.loads(body2.decode('utf-8')) == {'income': 0.0, 'expenses': 16.0}
@@ -0,0 +1,11 @@
+from libs.rendercache import RenderCache
+
+
+def test_replaced_image_counts_once(tmp_path):
+	cache = RenderCache(str(tmp_path), max_size=1000)
+	cache.put('a', 'png', b'x' * 400)
+	for i in range(5):
+		cache.put('a', 'png', b'x' * 300)
+	# the tracked size is the one of the cached images
+	assert cache._size == 300
+	assert cache._size == cache._evict()
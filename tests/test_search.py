@@ -0,0 +1,29 @@
+import pytest
+from report import load_data_handler
+from tests.test_balances import _import_dir
+
+ROWS = ['Date,Description,Amount,Balance',
+        '2017-01-01,Rent,-500.00,',
+        '2017-01-02,abc,-1.50,',
+        '2017-01-03,a.c Shop,-2.00,',
+        '2017-01-04,CAFÉ Central,-3.25,',
+        '2017-02-01,Salary,1000.00,']
+
+
+def _search(tmp_path, sql_store, search_string):
+	data_handler, settings = load_data_handler(_import_dir(tmp_path, ROWS), sql_store)
+	return sorted(data_handler.get_search_data(search_string)[settings.column_description])
+
+
+@pytest.mark.parametrize('search_string, found', [('a.c', ['a.c Shop']),
+                                                  ('^Rent', []),
+                                                  ('rent', ['Rent']),
+                                                  ('1\\.5', []),
+                                                  ('1.5', ['abc']),
+                                                  ('é', ['CAFÉ Central']),
+                                                  ('café', ['CAFÉ Central']),
+                                                  ('2017-02', ['Salary'])])
+@pytest.mark.parametrize('sql_store', [False, True])
+def test_search_string_is_plain_text(tmp_path, sql_store, search_string, found):
+	# both stores match the search string the same way
+	assert _search(tmp_path, sql_store, search_string) == found
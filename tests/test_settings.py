@@ -0,0 +1,28 @@
+from libs.settings import Settings
+
+
+def _sniff(import_dir, cached=None):
+	settings = Settings()
+	settings.file_type = 'csv'
+	settings.sniff_import_dir(str(import_dir), 'csv', cached)
+	return settings
+
+
+def test_cached_format_of_unchanged_files(tmp_path):
+	(tmp_path / 'b.csv').write_text('Date,Description,Amount\n2017-01-01,Cafe,-5.00\n')
+	cached = _sniff(tmp_path).get_sniff_results()
+	assert cached['delimiter'] == ','
+
+	# the cached format is used as long as the files are the same
+	cached['delimiter'] = '|'
+	assert _sniff(tmp_path, cached).delimiter == '|'
+
+
+def test_cached_format_of_added_file(tmp_path):
+	(tmp_path / 'b.csv').write_text('Date,Description,Amount\n2017-01-01,Cafe,-5.00\n')
+	cached = _sniff(tmp_path).get_sniff_results()
+
+	(tmp_path / 'a.csv').write_text('Date;Description;Amount\n2017-01-02;Gas;-1.00\n')
+	settings = _sniff(tmp_path, cached)
+	assert settings.delimiter == ';'
+	assert settings.get_sniff_results()['files'] != cached['files']
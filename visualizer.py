@@ -1,13 +1,19 @@
 import sys
+from libs.startup import StartupProfiler
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from libs.mainwindow import Ui_MainWindow
 from PyQt5.QtWidgets import *
 from PyQt5.QtGui import QCursor
-from PyQt5.QtCore import QSize, Qt
-from libs.analysis import Analysis
+from PyQt5.QtCore import QDate, QSize, Qt, QTimer, pyqtSignal
 from libs.settings import Settings
-from libs.datahandler import DataHandler
+from libs.instrumentation import instrumentation
 import datetime
 
+# heavy modules (pandas, matplotlib, scipy) which are not needed to show the settings tab;
+# they are loaded in the background once the main window is visible
+DEFERRED_MODULES = ['libs.datahandler', 'matplotlib.dates', 'scipy.spatial']
+
 
 class CustomTabWidget(QTabBar):
 	"""
@@ -35,14 +41,25 @@ class CustomTabWidget(QTabBar):
 
 
 class Visualizer(QMainWindow, Ui_MainWindow):
+	# emitted from the watcher thread, handled in the GUI thread
+	import_update_loaded = pyqtSignal(list, list, object)
+	import_update_failed = pyqtSignal(str)
 
-	def __init__(self):
+	def __init__(self, profiler=None):
 		super(self.__class__, self).__init__()
+		self._profiler = profiler or StartupProfiler()
 		self.setupUi(self)
 		self.setFixedSize(self.frameGeometry().width(), self.frameGeometry().height())
 		self._categories_table_container = dict()
 		self._imported = False
 		self._sett_cat_table_dc = None
+		self._watcher = None
+		self._category_det_tabs_container = None
+		self._analysis = None
+		# figures and canvases are reused by all imports
+		self._figure_pool = None
+		# worker building and drawing the figures with background rendering
+		self._render_executor = None
 
 		# SETTINGS
 		self._settings = Settings()
@@ -58,6 +75,22 @@ class Visualizer(QMainWindow, Ui_MainWindow):
 		# Set tabs enabled/disabled
 		self._enable_disable_tabs()
 
+	def _load_deferred_modules(self):
+		"""
+			Import the heavy modules so that they are ready once data is imported
+		"""
+		for name in DEFERRED_MODULES:
+			self._profiler.timed_import(name)
+		self._profiler.mark('deferred modules loaded')
+		self._profiler.print_report()
+
+	def preload_modules(self):
+		"""
+			Start loading the deferred modules in the background
+		"""
+		self._profiler.mark('first paint')
+		threading.Thread(target=self._load_deferred_modules, daemon=True).start()
+
 	def _setup_signals(self):
 		"""
 			Initializes the settings tab (comboboxes, radio buttons...)
@@ -86,13 +119,36 @@ class Visualizer(QMainWindow, Ui_MainWindow):
 		# SEARCH
 		self.search_field.textChanged.connect(self._cb_search_field_changed)
 
-	def _clear_layout(self, layout):
-		"""
-			Deletes all children of given layout
+		# WATCH MODE
+		self.cb_watch = QCheckBox('Watch import directory')
+		self.cb_watch.setEnabled(False)
+		self.statusbar.addPermanentWidget(self.cb_watch)
+		self.cb_watch.toggled.connect(self._cb_watch_toggled)
+		self.import_update_loaded.connect(self._cb_import_update_loaded)
+		self.import_update_failed.connect(self._cb_import_update_failed)
+
+		# DATE RANGE
+		self.date_from = QDateEdit(calendarPopup=True)
+		self.date_to = QDateEdit(calendarPopup=True)
+		# the tabs are refreshed once the dates stopped changing
+		self._date_range_timer = QTimer(self, singleShot=True, interval=300)
+		self._date_range_timer.timeout.connect(self._cb_date_range_changed)
+		for label, date_edit in (('From', self.date_from), ('To', self.date_to)):
+			date_edit.setDisplayFormat('yyyy-MM-dd')
+			date_edit.setEnabled(False)
+			date_edit.dateChanged.connect(self._date_range_timer.start)
+			self.statusbar.addPermanentWidget(QLabel(label))
+			self.statusbar.addPermanentWidget(date_edit)
+
+	def _clear_layout(self, layout, release=False):
+		"""
+			Deletes all children of given layout, optionally closing their figures
 		"""
 		while layout.count():
 			child = layout.takeAt(0)
 			if child.widget():
+				if release:
+					self._analysis.release_figures(child.widget())
 				child.widget().deleteLater()
 
 	def _cb_search_field_changed(self):
@@ -123,6 +179,7 @@ class Visualizer(QMainWindow, Ui_MainWindow):
 		self.main_tab_widget.setTabEnabled(3, self._imported)
 		self.main_tab_widget.setTabEnabled(4, self._imported)
 		self.sub_settings.setTabEnabled(1, self._imported)
+		self.cb_watch.setEnabled(self._imported)
 
 	def _show_msg_box(self, severity, text):
 		"""
@@ -166,6 +223,7 @@ class Visualizer(QMainWindow, Ui_MainWindow):
 				if new_value == '':
 					item.setText(old_value)
 				elif new_value != old_value:
+					self._wait_rendering()
 					self._data_handler.update_entries(cur_alias, cur_categ, 'update', new_value)
 				self._sett_cat_table_dc = None
 
@@ -277,6 +335,7 @@ class Visualizer(QMainWindow, Ui_MainWindow):
 
 		# only remove if confirmed
 		if reply == QMessageBox.Yes:
+			self._wait_rendering()
 			if table == self.sett_category_aliases_tab:
 				self._data_handler.update_entries(self._get_cell_val(entry, table), '', 'delete')
 			elif table == self.sett_categories_tab:
@@ -290,11 +349,23 @@ class Visualizer(QMainWindow, Ui_MainWindow):
 		"""
 		unknown = self._data_handler.get_unknown_categories()
 		self._setup_setting_tables(self.sett_categories_unknown_tab, unknown, ['Unknown'])
-		# lazy way of updating category changes is to reload every tab
-		# done this way because otherwise the single graphs of the category tab would
-		# have to be remember to be deleted from the plt
-		# if they wouldn't be deleted then the are constantly added and cause high memory usage
-		self._init_all_tabs()
+		self._refresh_tabs()
+		self._show_instrumentation_summary()
+
+	def _show_import_summary(self):
+		"""
+			Show the number of duplicate transactions of overlapping import files in the status bar
+		"""
+		dropped = self._data_handler.get_dropped_duplicates()
+		if dropped:
+			self.statusbar.showMessage(str(dropped) + ' duplicate transactions of overlapping import files were dropped')
+
+	def _show_instrumentation_summary(self):
+		"""
+			Show the timings of the last processing stages in the status bar if instrumentation is enabled
+		"""
+		if instrumentation.enabled:
+			self.statusbar.showMessage(instrumentation.summary())
 
 	def _cb_table_context_menu(self, cell, table):
 		"""
@@ -340,17 +411,30 @@ class Visualizer(QMainWindow, Ui_MainWindow):
 			else:
 				imp_settings['balance_col'] = self.balance_col.currentText()
 
+			from libs.analysis import Analysis, FigurePool
+
 			try:
+				self._stop_watcher()
+				self._wait_rendering()
+				instrumentation.reset()
 				self._settings.set_import_settings(imp_settings)
 				self._data_handler.import_data(self._settings)
 				self._setup_category_definitions()
-				self._analysis = Analysis(self._data_handler, self.cb_category_table)
+				if self._figure_pool is None:
+					self._figure_pool = FigurePool()
+				self._analysis = Analysis(self._data_handler, self.cb_category_table, self._figure_pool,
+				                          executor=self._get_render_executor())
 				self._data_handler.save_settings()
 
 				self._init_all_tabs()
+				self._show_import_summary()
+				self._show_instrumentation_summary()
 
 				self._imported = True
+				self._init_date_range()
 				self._enable_disable_tabs()
+				if self.cb_watch.isChecked():
+					self._start_watcher()
 			except ImportError as e:
 				self._show_msg_box('critical', e.args[0])
 			except (ValueError, AttributeError):
@@ -358,6 +442,140 @@ class Visualizer(QMainWindow, Ui_MainWindow):
 		else:
 			self._show_msg_box('warning', 'No files found to import!')
 
+	def _get_render_executor(self):
+		"""
+			Worker for building and drawing the figures, None without background rendering
+		"""
+		if not self._settings.background_rendering:
+			return None
+		if self._render_executor is None:
+			self._render_executor = ThreadPoolExecutor(max_workers=1)
+		return self._render_executor
+
+	def _wait_rendering(self):
+		"""
+			Wait for the figures built in the background before the data is changed
+		"""
+		if self._analysis is not None:
+			self._analysis.wait_rendering()
+
+	def _cb_watch_toggled(self, checked):
+		"""
+			Callback function of the watch mode checkbox
+		"""
+		if checked:
+			self._start_watcher()
+		else:
+			self._stop_watcher()
+
+	def _start_watcher(self):
+		"""
+			Watch the import directory for new and changed import files
+		"""
+		from libs import compression
+		from libs.watcher import DirectoryWatcher
+
+		self._stop_watcher()
+		file_type = self._settings.file_type
+		self._watcher = DirectoryWatcher(self._settings.import_dir, lambda name: compression.matches(name, file_type),
+		                                 self._cb_watched_files_changed)
+		self._watcher.start()
+		self.statusbar.showMessage('Watching ' + self._settings.import_dir + ' (' + self._watcher.backend + ')')
+
+	def _stop_watcher(self):
+		if self._watcher:
+			self._watcher.stop()
+			self._watcher = None
+
+	def _cb_watched_files_changed(self, changed, removed):
+		"""
+			Callback function of the watcher, executed in the watcher thread;
+			the changed files are parsed here and merged in the GUI thread
+		"""
+		try:
+			loaded = self._data_handler.load_update(changed)
+		except ImportError as e:
+			self.import_update_failed.emit(e.args[0])
+			return
+		self.import_update_loaded.emit(changed, removed, loaded)
+
+	def _cb_import_update_loaded(self, changed, removed, loaded):
+		"""
+			Merge the files loaded by the watcher and update the affected tabs
+		"""
+		try:
+			self._wait_rendering()
+			instrumentation.reset()
+			months, aliases = self._data_handler.apply_update(changed, removed, loaded)
+		except ImportError as e:
+			self._cb_import_update_failed(e.args[0])
+			return
+
+		unknown = self._data_handler.get_unknown_categories()
+		self._setup_setting_tables(self.sett_categories_unknown_tab, unknown, ['Unknown'])
+		if months or aliases:
+			self._refresh_tabs()
+		self.statusbar.showMessage(str(len(changed)) + ' import files added or changed, ' + str(len(removed)) + ' removed')
+		self._show_instrumentation_summary()
+
+	def _cb_import_update_failed(self, text):
+		self.statusbar.showMessage('Update of the import files failed: ' + text.replace('\n', ' '))
+
+	def _init_date_range(self):
+		"""
+			Limit the date selection to the imported data and show the selected range
+		"""
+		first_day, last_day = self._data_handler.get_full_date_range()
+		if first_day is None:
+			return
+		selected = self._data_handler.get_date_range()
+		for date_edit, day in ((self.date_from, selected[0]), (self.date_to, selected[1])):
+			date_edit.blockSignals(True)
+			date_edit.setDateRange(QDate.fromString(str(first_day), Qt.ISODate), QDate.fromString(str(last_day), Qt.ISODate))
+			date_edit.setDate(QDate.fromString(str(day if day is not None else
+			                                       first_day if date_edit is self.date_from else last_day), Qt.ISODate))
+			date_edit.blockSignals(False)
+
+	def _cb_date_range_changed(self):
+		"""
+			Callback function of the date range selection, the full range selects everything
+		"""
+		if not self._imported:
+			return
+		first_day, last_day = self._data_handler.get_full_date_range()
+		selected_from = self.date_from.date().toString(Qt.ISODate)
+		selected_to = self.date_to.date().toString(Qt.ISODate)
+		if selected_from > selected_to:
+			self.statusbar.showMessage('The first day of the date range is after the last day')
+			return
+		self._wait_rendering()
+		try:
+			self._data_handler.set_date_range(None if selected_from <= str(first_day) else selected_from,
+			                                  None if selected_to >= str(last_day) else selected_to)
+		except ValueError as e:
+			self.statusbar.showMessage(e.args[0])
+			return
+		self._refresh_tabs()
+		self.statusbar.showMessage('Showing ' + selected_from + ' to ' + selected_to)
+
+	def _refresh_tabs(self):
+		"""
+			Update the tabs with the current data; the figures are updated in place,
+			only the category tab is rebuilt if the categories to display changed
+		"""
+		names = [self._category_det_tabs_container.tabText(i) for i in range(self._category_det_tabs_container.count())]
+		if names != self._data_handler.get_category_aliases(empty=False):
+			self._clear_layout(self.single_categories_container, release=True)
+			self._set_category_detail_tab()
+		# an update might have added or removed the only file with balances
+		self._set_balance_tab()
+
+		# the transactions shown below an updated category chart might not belong to it anymore
+		for name in self._analysis.update_figures():
+			self._set_category_table(self._categories_table_container[name], self._data_handler.get_column_headers())
+
+		self._cb_search_field_changed()
+
 	def _cb_rb_other(self, enabled):
 		"""
 			Callback function for the 'other' radio button, indicating that a different
@@ -404,6 +622,8 @@ class Visualizer(QMainWindow, Ui_MainWindow):
 			self.cb_file_type.setCurrentText(self._settings.selection_text)
 			self._cb_enable_disable_controls()
 
+			from libs.datahandler import DataHandler
+
 			self._settings.import_dir = self._import_dir
 			self._data_handler = DataHandler(self._settings)
 			loaded_settings = self._data_handler.get_settings()
@@ -427,7 +647,8 @@ class Visualizer(QMainWindow, Ui_MainWindow):
 			Callback function for file type selection
 		"""
 		if self.cb_file_type.currentText() != self._settings.selection_text:
-			preview_data = self._settings.sniff_import_dir(self._import_dir, self.cb_file_type.currentText())
+			preview_data = self._settings.sniff_import_dir(self._import_dir, self.cb_file_type.currentText(),
+			                                               self._data_handler.get_settings().get('format'))
 			self._init_defaults(preview_data)
 		else:
 			self._enable_disable_col_def(False)
@@ -515,13 +736,20 @@ class Visualizer(QMainWindow, Ui_MainWindow):
 			Setup day overview tab
 		"""
 		self.day_expenses_vbox.addWidget(self._analysis.create_day_overview())
+		self._set_balance_tab()
+
+	def _set_balance_tab(self):
+		"""
+			Setup the balance tab, or remove its figure if the balances are gone
+		"""
 		# in case no balance column has been chosen also no balances can be calculated
 		# therefore just disable the entire balance tab
-		if self._settings.column_balance:
-			self.days_main_tab.setTabEnabled(1, True)
-			self.balance_vbox.addWidget(self._analysis.create_day_balance())
-		else:
-			self.days_main_tab.setTabEnabled(1, False)
+		has_balances = self._data_handler.has_balances()
+		if has_balances != bool(self.balance_vbox.count()):
+			self._clear_layout(self.balance_vbox, release=True)
+			if has_balances:
+				self.balance_vbox.addWidget(self._analysis.create_day_balance())
+		self.days_main_tab.setTabEnabled(1, has_balances)
 
 	def _wrap_widget(self, t_type, widget, width=0, height=0, margins=None, align=None):
 		"""
@@ -631,6 +859,7 @@ class Visualizer(QMainWindow, Ui_MainWindow):
 		category_detail_tabs.layout = QHBoxLayout()
 
 		category_det_tabs_container = QTabWidget()
+		self._category_det_tabs_container = category_det_tabs_container
 		category_det_tabs_container.setTabBar(CustomTabWidget(width=100, height=25))
 		category_det_tabs_container.setTabPosition(QTabWidget.West)
 
@@ -646,9 +875,14 @@ class Visualizer(QMainWindow, Ui_MainWindow):
 
 
 def main():
+	profiler = StartupProfiler(enabled='--profile-startup' in sys.argv)
+	profiler.mark('Qt modules loaded')
 	app = QApplication(sys.argv)
-	v = Visualizer()
+	v = Visualizer(profiler)
 	v.show()
+	profiler.mark('main window shown')
+	# the timer fires once the event loop has painted the main window
+	QTimer.singleShot(0, v.preload_modules)
 	app.exec_()
 
 if __name__ == '__main__':